@@ -1,36 +1,442 @@
 """AV for pyremoteplay."""
 from __future__ import annotations
+import asyncio
 import logging
+import threading
 import time
 from collections import deque
-from typing import TYPE_CHECKING, Callable
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Optional, Sequence, Union
 
-from .stream_packets import AVPacket, Packet
+from .stream_packets import AV_BATCH_DTYPE, AVPacket, Packet, parse_av_batch
 from .const import FFMPEG_PADDING
 
 if TYPE_CHECKING:
+    from .crypt import StreamCipher
     from .session import Session
     from pyremoteplay.receiver import AVReceiver
 
+try:
+    import pyjerasure
+except ModuleNotFoundError:
+    pyjerasure = None
+
 _LOGGER = logging.getLogger(__name__)
 
 
+class HandoffQueue:
+    """Bounded single producer, single consumer queue.
+
+    Consumer blocks until items are available and drains all queued items.
+    Tracks queued bytes, queue depth high water mark and time items wait in queue.
+
+    :param maxlen: Maximum number of queued items
+    :param samples: Number of recent wait times used for percentiles
+    :param drop_oldest: Drop oldest item when full instead of rejecting new item
+    """
+
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self, maxlen: int, samples: int = 1024, drop_oldest: bool = False):
+        self._maxlen = maxlen
+        self._drop_oldest = drop_oldest
+        self._items = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._waits = deque(maxlen=samples)
+        self._high_water = 0
+        self._bytes = 0
+        self._stats = {"put": 0, "dropped": 0, "wakeups": 0}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, item, size: int = 0) -> bool:
+        """Add item. Return False if queue is full and item was not added.
+
+        :param size: Size of item in bytes
+        """
+        with self._cond:
+            depth = len(self._items)
+            if depth >= self._maxlen:
+                self._stats["dropped"] += 1
+                if not self._drop_oldest:
+                    return False
+                self._bytes -= self._items.popleft()[2]
+                depth -= 1
+            self._items.append((time.perf_counter(), item, size))
+            self._bytes += size
+            self._stats["put"] += 1
+            if depth >= self._high_water:
+                self._high_water = depth + 1
+            if not depth:
+                self._cond.notify()
+        return True
+
+    def get_batch(self, timeout: float = None) -> list:
+        """Return all queued items. Blocks until an item is queued or timeout.
+
+        :param timeout: Seconds to wait; Waits forever if None
+        """
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+                self._stats["wakeups"] += 1
+            items = self._items
+            self._items = deque()
+            self._bytes = 0
+            if not items:
+                return []
+            now = time.perf_counter()
+            self._waits.extend(now - queued for queued, _, _ in items)
+        return [item for _, item, _ in items]
+
+    def clear(self):
+        """Remove all items."""
+        with self._cond:
+            self._items.clear()
+            self._bytes = 0
+
+    @property
+    def maxlen(self) -> int:
+        """Return maximum number of queued items."""
+        return self._maxlen
+
+    @property
+    def bytes(self) -> int:
+        """Return size of queued items in bytes."""
+        return self._bytes
+
+    @property
+    def age(self) -> float:
+        """Return seconds the oldest queued item has waited."""
+        try:
+            return time.perf_counter() - self._items[0][0]
+        except IndexError:
+            return 0.0
+
+    @property
+    def stats(self) -> dict:
+        """Return queue stats. Wait times are in seconds."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["depth"] = len(self._items)
+            stats["bytes"] = self._bytes
+            stats["high_water"] = self._high_water
+            waits = list(self._waits)
+        waits.sort()
+        for percentile in HandoffQueue.PERCENTILES:
+            key = f"wait_p{percentile}"
+            if not waits:
+                stats[key] = 0.0
+                continue
+            index = min(len(waits) - 1, len(waits) * percentile // 100)
+            stats[key] = waits[index]
+        return stats
+
+
+class OverloadPolicy:
+    """Backpressure policy for AV pipelines which can not keep up.
+
+    A pipeline is overloaded when its queued bytes, the time its oldest item
+    has waited or its number of queued items exceeds the limit.
+
+    Modes:
+
+    - `stop`: Stop session when video is overloaded
+    - `skip`: Drop queued video and skip to the start of the next frame
+      when video is overloaded; A keyframe is requested when video resumes
+    - `shed_audio`: Drop audio when either stream is overloaded;
+      Video is skipped if it exceeds twice the limits
+    - `shed_video`: Skip video when either stream is overloaded
+
+    :param mode: Mode to use; Defaults to `stop`
+    :param max_bytes: Maximum bytes queued in a pipeline
+    :param max_latency: Maximum seconds an item may wait in a pipeline queue
+    """
+
+    STOP = "stop"
+    SKIP = "skip"
+    SHED_AUDIO = "shed_audio"
+    SHED_VIDEO = "shed_video"
+    MODES = (STOP, SKIP, SHED_AUDIO, SHED_VIDEO)
+
+    MAX_BYTES = 8 * 1024 * 1024
+    MAX_LATENCY = 0.5
+
+    # Load below which dropping stops.
+    RESUME_LOAD = 0.5
+    # Load at which shedding audio also skips video.
+    ESCALATE_LOAD = 2.0
+
+    def __init__(
+        self,
+        mode: str = STOP,
+        max_bytes: int = MAX_BYTES,
+        max_latency: float = MAX_LATENCY,
+    ):
+        if mode not in OverloadPolicy.MODES:
+            raise ValueError(f"Invalid overload mode: {mode}")
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_latency = max_latency
+
+    def load(self, queue: HandoffQueue) -> float:
+        """Return load of queue. Queue is overloaded if load is at least 1."""
+        return max(
+            queue.bytes / self.max_bytes,
+            queue.age / self.max_latency,
+            len(queue) / queue.maxlen,
+        )
+
+    def select(self, video: float, audio: float) -> Optional[str]:
+        """Return mode to enter for loads or None if not overloaded."""
+        if self.mode in (OverloadPolicy.STOP, OverloadPolicy.SKIP):
+            overloaded = video >= 1
+        else:
+            overloaded = max(video, audio) >= 1
+        return self.mode if overloaded else None
+
+
+class AVPipeline:
+    """Queue, cipher and worker for a single AV stream.
+
+    :param av_type: Type of stream
+    :param host_type: Host type
+    :param maxlen: Maximum number of queued items
+    :param drop_oldest: Drop oldest item when full instead of rejecting new item
+    :param keystream_window: Key stream window of decryptor in bytes;
+        If 0, key stream is only generated for the ranges decrypted.
+    """
+
+    QUEUE_TIMEOUT = 0.1
+
+    def __init__(
+        self,
+        av_type: str,
+        host_type: str,
+        maxlen: int,
+        drop_oldest: bool = False,
+        keystream_window: int = None,
+    ):
+        self._type = av_type
+        self._host_type = host_type
+        self._keystream_window = keystream_window
+        self._queue = HandoffQueue(maxlen, drop_oldest=drop_oldest)
+        self._cipher = None
+        self._packets = 0
+        self._dropped = 0
+        self.stream = None
+        self.dropping = False
+
+    def set_cipher(self, cipher: StreamCipher):
+        """Set cipher. Pipeline decrypts with its own decryptor."""
+        self._cipher = cipher.new_decryptor(self._keystream_window)
+
+    def put(self, item: Union[AVPacket, list], size: int = 0) -> bool:
+        """Queue packet or batch of datagrams. Return False if queue is full.
+
+        :param size: Size of item in bytes
+        """
+        return self._queue.put(item, size)
+
+    def drop(self, count: int = 1):
+        """Count packets dropped before being queued."""
+        self._dropped += count
+
+    def load(self, policy: OverloadPolicy) -> float:
+        """Return queue load for policy."""
+        return policy.load(self._queue)
+
+    def clear(self):
+        """Remove queued items."""
+        self._queue.clear()
+
+    def skip(self):
+        """Remove queued items and drop packets until start of next frame."""
+        self._queue.clear()
+        self.dropping = True
+
+    def process(self):
+        """Process queued items. Blocks until items are queued or timeout."""
+        for item in self._queue.get_batch(AVPipeline.QUEUE_TIMEOUT):
+            if isinstance(item, list):
+                self._process_batch(item)
+                continue
+            self._packets += 1
+            item.decrypt(self._cipher)
+            if self.stream is not None:
+                self.stream.handle(item)
+        if self.stream is not None:
+            self.stream.poll_fec()
+
+    def _process_batch(self, msgs: list):
+        """Parse, decrypt and handle batch of AV datagrams."""
+        headers = parse_av_batch(msgs, self._host_type)
+        self._packets += len(msgs)
+        payloads = [
+            self._cipher.decrypt(memoryview(msg)[offset:], key_pos)
+            for msg, offset, key_pos in zip(
+                msgs, headers["offset"].tolist(), headers["key_pos"].tolist()
+            )
+        ]
+        if self.stream is not None:
+            self.stream.handle_many(headers, payloads)
+
+    def worker(self, is_stopped: Callable[[], bool]):
+        """Process items until stopped. Run in thread."""
+        while not is_stopped():
+            self.process()
+        self.clear()
+
+    @property
+    def queue_full(self) -> bool:
+        """Return True if queue is full."""
+        return len(self._queue) >= self._queue.maxlen
+
+    @property
+    def stats(self) -> dict:
+        """Return pipeline stats."""
+        stats = {
+            "packets": self._packets,
+            "dropped": self._dropped,
+            "queue": self._queue.stats,
+        }
+        if self.stream is not None:
+            stats["frames"] = self.stream.stats
+        return stats
+
+
+class CongestionReporter:
+    """Periodically reports received and lost AV packets to host.
+
+    Each report contains the packets received and lost since the last report.
+    Reports are sent from the event loop so AV threads are not blocked.
+
+    :param send: Callback which sends received and lost counts
+    :param counters: Callable returning total received and lost packets
+    :param interval: Seconds between reports
+    """
+
+    DEFAULT_INTERVAL = 0.2
+    # Counts are sent as unsigned 16 bit values.
+    MAX_COUNT = 0xFFFF
+
+    def __init__(
+        self,
+        send: Callable[[int, int], None],
+        counters: Callable[[], tuple[int, int]],
+        interval: float = DEFAULT_INTERVAL,
+    ):
+        self._send = send
+        self._counters = counters
+        self._interval = interval
+        self._loop = None
+        self._stopped = False
+        self._last = (0, 0)
+        self._stats = {"reports": 0, "received": 0, "lost": 0}
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Start sending reports. Thread safe."""
+        self._loop = loop
+        self._last = self._counters()
+        loop.call_soon_threadsafe(self._schedule)
+
+    def stop(self):
+        """Stop sending reports."""
+        self._stopped = True
+
+    def _schedule(self):
+        if not self._stopped:
+            self._loop.call_later(self._interval, self._run)
+
+    def _run(self):
+        if self._stopped:
+            return
+        self.report()
+        self._schedule()
+
+    def report(self) -> tuple[int, int]:
+        """Send counts since last report. Return received and lost counts."""
+        received, lost = self._counters()
+        last_received, last_lost = self._last
+        self._last = (received, lost)
+        received = min(max(received - last_received, 0), CongestionReporter.MAX_COUNT)
+        lost = min(max(lost - last_lost, 0), CongestionReporter.MAX_COUNT)
+        stats = self._stats
+        stats["reports"] += 1
+        stats["received"] += received
+        stats["lost"] += lost
+        self._send(received, lost)
+        return received, lost
+
+    @property
+    def interval(self) -> float:
+        """Return seconds between reports."""
+        return self._interval
+
+    @property
+    def stats(self) -> dict:
+        """Return totals of reported counts."""
+        return dict(self._stats)
+
+
 class AVHandler:
-    """AV Handler."""
+    """AV Handler.
+
+    Video and audio are processed by separate pipelines, each in its own thread.
+
+    When a pipeline can not keep up, the overload policy is applied
+    and the mode is emitted with the `overload` event.
+    The `overload_end` event is emitted when both pipelines have caught up.
+
+    :param overload: Overload policy; Defaults to policy with `OVERLOAD_MODE`
+    """
+
+    QUEUE_SIZE = 5000
+    AUDIO_QUEUE_SIZE = 32
+
+    # Overload mode used if no policy is given. One of `OverloadPolicy.MODES`.
+    # Defaults to stopping session.
+    OVERLOAD_MODE = "stop"
+
+    # Executor for recovering video frames. One of "thread", "process" or None.
+    # None decodes inline. pyjerasure holds the GIL while decoding
+    # so only "process" decodes in parallel with the video worker.
+    FEC_EXECUTOR = None
+    FEC_WORKERS = 2
 
     def __del__(self):
-        self._queue.clear()
+        self._video.clear()
+        self._audio.clear()
 
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, overload: OverloadPolicy = None):
         self._session = session
         self._receiver = None
-        self._v_stream = None
-        self._a_stream = None
-        self._cipher = None
-        self._queue = deque(maxlen=5000)
+        self._video = AVPipeline(
+            AVStream.TYPE_VIDEO, session.type, AVHandler.QUEUE_SIZE
+        )
+        self._audio = AVPipeline(
+            AVStream.TYPE_AUDIO,
+            session.type,
+            AVHandler.AUDIO_QUEUE_SIZE,
+            drop_oldest=True,
+            # Audio key positions skip over video data so a window is wasted.
+            keystream_window=0,
+        )
+        self._fec_executor = None
         self._worker = None
-        self._last_congestion = 0
-        self._waiting = False
+        self._congestion = None
+        self._video_corrupt = CorruptReporter(self._send_corrupt, self._get_rtt)
+        self._audio_corrupt = CorruptReporter(self._send_corrupt, self._get_rtt)
+        self._overload_policy = overload or OverloadPolicy(AVHandler.OVERLOAD_MODE)
+        self._overload = None
+        self._overloads = 0
 
     def add_receiver(self, receiver: AVReceiver):
         """Add AV reciever and run."""
@@ -42,90 +448,208 @@ class AVHandler:
             self._receiver._set_session(self._session)
             self._receiver._get_video_codec()
 
-    def set_cipher(self, cipher):
+    def set_cipher(self, cipher: StreamCipher):
         """Set cipher. Schedules handler to run."""
-        self._cipher = cipher
+        self._video.set_cipher(cipher)
+        self._audio.set_cipher(cipher)
         self._session.events.emit("av_ready")
 
-    def set_headers(self, v_header: bytes, a_header: bytes):
-        """Set headers."""
+    def set_headers(
+        self,
+        v_header: bytes,
+        a_header: bytes,
+        mtu: int = None,
+        v_headers: Sequence[bytes] = None,
+        congestion_interval: int = 0,
+    ):
+        """Set headers.
+
+        :param mtu: Stream MTU used to size frame buffers
+        :param v_headers: Video header for each adaptive stream index
+        :param congestion_interval: Milliseconds between congestion reports
+        """
+        slot_size = mtu or FrameBuffer.DEFAULT_SLOT_SIZE
         if self._receiver:
-            self._v_stream = AVStream(
+            self._fec_executor = self._new_fec_executor()
+            self._video.stream = AVStream(
                 "video",
                 v_header,
                 self._receiver.handle_video_data,
-                self._send_corrupt,
+                self._video_corrupt.report,
+                slot_size,
+                v_headers,
+                self._fec_executor,
+                int(self._session.fps),
+                callback_complete=self._video_corrupt.complete,
             )
-            self._a_stream = AVStream(
+            self._audio.stream = AVStream(
                 "audio",
                 a_header,
                 self._receiver.handle_audio_data,
-                self._send_corrupt,
+                self._audio_corrupt.report,
+                slot_size,
+                callback_complete=self._audio_corrupt.complete,
             )
             # pylint: disable=protected-access
             self._receiver._get_audio_codec(a_header)
-            # self._schedule_congestion()
+            self._start_congestion(congestion_interval)
 
-    def add_packet(self, msg: bytes):
-        """Add Packet."""
-        packet = Packet.parse(msg, {"host_type": self._session.type})
-        if len(self._queue) >= self._queue.maxlen:
-            self._queue.clear()
-            self._waiting = True
-            _LOGGER.warning("AV Handler max queue size exceeded")
+    def _new_fec_executor(self) -> Optional[Executor]:
+        """Return executor for FEC or None to decode inline."""
+        if AVHandler.FEC_EXECUTOR == "thread":
+            return ThreadPoolExecutor(
+                AVHandler.FEC_WORKERS, thread_name_prefix="AV FEC"
+            )
+        if AVHandler.FEC_EXECUTOR == "process":
+            return ProcessPoolExecutor(AVHandler.FEC_WORKERS)
+        return None
+
+    def _check_queue(self) -> bool:
+        """Apply overload policy. Return False if packets should be dropped."""
+        if self._overload == OverloadPolicy.STOP:
+            return False
+        policy = self._overload_policy
+        video = self._video.load(policy)
+        audio = self._audio.load(policy)
+        if self._overload is None:
+            mode = policy.select(video, audio)
+            if mode is None:
+                return True
+            return self._enter_overload(mode)
+        if max(video, audio) < OverloadPolicy.RESUME_LOAD:
+            _LOGGER.info("AV Handler caught up")
+            self._overload = None
+            self._audio.dropping = False
+            self._session.events.emit("overload_end")
+        elif (
+            self._overload == OverloadPolicy.SHED_AUDIO
+            and video >= OverloadPolicy.ESCALATE_LOAD
+        ):
+            return self._enter_overload(OverloadPolicy.SKIP)
+        return True
+
+    def _enter_overload(self, mode: str) -> bool:
+        """Apply overload mode. Return False if packets should be dropped."""
+        _LOGGER.warning("AV Handler overloaded. Mode: %s", mode)
+        self._overload = mode
+        self._overloads += 1
+        self._session.events.emit("overload", mode)
+        if mode == OverloadPolicy.STOP:
+            self._video.skip()
+            self._audio.clear()
             self._session.error = (
                 "Decoder could not keep up. Try lowering framerate / resolution"
             )
             self._session.stop()
+            return False
+        if mode == OverloadPolicy.SHED_AUDIO:
+            self._audio.clear()
+            self._audio.dropping = True
+        else:
+            self._video.skip()
+        return True
+
+    def add_packet(self, msg: bytes):
+        """Add Packet."""
+        packet = Packet.parse(msg, {"host_type": self._session.type})
+        if not self._check_queue():
             return
-        if self._waiting and packet.unit_index == 0:
-            self._waiting = False
-        if not self._waiting:
-            self._queue.append(packet)
+        if packet.type == AVPacket.Type.VIDEO:
+            pipeline = self._video
+            if pipeline.dropping and packet.unit_index == 0:
+                pipeline.dropping = False
+        else:
+            pipeline = self._audio
+        if pipeline.dropping:
+            pipeline.drop()
+            return
+        pipeline.put(packet, len(msg))
 
-    def process_packet(self):
-        """Process AV Packet."""
-        try:
-            packet = self._queue.popleft()
-        except IndexError:
-            time.sleep(0.0001)
+    def add_packets(self, msgs: Sequence[bytes]):
+        """Add batch of AV datagrams.
+
+        Headers are parsed in bulk when numpy is installed.
+        Otherwise each datagram is added with `add_packet`.
+        """
+        if AV_BATCH_DTYPE is None or self._video.dropping:
+            for msg in msgs:
+                self.add_packet(msg)
             return
-        packet.decrypt(self._cipher)
-        self._handle(packet)
+        if not msgs or not self._check_queue():
+            return
+        video = []
+        audio = []
+        for msg in msgs:
+            if msg[0] & 0x0F == AVPacket.Type.VIDEO:
+                video.append(msg)
+            else:
+                audio.append(msg)
+        for pipeline, batch in ((self._video, video), (self._audio, audio)):
+            if not batch:
+                continue
+            if pipeline.dropping:
+                pipeline.drop(len(batch))
+                continue
+            pipeline.put(batch, sum(map(len, batch)))
+
+    def process_packet(self):
+        """Process queued AV Packets of both pipelines in current thread."""
+        self._video.process()
+        self._audio.process()
 
     def worker(self):
-        """Worker for AV Handler. Run in thread."""
-        while not self._session.is_stopped:
-            self.process_packet()
+        """Worker for AV Handler. Run in thread.
+
+        Processes video in current thread and audio in a new thread.
+        """
+        audio = threading.Thread(
+            target=self._audio.worker, args=(self._is_stopped,), name="AV Audio"
+        )
+        audio.start()
+        self._video.worker(self._is_stopped)
+        audio.join()
+        if self._congestion is not None:
+            self._congestion.stop()
+        if self._fec_executor is not None:
+            self._fec_executor.shutdown(wait=False)
         _LOGGER.debug("Closing AV Receiver")
         self._receiver.close()
-        self._queue.clear()
         _LOGGER.debug("AV Receiver Closed")
 
-    def _handle(self, packet: AVPacket):
-        # _LOGGER.debug(packet)
-        if not self._receiver:
+    def _is_stopped(self) -> bool:
+        return self._session.is_stopped
+
+    def _start_congestion(self, interval: int = 0):
+        """Start congestion reports.
+
+        :param interval: Milliseconds between reports
+        """
+        if self._congestion is not None:
+            self._congestion.stop()
+        interval = interval / 1000 if interval else CongestionReporter.DEFAULT_INTERVAL
+        self._congestion = CongestionReporter(
+            self._send_congestion, self._counters, interval
+        )
+        self._congestion.start(self._session.loop)
+
+    def _counters(self) -> tuple[int, int]:
+        return self.received, self.lost
+
+    def _send_congestion(self, received: int, lost: int):
+        if self._session.is_stopped:
+            self._congestion.stop()
             return
-        if packet.type == AVPacket.Type.VIDEO:
-            stream = self._v_stream
-        else:
-            stream = self._a_stream
-        stream.handle(packet)
-
-    def _schedule_congestion(self):
-        self._session.loop.call_later(0.5, self._send_congestion)
-
-    def _send_congestion(self):
-        # TODO: Use or don't use?
-        now = time.time()
-        if now - self._last_congestion > 0.2 and not self._session.is_stopped:
-            self._session._sync_run_io(  # pylint: disable=protected-access
-                self._session.stream.send_congestion, self.received, self.lost
-            )
-            self._v_stream.reset_counters()
-            self._a_stream.reset_counters()
-            self._last_congestion = now
-            self._schedule_congestion()
+        self._session.stream.send_congestion(received, lost)
+
+    def _get_rtt(self) -> Optional[float]:
+        """Return stream RTT or None if stream is stopped.
+
+        Called from AV worker threads which may run after session stops.
+        """
+        stream = self._session.stream
+        if stream is None or stream.stop_event.is_set():
+            return None
+        return stream.rtt
 
     def _send_corrupt(self, last_complete: int, current: int):
         """Handle corrupt frame.
@@ -134,195 +658,898 @@ class AVHandler:
         :param current: The current frame index
         """
         # current -= 1 # Could be wrong
-        if not self._session.is_stopped:
-            self._session.stream.send_corrupt(last_complete, current)
+        stream = self._session.stream
+        if not self._session.is_stopped and stream is not None:
+            stream.send_corrupt(last_complete, current)
 
     @property
     def has_receiver(self) -> bool:
         """Return True if receiver is not None."""
         return self._receiver is not None
 
+    @property
+    def stats(self) -> dict:
+        """Return AV Handler stats."""
+        video = self._video.stats
+        audio = self._audio.stats
+        packets = video["packets"] + audio["packets"]
+        return {
+            "packets": packets,
+            "overload": self._overload,
+            "overloads": self._overloads,
+            "video": video,
+            "audio": audio,
+            "corrupt": {
+                "video": self._video_corrupt.stats,
+                "audio": self._audio_corrupt.stats,
+            },
+            "congestion": self._congestion.stats if self._congestion else {},
+        }
+
     @property
     def lost(self) -> int:
         """Return Total AV packets lost."""
-        return self._v_stream.lost + self._a_stream.lost
+        return self._video.stream.lost + self._audio.stream.lost
 
     @property
     def received(self) -> int:
         """Return Total AV packets received."""
-        return self._v_stream.received + self._a_stream.received
+        return self._video.stream.received + self._audio.stream.received
+
+
+class FrameBuffer:
+    """Buffer for reassembling the units of a frame.
+
+    Units are kept by reference and tracked in a bitmap.
+    Completed frames are joined into new bytes with a single copy.
+
+    Units are only copied for FEC decoding. They are then zero padded into
+    aligned slots of a reused buffer.
+
+    :param slot_size: Size of FEC slots; Slots grow if a larger unit is added
+    :param skip: Number of bytes at start of each unit which are not frame data
+    """
+
+    DEFAULT_SLOT_SIZE = 2048
+    GROWTH = 2
+    ALIGN = 16
+
+    @staticmethod
+    def align(size: int) -> int:
+        """Return size rounded up to slot alignment."""
+        return -(-size // FrameBuffer.ALIGN) * FrameBuffer.ALIGN
+
+    def __init__(self, slot_size: int, skip: int = 0):
+        self._slot_size = FrameBuffer.align(slot_size)
+        self._zeros = memoryview(bytes(self._slot_size))
+        self._skip = skip
+        self._buf = bytearray()
+        self._view = memoryview(self._buf)
+        self._data = []
+        self._received = 0
+        self._units = 0
+        self._stats = {"allocations": 0, "frames": 0, "units": 0, "bytes": 0}
+
+    def _allocate(self, size: int):
+        """Replace erasure buffer with new buffer of at least size."""
+        size = max(size, len(self._buf) * FrameBuffer.GROWTH)
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._stats["allocations"] += 1
+
+    def reset(self, units: int):
+        """Prepare buffer for new frame.
+
+        :param units: Total number of units in frame
+        """
+        self._received = 0
+        self._units = units
+        if len(self._data) < units:
+            self._data.extend([b""] * (units - len(self._data)))
+
+    def add(self, unit_index: int, data: Union[bytes, memoryview]) -> bool:
+        """Add unit. Return False if unit index is invalid.
+
+        Data is not copied and must not be changed until frame is assembled.
+        """
+        if not 0 <= unit_index < self._units:
+            return False
+        self._data[unit_index] = data
+        self._received |= 1 << unit_index
+        return True
+
+    def has(self, unit_index: int) -> bool:
+        """Return True if unit has been received."""
+        return bool(self._received >> unit_index & 1)
+
+    def received_count(self, count: int) -> int:
+        """Return number of received units within the first count units."""
+        return bin(self._received & ((1 << count) - 1)).count("1")
+
+    def is_complete(self, count: int) -> bool:
+        """Return True if the first count units have been received."""
+        mask = (1 << count) - 1
+        return self._received & mask == mask
+
+    def received_units(self, count: int) -> list[int]:
+        """Return indexes of received units within the first count units."""
+        return [index for index in range(count) if self._received >> index & 1]
+
+    def missing_units(self, count: int) -> list[int]:
+        """Return indexes of missing units within the first count units."""
+        return [index for index in range(count) if not self._received >> index & 1]
+
+    def unit(self, unit_index: int) -> Union[bytes, memoryview]:
+        """Return unit data."""
+        return self._data[unit_index]
+
+    def _fit_slots(self):
+        """Grow slot size to fit the largest received unit."""
+        size = max(
+            (len(self._data[index]) for index in self.received_units(self._units)),
+            default=0,
+        )
+        if size > self._slot_size:
+            self._slot_size = FrameBuffer.align(size)
+            self._zeros = memoryview(bytes(self._slot_size))
+
+    def erasure_data(self, count: int) -> bytes:
+        """Return first count units zero padded to slots for FEC decoding.
+
+        Slots of missing units are zeroed.
+        """
+        self._fit_slots()
+        slot_size = self._slot_size
+        if len(self._buf) < count * slot_size:
+            self._allocate(count * slot_size)
+        view = self._view
+        offset = 0
+        for index in range(count):
+            length = 0
+            if self._received >> index & 1:
+                unit = self._data[index]
+                length = len(unit)
+                view[offset : offset + length] = unit
+            view[offset + length : offset + slot_size] = self._zeros[length:]
+            offset += slot_size
+        return bytes(view[:offset])
+
+    def assemble(self, count: int, prefix: bytes = b"") -> bytes:
+        """Return prefix and data of the first count units.
+
+        :param count: Number of units
+        :param prefix: Bytes placed before frame data
+        """
+        skip = self._skip
+        units = self._data[:count]
+        if skip:
+            units = [unit[skip:] for unit in units]
+        if prefix:
+            units.insert(0, prefix)
+        frame = b"".join(units)
+        stats = self._stats
+        stats["frames"] += 1
+        stats["units"] += count
+        stats["bytes"] += len(frame)
+        return frame
+
+    @property
+    def slot_size(self) -> int:
+        """Return slot size which fits all received units."""
+        self._fit_slots()
+        return self._slot_size
+
+    @property
+    def stats(self) -> dict:
+        """Return buffer stats."""
+        stats = dict(self._stats)
+        stats["size"] = len(self._buf)
+        return stats
+
+
+def _seq_diff(start: int, end: int) -> int:
+    """Return signed difference of 16 bit sequence numbers."""
+    return (end - start + 0x8000) % 0x10000 - 0x8000
+
+
+@lru_cache(maxsize=64)
+def _get_fec_matrix(units_src: int, units_fec: int):
+    """Return cauchy matrix for number of src and fec units."""
+    return pyjerasure.Matrix("cauchy", units_src, units_fec, 8)
+
+
+def _decode_fec(
+    units_src: int, units_fec: int, data: bytes, missing: list[int], size: int
+) -> bytes:
+    """Return src slots restored from erasure data. May run in executor."""
+    return pyjerasure.decode_from_bytes(
+        _get_fec_matrix(units_src, units_fec),
+        data,
+        missing,
+        size,
+        data_only=True,
+    )
+
+
+class FECJob:
+    """FEC decode of a frame.
+
+    Holds what is needed to rebuild the frame after the frame buffer is reused.
+
+    :param deadline: Time from `time.perf_counter` after which result is discarded
+    """
+
+    __slots__ = (
+        "frame_index",
+        "units_src",
+        "missing",
+        "lengths",
+        "size",
+        "deadline",
+        "start",
+        "future",
+    )
+
+    def __init__(
+        self,
+        frame_index: int,
+        frame_buffer: FrameBuffer,
+        units_src: int,
+        missing: list[int],
+        deadline: float = float("inf"),
+    ):
+        self.frame_index = frame_index
+        self.units_src = units_src
+        self.missing = missing
+        self.lengths = [
+            len(frame_buffer.unit(index)) if frame_buffer.has(index) else 0
+            for index in range(units_src)
+        ]
+        self.size = frame_buffer.slot_size
+        self.deadline = deadline
+        self.start = time.perf_counter()
+        self.future = None
+
+    @property
+    def done(self) -> bool:
+        """Return True if decode has finished."""
+        return self.future.done()
+
+
+class FECDecoder:
+    """Recovers missing src units of a frame from FEC units.
+
+    Decodes inline unless an executor is given.
+
+    :param executor: Executor to decode in
+    """
+
+    def __init__(self, executor: Executor = None):
+        self._executor = executor
+        self._stats = {
+            "recovered": 0,
+            "failed": 0,
+            "late": 0,
+            "time": 0.0,
+            "time_max": 0.0,
+        }
+
+    def submit(
+        self,
+        frame_buffer: FrameBuffer,
+        frame_index: int,
+        units_src: int,
+        units_fec: int,
+        missing: list[int],
+        deadline: float = float("inf"),
+    ) -> Optional[FECJob]:
+        """Start decoding missing src units in executor.
+
+        Return job or None if FEC is unavailable.
+        Erasure data is copied so the frame buffer can be reused.
+        """
+        return self._start(
+            frame_buffer, frame_index, units_src, units_fec, missing, deadline
+        )
+
+    def _start(
+        self,
+        frame_buffer: FrameBuffer,
+        frame_index: int,
+        units_src: int,
+        units_fec: int,
+        missing: list[int],
+        deadline: float = float("inf"),
+        inline: bool = False,
+    ) -> Optional[FECJob]:
+        if pyjerasure is None:
+            return None
+        _LOGGER.debug("Attempting FEC Decode")
+        job = FECJob(frame_index, frame_buffer, units_src, missing, deadline)
+        data = frame_buffer.erasure_data(units_src + units_fec)
+        args = (units_src, units_fec, data, missing, job.size)
+        if self._executor is not None and not inline:
+            job.future = self._executor.submit(_decode_fec, *args)
+            return job
+        job.future = Future()
+        try:
+            job.future.set_result(_decode_fec(*args))
+        except Exception as err:  # pylint: disable=broad-except
+            job.future.set_exception(err)
+        return job
+
+    def restore(self, job: FECJob, frame_buffer: FrameBuffer) -> bool:
+        """Add src units of finished job missing from frame buffer.
+
+        Return True if successful.
+        """
+        try:
+            restored = job.future.result()
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.error(err)
+            restored = b""
+        if restored:
+            view = memoryview(restored)
+            size = job.size
+            missing = set(job.missing)
+            for index, length in enumerate(job.lengths):
+                if frame_buffer.has(index):
+                    continue
+                offset = size * index
+                if index in missing:
+                    length = len(restored[offset : offset + size].rstrip(b"\x00"))
+                frame_buffer.add(index, view[offset : offset + length])
+        elapsed = time.perf_counter() - job.start
+        stats = self._stats
+        stats["time"] += elapsed
+        stats["time_max"] = max(stats["time_max"], elapsed)
+        if restored:
+            _LOGGER.debug("FEC Successful")
+            stats["recovered"] += 1
+            return True
+        _LOGGER.warning("FEC Failed")
+        stats["failed"] += 1
+        return False
+
+    def discard(self, job: FECJob):
+        """Discard job which is too late to be used."""
+        job.future.cancel()
+        self._stats["late"] += 1
+
+    def decode(
+        self,
+        frame_buffer: FrameBuffer,
+        units_src: int,
+        units_fec: int,
+        missing: list[int],
+    ) -> bool:
+        """Restore missing src units into frame buffer inline.
+
+        Return True if successful.
+        """
+        job = self._start(frame_buffer, -1, units_src, units_fec, missing, inline=True)
+        if job is None:
+            return False
+        return self.restore(job, frame_buffer)
+
+    @property
+    def executor(self) -> Optional[Executor]:
+        """Return executor."""
+        return self._executor
+
+    @property
+    def stats(self) -> dict:
+        """Return FEC stats. Times are in seconds from start until restored."""
+        stats = dict(self._stats)
+        attempts = stats["recovered"] + stats["failed"]
+        stats["time_avg"] = stats["time"] / attempts if attempts else 0.0
+        return stats
+
+
+class CorruptReporter:
+    """Coalesces corrupt frame reports and limits how often they are sent.
+
+    Reports are sent at most once per interval, which is the RTT clamped to
+    `MIN_INTERVAL` and `MAX_INTERVAL`. Reports made in between are merged into
+    one range. A pending range is dropped if its frames are completed before
+    it is sent.
+
+    :param send: Callback which sends report for start and end frame index
+    :param get_rtt: Callable returning RTT in seconds
+    """
+
+    MIN_INTERVAL = 0.02
+    MAX_INTERVAL = 0.5
+
+    def __init__(
+        self,
+        send: Callable[[int, int], None],
+        get_rtt: Callable[[], float] = None,
+    ):
+        self._send = send
+        self._get_rtt = get_rtt
+        self._lock = threading.Lock()
+        self._pending = None
+        self._last_sent = None
+        self._stats = {"reports": 0, "sent": 0, "suppressed": 0}
+
+    def _take_due(self) -> Optional[tuple[int, int]]:
+        """Return pending range if it may be sent now."""
+        if self._pending is None:
+            return None
+        now = time.perf_counter()
+        if self._last_sent is not None and now - self._last_sent < self.interval:
+            return None
+        pending = self._pending
+        self._pending = None
+        self._last_sent = now
+        self._stats["sent"] += 1
+        return pending
+
+    def _flush(self, pending: Optional[tuple[int, int]]):
+        if pending is not None:
+            self._send(*pending)
+
+    def report(self, start: int, end: int):
+        """Report frames from start until end as corrupt."""
+        with self._lock:
+            self._stats["reports"] += 1
+            if self._pending is not None:
+                self._stats["suppressed"] += 1
+                pending_start, pending_end = self._pending
+                if _seq_diff(pending_start, start) > 0:
+                    start = pending_start
+                if _seq_diff(end, pending_end) > 0:
+                    end = pending_end
+            self._pending = (start, end)
+            pending = self._take_due()
+        self._flush(pending)
+
+    def complete(self, frame_index: int):
+        """Handle completed frame. Sends pending report if due."""
+        with self._lock:
+            if self._pending is not None:
+                start, end = self._pending
+                if start == frame_index:
+                    start = (start + 1) & 0xFFFF
+                    self._pending = (start, end)
+                    if _seq_diff(start, end) <= 0:
+                        self._pending = None
+                        self._stats["suppressed"] += 1
+            pending = self._take_due()
+        self._flush(pending)
+
+    @property
+    def interval(self) -> float:
+        """Return minimum seconds between reports."""
+        rtt = self._get_rtt() if self._get_rtt is not None else None
+        if rtt is None:
+            return CorruptReporter.MAX_INTERVAL
+        return min(
+            max(rtt, CorruptReporter.MIN_INTERVAL), CorruptReporter.MAX_INTERVAL
+        )
+
+    @property
+    def stats(self) -> dict:
+        """Return report stats."""
+        stats = dict(self._stats)
+        stats["pending"] = self._pending is not None
+        return stats
 
 
 class AVStream:
-    """AV Stream."""
+    """AV Stream.
+
+    Completed frames are passed to `callback_done` as bytes.
+
+    Video header is only placed before the first frame, the first frame
+    after a corrupt frame and the first frame after the adaptive stream changes.
+
+    If a FEC executor is given, frames are recovered asynchronously.
+    A recovered frame is only delivered if it is restored within
+    `FEC_DEADLINE_FRAMES` frame intervals and before the next frame is delivered.
+    Otherwise it is discarded and a keyframe is requested.
+
+    Frames are recovered with FEC as soon as enough units are received.
+    Missing units of frames which can not be recovered yet are only treated
+    as lost after `reorder_window` later packets. Until then an incomplete frame
+    is held so late units can complete it.
+
+    :param slot_size: Initial size of FEC slots of frame buffers
+    :param adaptive_headers: Video header for each adaptive stream index
+    :param fec_executor: Executor to recover frames in
+    :param fps: Stream FPS used for FEC deadline
+    :param reorder_window: Packets to wait for reordered units;
+        Defaults to `REORDER_WINDOW`
+    :param callback_complete: Called with index of each completed frame
+    """
 
     TYPE_VIDEO = "video"
     TYPE_AUDIO = "audio"
 
+    # First two decrypted bytes of video units are the difference
+    # of the unit size and the data size.
+    VIDEO_UNIT_SKIP = 2
+
+    FEC_DEADLINE_FRAMES = 1
+
+    # Number of later packets to wait for a missing unit before it is lost.
+    REORDER_WINDOW = 4
+
     def __init__(
         self,
         av_type: str,
         header: bytes,
         callback_done: Callable[[bytes], None],
         callback_corrupt: Callable[[int, int], None],
+        slot_size: int = FrameBuffer.DEFAULT_SLOT_SIZE,
+        adaptive_headers: Sequence[bytes] = None,
+        fec_executor: Executor = None,
+        fps: int = 60,
+        reorder_window: int = None,
+        callback_complete: Callable[[int], None] = None,
     ):
         self._type = av_type
         self._callback_done = callback_done
         self._callback_corrupt = callback_corrupt
+        self._callback_complete = callback_complete
         self._header = header
-        self._packets = []
         self._frame = -1
+        self._frame_src = 0
+        self._frame_fec = 0
+        self._frame_end = -1
         self._last_unit = -1
         self._lost = 0
         self._received = 0
-        self._last_index = -1
-        self._frame_bad_order = False
+        self._reordered = 0
+        self._late = 0
+        self._highest_index = -1
+        self._seen = 0
+        self._reorder_window = (
+            AVStream.REORDER_WINDOW if reorder_window is None else reorder_window
+        )
+        self._held = -1
+        self._held_src = 0
+        self._held_fec = 0
+        self._held_end = -1
+        self._held_frames = 0
+        self._frame_done = False
+        self._frame_recovering = False
         self._last_complete = 0
-        self._missing = []
+        self._prime = av_type == AVStream.TYPE_VIDEO
+        self._primes = 0
+        self._fec = FECDecoder(fec_executor)
+        self._fec_job = None
+        self._fec_deadline = AVStream.FEC_DEADLINE_FRAMES / fps
+        self._adaptive_index = -1
+        self._adaptive_headers = []
 
         if self._type not in [AVStream.TYPE_VIDEO, AVStream.TYPE_AUDIO]:
             raise ValueError("Invalid Type")
         if av_type == AVStream.TYPE_VIDEO:
-            self._header = b"".join([self._header, bytes(FFMPEG_PADDING)])
+            padding = bytes(FFMPEG_PADDING)
+            self._header = b"".join([self._header, padding])
+            self._adaptive_headers = [
+                b"".join([header, padding]) for header in adaptive_headers or []
+            ]
+            args = (slot_size, AVStream.VIDEO_UNIT_SKIP)
+        else:
+            args = (slot_size,)
+        self._frame_buffer = FrameBuffer(*args)
+        # Incomplete previous frame waiting for reordered units.
+        self._held_buffer = FrameBuffer(*args)
+        # Frames recovered asynchronously are assembled separately.
+        self._fec_buffer = FrameBuffer(*args) if fec_executor else None
 
     def reset_counters(self):
         """Reset packet counters."""
         self._lost = self._received = 0
 
-    def _set_new_frame(self, packet: AVPacket):
-        self._frame_bad_order = False
-        self._missing = []
-        self._packets = []
-        self._frame = packet.frame_index
+    def _set_new_frame(
+        self, frame_index: int, units_src: int, units_fec: int, end: int
+    ):
+        self._frame_done = False
+        self._frame_recovering = False
+        self._frame_buffer.reset(units_src + units_fec)
+        self._frame = frame_index
+        self._frame_src = units_src
+        self._frame_fec = units_fec
+        self._frame_end = end
         self._last_unit = -1
         # _LOGGER.debug("Started New Frame: %s", self.frame)
 
-    def _handle_missing_packet(self, index: int, unit_index: int):
-        """Mark missing unit indexes as missing. Write null placeholder bytes for each."""
-        if not self._frame_bad_order:
-            _LOGGER.warning(
-                "Received unit out of order: %s, expected: %s",
-                unit_index,
-                self.last_unit + 1,
+    def _track_index(self, index: int):
+        """Count reordered and lost units from packet index.
+
+        Bit n of the window is set if the packet n before the highest was seen.
+        Packets are lost when they leave the window unseen.
+        """
+        window = self._reorder_window
+        if self._highest_index < 0:
+            self._highest_index = index
+            self._seen = (1 << (window + 1)) - 1
+            return
+        if index == (self._highest_index + 1) & 0xFFFF:
+            # Next packet in order.
+            seen = self._seen
+            self._lost += not seen >> window & 1
+            self._seen = (seen << 1 | 1) & ((1 << (window + 1)) - 1)
+            self._highest_index = index
+            return
+        diff = _seq_diff(self._highest_index, index)
+        if diff > 0:
+            seen = self._seen << diff
+            self._lost += diff - bin(seen >> (window + 1)).count("1")
+            self._seen = (seen | 1) & ((1 << (window + 1)) - 1)
+            self._highest_index = index
+        elif -diff > window:
+            self._late += 1
+        elif diff and not self._seen >> -diff & 1:
+            self._seen |= 1 << -diff
+            self._reordered += 1
+
+    def _expired(self, end: int) -> bool:
+        """Return True if reorder window has passed packet index."""
+        return _seq_diff(end, self._highest_index) >= self._reorder_window
+
+    def _hold_frame(self):
+        """Keep incomplete current frame for units arriving late."""
+        if self._held >= 0:
+            self._finish_held()
+        if self.frame < 0 or self._frame_done or self._frame_recovering:
+            return
+        if not self._reorder_window:
+            self._recover(
+                self.frame, self._frame_src, self._frame_fec, self._frame_buffer
             )
-            self._frame_bad_order = True
-
-        _range = range(self.last_unit + 1, unit_index)
-        for _ in _range:
-            self._packets.append(b"")
-        self._missing.extend(range(self.last_unit + 1, unit_index))
-        if self._lost > 65535:
-            self._lost = 0
-        self._lost += index - self._last_index - 1
-        if self._lost > 65535:
-            self._lost = 1
-        self._last_unit = unit_index - 1
-
-    def _handle_src_packet(self, packet: AVPacket):
-        if packet.is_last_src and not self._frame_bad_order:
-            if len(self._packets) < packet.frame_length_src:
-                _LOGGER.error("Frame buffer missing packets")
-                return
-            self._last_complete = packet.frame_index
+            return
+        self._held = self.frame
+        self._held_src = self._frame_src
+        self._held_fec = self._frame_fec
+        self._held_end = self._frame_end
+        self._held_buffer, self._frame_buffer = self._frame_buffer, self._held_buffer
 
-            if self._type == AVStream.TYPE_AUDIO:
-                self._callback_done(b"".join(self._packets[: packet.frame_length_src]))
+    def _finish_held(self, inline: bool = False):
+        """Recover held frame or report it as lost.
+
+        :param inline: Decode inline even if there is an executor
+        """
+        frame_index = self._held
+        self._held = -1
+        if self._recover(
+            frame_index, self._held_src, self._held_fec, self._held_buffer, inline
+        ):
+            return
+        self._report_lost(frame_index)
+
+    def _set_adaptive_index(self, adaptive_stream_index: int):
+        """Switch video header when adaptive stream changes."""
+        if adaptive_stream_index == self._adaptive_index:
+            return
+        if self._adaptive_index >= 0:
+            _LOGGER.info("Adaptive stream changed to %s", adaptive_stream_index)
+        self._adaptive_index = adaptive_stream_index
+        if 0 <= adaptive_stream_index < len(self._adaptive_headers):
+            self._header = self._adaptive_headers[adaptive_stream_index]
+        self._prime = True
+
+    def _complete_frame(
+        self, frame_index: int, units_src: int, frame_buffer: FrameBuffer = None
+    ):
+        """Pass assembled frame to callback."""
+        job = self._fec_job
+        if job is not None and _seq_diff(job.frame_index, frame_index) >= 0:
+            if job.frame_index == frame_index:
+                self._fec_job = None
+                job.future.cancel()
             else:
-                # First two decrypted bytes is the difference of the unit size and the data size.
-                self._callback_done(
-                    self._header
-                    + b"".join(
-                        [
-                            packet[2:]
-                            for packet in self._packets[: packet.frame_length_src]
-                        ]
-                    )
-                )
-
-    def _handle_fec_packet(self, packet: AVPacket):
-        try:
-            import pyjerasure  # pylint: disable=import-outside-toplevel
-        except ModuleNotFoundError:
+                self._discard_fec()
+        if frame_index == self.frame:
+            self._frame_done = True
+        self._last_complete = frame_index
+        prefix = b""
+        if self._prime:
+            prefix = self._header
+            self._prime = False
+            self._primes += 1
+        frame_buffer = frame_buffer or self._frame_buffer
+        self._callback_done(frame_buffer.assemble(units_src, prefix))
+        if self._callback_complete is not None:
+            self._callback_complete(frame_index)
+
+    def _recover(
+        self,
+        frame_index: int,
+        units_src: int,
+        units_fec: int,
+        frame_buffer: FrameBuffer,
+        inline: bool = False,
+    ) -> bool:
+        """Recover frame with FEC.
+
+        Return True if frame was completed or is being recovered.
+
+        :param inline: Decode inline even if there is an executor
+        """
+        if frame_index == self.frame:
+            self._frame_recovering = True
+        missing = frame_buffer.missing_units(units_src + units_fec)
+        if len(missing) > units_fec:
+            return False
+        if inline or self._fec.executor is None:
+            if not self._fec.decode(frame_buffer, units_src, units_fec, missing):
+                return False
+            self._complete_frame(frame_index, units_src, frame_buffer)
+            return True
+        if self._fec_job is not None:
+            self._discard_fec()
+        self._fec_job = self._fec.submit(
+            frame_buffer,
+            frame_index,
+            units_src,
+            units_fec,
+            missing,
+            time.perf_counter() + self._fec_deadline,
+        )
+        return self._fec_job is not None
+
+    def _discard_fec(self):
+        """Discard pending FEC job and request keyframe."""
+        job = self._fec_job
+        self._fec_job = None
+        self._fec.discard(job)
+        _LOGGER.warning("Discarding late FEC for frame: %s", job.frame_index)
+        self._report_lost(job.frame_index)
+
+    def _report_lost(self, frame_index: int):
+        """Request keyframe if frame was not completed otherwise."""
+        if _seq_diff(self._last_complete, frame_index) > 0:
+            self._callback_corrupt(self._last_complete + 1, max(self.frame, 0))
+            self._prime = self._type == AVStream.TYPE_VIDEO
+
+    def poll_fec(self):
+        """Deliver frame of finished FEC job or discard job if past deadline."""
+        job = self._fec_job
+        if job is None:
             return
-        if not self._frame_bad_order and not self._missing:
-            # Ignore FEC packets if all src packets received.
+        if time.perf_counter() > job.deadline:
+            self._discard_fec()
             return
-        if packet.is_last:
-            if len(self._missing) <= packet.frame_length_fec:
-                matrix = pyjerasure.Matrix(
-                    "cauchy", packet.frame_length_src, packet.frame_length_fec, 8
-                )
-                restored = b""
-                packets = self._packets
-                max_size = max([len(packet) for packet in packets])
-                size = pyjerasure.align_size(matrix, max_size)
-                missing = tuple(self._missing)
-                buf = b"".join([packet.ljust(size, b"\x00") for packet in packets])
-                _LOGGER.debug("Attempting FEC Decode")
-                try:
-                    restored = pyjerasure.decode_from_bytes(
-                        matrix,
-                        buf,
-                        missing,
-                        size,
-                    )
-                except Exception as err:  # pylint: disable=broad-except
-                    _LOGGER.error(err)
-                    return
-                if restored:
-                    self._last_complete = packet.frame_index
-                    _LOGGER.debug("FEC Successful")
-                    for index in missing:
-                        packets[index] = restored[
-                            size * index : size * (index + 1)
-                        ].rstrip(b"\x00")
-
-                    if self._type == AVStream.TYPE_AUDIO:
-                        self._callback_done(
-                            b"".join(packets[: packet.frame_length_src])
-                        )
-                    else:
-                        self._callback_done(
-                            self._header
-                            + b"".join(
-                                [
-                                    packet[2:]
-                                    for packet in packets[: packet.frame_length_src]
-                                ]
-                            )
-                        )
-                else:
-                    _LOGGER.warning("FEC Failed")
+        if not job.done:
+            return
+        self._fec_job = None
+        frame_buffer = self._fec_buffer
+        frame_buffer.reset(job.units_src)
+        if self._fec.restore(job, frame_buffer):
+            self._complete_frame(job.frame_index, job.units_src, frame_buffer)
+        else:
+            self._report_lost(job.frame_index)
 
-    def handle(self, packet: AVPacket):
-        """Handle Packet."""
-        if self._received > 65535:
-            self._received = 0
+    def _handle_unit(
+        self,
+        index: int,
+        frame_index: int,
+        unit_index: int,
+        units_src: int,
+        units_fec: int,
+        data: Union[bytes, memoryview],
+        adaptive_stream_index: int = -1,
+    ):
+        """Handle single decrypted unit."""
         self._received += 1
-        if self._received > 65535:
-            self._received = 1
+        self._track_index(index)
+        if self._fec_job is not None:
+            self.poll_fec()
+
+        # Late unit of held frame.
+        if frame_index == self._held:
+            self._held_buffer.add(unit_index, data)
+            if self._held_buffer.is_complete(self._held_src):
+                self._held = -1
+                self._held_frames += 1
+                self._complete_frame(frame_index, self._held_src, self._held_buffer)
+            elif (
+                self._held_buffer.received_count(self._held_src + self._held_fec)
+                >= self._held_src
+            ):
+                # Held frame is late so it is recovered before the current frame.
+                self._finish_held(inline=True)
+            return
 
         # New Video Frame.
-        if packet.frame_index != self.frame:
-            if self._last_complete + 1 != packet.frame_index:
-                self._callback_corrupt(self._last_complete + 1, packet.frame_index)
-            self._set_new_frame(packet)
+        if frame_index != self._frame:
+            if self._frame >= 0 and _seq_diff(self._frame, frame_index) < 0:
+                # Unit of frame which is already finished.
+                return
+            self._hold_frame()
+            expected = self._last_complete + 1
+            pending = {self._held}
+            if self._fec_job is not None:
+                pending.add(self._fec_job.frame_index)
+            # Frames which may still be completed.
+            while expected in pending:
+                expected += 1
+            if expected != frame_index:
+                self._callback_corrupt(self._last_complete + 1, frame_index)
+                self._prime = self._type == AVStream.TYPE_VIDEO
+            end = (index - unit_index + units_src + units_fec - 1) & 0xFFFF
+            self._set_new_frame(frame_index, units_src, units_fec, end)
+            if adaptive_stream_index >= 0:
+                self._set_adaptive_index(adaptive_stream_index)
 
-        # Check if packet is in order
-        if packet.unit_index != self.last_unit + 1:
-            self._handle_missing_packet(packet.index, packet.unit_index)
+        self._last_unit = unit_index
+        frame_buffer = self._frame_buffer
+        frame_buffer.add(unit_index, data)
 
-        self._last_unit += 1
+        if self._frame_done:
+            pass
+        elif frame_buffer.is_complete(units_src):
+            if self._held >= 0:
+                # Held frame can not be delivered after this frame.
+                self._finish_held(inline=True)
+            self._complete_frame(frame_index, units_src)
+        elif (
+            units_fec
+            and not self._frame_recovering
+            and frame_buffer.received_count(units_src + units_fec) >= units_src
+        ):
+            if self._held >= 0:
+                self._finish_held(inline=True)
+            self._recover(frame_index, units_src, units_fec, frame_buffer)
+        if self._held >= 0 and self._expired(self._held_end):
+            self._finish_held()
+        if (
+            not self._frame_done
+            and not self._frame_recovering
+            and self._expired(self._frame_end)
+        ):
+            self._recover(frame_index, units_src, units_fec, self._frame_buffer)
+
+    def handle(self, packet: AVPacket):
+        """Handle Packet."""
+        data = packet.data
+        adaptive_stream_index = -1
         if self._type == AVStream.TYPE_AUDIO:
-            self._packets.append(packet.data[: packet.frame_size_audio])
+            data = data[: packet.frame_size_audio]
         else:
-            self._packets.append(packet.data)
+            adaptive_stream_index = packet.adaptive_stream_index
+        self._handle_unit(
+            packet.index,
+            packet.frame_index,
+            packet.unit_index,
+            packet.frame_length_src,
+            packet.frame_length_fec,
+            data,
+            adaptive_stream_index,
+        )
 
-        # Current Frame is src.
-        if not packet.is_fec:
-            self._handle_src_packet(packet)
-        else:
-            self._handle_fec_packet(packet)
+    def handle_many(self, headers, payloads: Sequence[Union[bytes, memoryview]]):
+        """Handle batch of units for this stream in order.
+
+        :param headers: Structured array of headers from `parse_av_batch`
+        :param payloads: Decrypted payload for each header
+        """
+        columns = [
+            headers[name].tolist()
+            for name in (
+                "index",
+                "frame_index",
+                "unit_index",
+                "units_src",
+                "units_fec",
+                "audio_size",
+                "adaptive_stream_index",
+            )
+        ]
+        audio = self._type == AVStream.TYPE_AUDIO
+        for index, frame_index, unit_index, src, fec, size, adaptive, data in zip(
+            *columns, payloads
+        ):
+            if audio:
+                data = data[:size]
+            self._handle_unit(
+                index, frame_index, unit_index, src, fec, data, adaptive
+            )
 
     @property
     def frame(self) -> int:
@@ -343,3 +1570,17 @@ class AVStream:
     def received(self) -> int:
         """Return Total AV packets received."""
         return self._received
+
+    @property
+    def stats(self) -> dict:
+        """Return reassembly stats."""
+        stats = self._frame_buffer.stats
+        for key, value in self._held_buffer.stats.items():
+            stats[key] += value
+        stats["primes"] = self._primes
+        stats["lost"] = self._lost
+        stats["reordered"] = self._reordered
+        stats["late"] = self._late
+        stats["held"] = self._held_frames
+        stats["fec"] = self._fec.stats
+        return stats
@@ -7,6 +7,7 @@ PROFILE_DIR = ".pyremoteplay"
 PROFILE_FILE = ".profile.json"
 OPTIONS_FILE = ".options.json"
 CONTROLS_FILE = ".controls.json"
+NETWORK_FILE = ".network.json"
 
 RP_CRYPT_SIZE = 16
 DEFAULT_POLL_COUNT = 10
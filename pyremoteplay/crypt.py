@@ -1,6 +1,10 @@
 """Common Crypto Methods."""
 import logging
-from struct import pack_into
+import sys
+import threading
+from array import array
+from collections import OrderedDict, deque
+from typing import Callable
 
 from Cryptodome.Cipher import AES
 from Cryptodome.Hash import HMAC, SHA256
@@ -9,7 +13,7 @@ from Cryptodome.Util.strxor import strxor
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.asymmetric import ec
 
-# from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
 
@@ -23,6 +27,17 @@ _LOGGER = logging.getLogger(__name__)
 
 GMAC_REFRESH_IV = 44910
 GMAC_REFRESH_KEY_POS = 45000
+GMAC_PRECOMPUTE_KEY_POS = GMAC_REFRESH_KEY_POS * 3 // 4
+GMAC_KEY_CACHE_SIZE = 8
+
+KEYSTREAM_BACKEND_CRYPTODOME = "cryptodome"
+KEYSTREAM_BACKEND_CRYPTOGRAPHY = "cryptography"
+KEYSTREAM_BACKENDS = (KEYSTREAM_BACKEND_CRYPTODOME, KEYSTREAM_BACKEND_CRYPTOGRAPHY)
+
+_IV_MASK = (1 << 128) - 1
+_QWORD_MASK = (1 << 64) - 1
+
+_keystream_backend = KEYSTREAM_BACKEND_CRYPTODOME
 
 
 def get_gmac_key(gmac_index: int, key: bytes, init_vector: bytes) -> bytes:
@@ -89,23 +104,71 @@ def gen_iv_stream(buf: bytearray, init_vector: bytes, key_pos: int):
     """Pack buf with stream of incremented IVs.
 
     This concats the next block of IVs needed like AES CTR.
+    The IV is a little endian counter so the blocks are built in bulk
+    as pairs of little endian qwords rather than one block at a time.
     """
     length = len(buf)
     assert length % 16 == 0
     blocks = length // 16
     block_offset = (key_pos // 16) + 1  # Start at next block
-    stop = blocks + block_offset
-    current = 0
-    for block in range(block_offset, stop):
-        pack_into("!16s", buf, current, counter_add(block, init_vector))
-        current += 16
+    counter = from_b(init_vector, "little") + block_offset
+    low = counter & _QWORD_MASK
+    high = (counter >> 64) & _QWORD_MASK
+    if low + blocks > _QWORD_MASK:
+        # Low qword wraps within this batch; carry into high qword per block.
+        for block in range(blocks):
+            start = block * 16
+            buf[start : start + 16] = to_b((counter + block) & _IV_MASK, 16, "little")
+        return
+    qwords = array("Q", bytes(length))
+    qwords[0::2] = array("Q", range(low, low + blocks))
+    qwords[1::2] = array("Q", [high]) * blocks
+    if sys.byteorder != "little":
+        qwords.byteswap()
+    memoryview(buf)[:] = memoryview(qwords).cast("B")
+
+
+def _new_ecb_encrypt(backend: str, key: bytes):
+    """Return new AES ECB encrypt function for backend and key.
+
+    ECB has no chaining state so the cipher object is reusable,
+    but it is not thread safe and should only be used by one owner.
+    """
+    if backend == KEYSTREAM_BACKEND_CRYPTOGRAPHY:
+        return Cipher(algorithms.AES(key), modes.ECB()).encryptor().update
+    return AES.new(key, AES.MODE_ECB).encrypt
+
+
+def set_keystream_backend(backend: str):
+    """Set the AES backend used to generate CTR key streams.
+
+    Ciphers use the backend that was set when they were created.
+
+    :param backend: One of `KEYSTREAM_BACKENDS`
+    """
+    global _keystream_backend  # pylint: disable=global-statement
+    if backend not in KEYSTREAM_BACKENDS:
+        raise CryptError(f"Unknown keystream backend: {backend}")
+    _keystream_backend = backend
+
+
+def get_keystream_backend() -> str:
+    """Return the AES backend used to generate CTR key streams."""
+    return _keystream_backend
 
 
-# TODO: Make more efficient
 def get_key_stream(
-    key: bytes, init_vector: bytes, key_pos: int, data_len: int
+    key: bytes,
+    init_vector: bytes,
+    key_pos: int,
+    data_len: int,
+    ecb_encrypt: Callable[[bytes], bytes] = None,
 ) -> bytes:
-    """Return the minimum CTR Keystream at key position."""
+    """Return the minimum CTR Keystream at key position.
+
+    :param ecb_encrypt: AES ECB encrypt function for key;
+        A new one is created if None
+    """
     padding = key_pos % 16
     key_pos = key_pos - padding
     assert key_pos % 16 == 0
@@ -113,18 +176,13 @@ def get_key_stream(
 
     key_stream = bytearray(key_stream_len)
     gen_iv_stream(key_stream, init_vector, key_pos)
-
-    # cipher = Cipher(algorithms.AES(key), modes.ECB())
-    # encryptor = cipher.encryptor()
-    # buf = bytearray(len(key_stream) + 15)
-    # len_encrypted = encryptor.update_into(key_stream, buf)
-    # key_stream = buf[:len_encrypted] + encryptor.finalize()
-
-    cipher = AES.new(key, AES.MODE_ECB)
-    key_stream = cipher.encrypt(key_stream)
+    if ecb_encrypt is None:
+        ecb_encrypt = _new_ecb_encrypt(_keystream_backend, key)
+    key_stream = ecb_encrypt(key_stream)
 
     # Align to the overflow of the block and truncate to match packet size.
-    key_stream = key_stream[padding : padding + data_len]
+    if padding or len(key_stream) != data_len:
+        key_stream = key_stream[padding : padding + data_len]
     return key_stream
 
 
@@ -142,21 +200,38 @@ class BaseCipher:
     """Base AES CTR Cipher.
 
     Allows for random access.
+    Key stream is kept in a contiguous window addressed by absolute key pos.
+
+    :param keystream_window: Size of key stream window in bytes.
+        Rounded up to a multiple of `KEYSTREAM_LEN`.
+        If 0, key stream is only generated for requested ranges.
     """
 
     KEYSTREAM_LEN = 0x1000
+    KEYSTREAM_WINDOW = 0x10000
 
-    def __init__(self, handshake_key, secret):
+    def __init__(self, handshake_key, secret, keystream_window: int = None):
         self.handshake_key = handshake_key
         self.secret = secret
         self._base_index = 0
         self.base_key = None
         self.base_gmac_key = None
         self.base_iv = None
+        self._ecb_encrypt = None
         self.current_key = None
         self.index = 0
-        self.keystreams = []
-        self.keystream_index = 0
+        self._gmac_keys = OrderedDict()
+        self._gmac_lock = threading.Lock()
+        self._gmac_stats = {"hits": 0, "misses": 0, "precomputed": 0}
+        window = 0
+        if keystream_window != 0:
+            window = keystream_window or BaseCipher.KEYSTREAM_WINDOW
+            window = max(window, BaseCipher.KEYSTREAM_LEN * 4)
+            window = -(-window // BaseCipher.KEYSTREAM_LEN) * BaseCipher.KEYSTREAM_LEN
+        self._keystream = bytearray(window)
+        self._keystream_view = memoryview(self._keystream)
+        self._keystream_start = 0  # Absolute key pos of window start
+        self._keystream_end = 0  # Absolute key pos of generated end
 
     def _init_cipher(self):
         self.base_key, self.base_iv = get_base_key_iv(
@@ -165,49 +240,92 @@ class BaseCipher:
         self.current_key = self.base_gmac_key = get_gmac_key(
             self.index, self.base_key, self.base_iv
         )
-        self._next_key_stream()
+        self._ecb_encrypt = _new_ecb_encrypt(_keystream_backend, self.base_key)
+        self._gmac_keys.clear()
+        self._keystream_start = self._keystream_end = 0
+        if self._keystream:
+            self._next_key_stream(0, len(self._keystream))
+
+    def _next_key_stream(self, key_pos: int, end: int):
+        """Slide window forward so it covers key pos to end and fill it."""
+        chunk = BaseCipher.KEYSTREAM_LEN
+        size = len(self._keystream)
+        # Keep one chunk behind key pos for packets arriving out of order.
+        start = max(self._keystream_start, (key_pos // chunk - 1) * chunk)
+        if start + size < end:
+            start = key_pos // chunk * chunk
+        fill_from = start
+        if self._keystream_start <= start < self._keystream_end:
+            keep = self._keystream_end - start
+            offset = start - self._keystream_start
+            self._keystream[:keep] = self._keystream[offset : offset + keep]
+            fill_from = self._keystream_end
+        self._keystream_start = start
+        self._keystream_end = start + size
+        offset = fill_from - start
+        self._keystream[offset:] = get_key_stream(
+            self.base_key, self.base_iv, fill_from, size - offset, self._ecb_encrypt
+        )
 
-    def _next_key_stream(self):
-        while len(self.keystreams) < 3:
-            key_pos = self.keystream_index * BaseCipher.KEYSTREAM_LEN
-            key_stream = get_key_stream(
-                self.base_key, self.base_iv, key_pos, BaseCipher.KEYSTREAM_LEN
+    def get_key_stream(self, key_pos: int, data_len: int) -> memoryview:
+        """Return required key stream.
+
+        The returned view is only valid until the next call.
+        """
+        end = key_pos + data_len
+        if (
+            key_pos < self._keystream_start
+            or data_len > len(self._keystream) - BaseCipher.KEYSTREAM_LEN * 2
+        ):
+            # Outside of window; generate directly.
+            return memoryview(
+                get_key_stream(
+                    self.base_key, self.base_iv, key_pos, data_len, self._ecb_encrypt
+                )
             )
-            self.keystreams.append((self.keystream_index, key_stream))
-            self.keystream_index += 1
-
-    def get_key_stream(self, key_pos: int, data_len: int) -> bytes:
-        """Return required key stream."""
-        self._next_key_stream()
-        # Remove block if key pos not in queue.
-        for index, key_stream in enumerate(self.keystreams):
-            ks_index = key_stream[0]
-            if key_pos // BaseCipher.KEYSTREAM_LEN > ks_index:
-                self.keystreams.pop(index)
-            else:
-                break
-        key_stream = b""
-        if self.keystreams:
-            requires_additional = False
-            start_pos = key_pos % BaseCipher.KEYSTREAM_LEN
-            if start_pos + data_len > BaseCipher.KEYSTREAM_LEN:
-                requires_additional = True
-            end_pos = (key_pos + data_len) % BaseCipher.KEYSTREAM_LEN
-            if requires_additional:
-                if len(self.keystreams) < 2:
-                    return key_stream
-                end_pos = data_len - (BaseCipher.KEYSTREAM_LEN - start_pos)
-                key_stream = self.keystreams.pop(0)[1][start_pos:]
-                key_stream += self.keystreams[0][1][:end_pos]
-            else:
-                key_stream = self.keystreams[0][1][start_pos:end_pos]
-        return key_stream
+        if end > self._keystream_end:
+            self._next_key_stream(key_pos, end)
+        offset = key_pos - self._keystream_start
+        return self._keystream_view[offset : offset + data_len]
 
-    def gen_new_key(self):
-        """Generate new GMAC Key."""
+    def _derive_gmac_key(self, index: int) -> bytes:
+        """Return GMAC Key for refresh index."""
         if self.base_gmac_key is None:
             raise CryptError("Base GMAC Key is None")
-        self.current_key = get_gmac_key(self.index, self.base_gmac_key, self.base_iv)
+        if index == 0:
+            return self.base_gmac_key
+        return get_gmac_key(index, self.base_gmac_key, self.base_iv)
+
+    def _get_gmac_key(self, index: int) -> bytes:
+        """Return GMAC Key for refresh index from cache or derive it."""
+        with self._gmac_lock:
+            key = self._gmac_keys.get(index)
+            if key is not None:
+                self._gmac_keys.move_to_end(index)
+                self._gmac_stats["hits"] += 1
+                return key
+            self._gmac_stats["misses"] += 1
+        key = self._derive_gmac_key(index)
+        self._cache_gmac_key(index, key)
+        return key
+
+    def _cache_gmac_key(self, index: int, key: bytes):
+        with self._gmac_lock:
+            self._gmac_keys[index] = key
+            self._gmac_keys.move_to_end(index)
+            while len(self._gmac_keys) > GMAC_KEY_CACHE_SIZE:
+                self._gmac_keys.popitem(last=False)
+
+    def _precompute_gmac_key(self, index: int):
+        """Derive key for next refresh index before it is needed."""
+        if index in self._gmac_keys:
+            return
+        self._cache_gmac_key(index, self._derive_gmac_key(index))
+        self._gmac_stats["precomputed"] += 1
+
+    def gen_new_key(self):
+        """Generate new GMAC Key."""
+        self.current_key = self._get_gmac_key(self.index)
         # _LOGGER.debug("Cipher: %s, Index: %s", self.name, self.index)
         return self.current_key
 
@@ -215,32 +333,41 @@ class BaseCipher:
         """Get GMAC tag of packet."""
         init_vector = counter_add(key_pos // 16, self.base_iv)
         if key_pos > 0:
-            index = (key_pos - 1) // GMAC_REFRESH_KEY_POS
+            index, offset = divmod(key_pos - 1, GMAC_REFRESH_KEY_POS)
         else:
-            index = 0
-        if index > self.index:
+            index = offset = 0
+        if index == self.index:
+            key = self.current_key
+            self._gmac_stats["hits"] += 1
+            if offset >= GMAC_PRECOMPUTE_KEY_POS:
+                self._precompute_gmac_key(index + 1)
+        elif index > self.index:
             self.index = index
             key = self.gen_new_key()
-        elif index < self.index:
-            key = get_gmac_key(index, self.base_key, self.base_iv)
         else:
-            key = self.current_key
+            key = self._get_gmac_key(index)
         tag = get_gmac_tag(data, key, init_vector)
         return tag
 
+    @property
+    def stats(self) -> dict:
+        """Return GMAC Key cache stats."""
+        stats = dict(self._gmac_stats)
+        stats["cached"] = len(self._gmac_keys)
+        return stats
+
 
 class RemoteCipher(BaseCipher):
     """Cipher for receiving packets."""
 
-    def __init__(self, handshake_key, secret):
-        super().__init__(handshake_key, secret)
+    def __init__(self, handshake_key, secret, keystream_window: int = None):
+        super().__init__(handshake_key, secret, keystream_window)
         self._base_index = 3
         self.name = "Remote"
         self._init_cipher()
 
     def decrypt(self, data: bytes, key_pos: int) -> bytes:
         """Decrypt data."""
-        key_stream = b""
         key_stream = self.get_key_stream(key_pos, len(data))
         dec = decrypt_encrypt(self.base_key, self.base_iv, key_pos, data, key_stream)
         return dec
@@ -258,8 +385,8 @@ class RemoteCipher(BaseCipher):
 class LocalCipher(BaseCipher):
     """Cipher for sending packets."""
 
-    def __init__(self, handshake_key, secret):
-        super().__init__(handshake_key, secret)
+    def __init__(self, handshake_key, secret, keystream_window: int = None):
+        super().__init__(handshake_key, secret, keystream_window)
         self._base_index = 2
         self.name = "Local"
         self._key_pos = 0
@@ -272,7 +399,6 @@ class LocalCipher(BaseCipher):
 
     def encrypt(self, data: bytes) -> bytes:
         """Encrypt data using key stream."""
-        key_stream = b""
         key_stream = self.get_key_stream(self.key_pos, len(data))
         enc = decrypt_encrypt(
             self.base_key, self.base_iv, self.key_pos, data, key_stream
@@ -291,13 +417,20 @@ class LocalCipher(BaseCipher):
 
 
 class StreamCipher:
-    """Collection of Local and Remote Ciphers."""
+    """Collection of Local and Remote Ciphers.
+
+    AV data is decrypted by decryptors from `new_decryptor`.
+    The remote cipher is mostly used to verify GMAC so it keeps no key stream window.
 
-    def __init__(self, handshake_key, secret):
+    :param keystream_window: Default size of decryptor key stream window in bytes
+    """
+
+    def __init__(self, handshake_key, secret, keystream_window: int = None):
         self._local_cipher = LocalCipher(handshake_key, secret)
-        self._remote_cipher = RemoteCipher(handshake_key, secret)
+        self._remote_cipher = RemoteCipher(handshake_key, secret, keystream_window=0)
         self._handshake_key = handshake_key
         self._secret = secret
+        self._keystream_window = keystream_window
 
     def encrypt(self, data: bytes) -> bytes:
         """Return Encrypted data."""
@@ -311,10 +444,29 @@ class StreamCipher:
         """Return GMAC Tag."""
         return self._local_cipher.get_gmac(data)
 
+    def new_decryptor(self, keystream_window: int = None) -> RemoteCipher:
+        """Return new remote cipher for decrypting in another thread.
+
+        :param keystream_window: Size of key stream window in bytes;
+            Defaults to window of stream cipher.
+            If 0, key stream is only generated for the ranges decrypted.
+        """
+        if keystream_window is None:
+            keystream_window = self._keystream_window
+        return RemoteCipher(self._handshake_key, self._secret, keystream_window)
+
     def verify_gmac(self, data: bytes, key_pos: int, gmac: bytes):
         """Verify GMAC."""
         return self._remote_cipher.verify_gmac(data, key_pos, gmac)
 
+    @property
+    def stats(self) -> dict:
+        """Return GMAC Key cache stats of local and remote ciphers."""
+        return {
+            "local": self._local_cipher.stats,
+            "remote": self._remote_cipher.stats,
+        }
+
     def advance_key_pos(self, advance_by: int):
         """Advance local key pos by data length."""
         self._local_cipher.advance_key_pos(advance_by)
@@ -419,8 +571,92 @@ class SessionCipher:
         return self._dec_counter
 
 
+class ECDHKeyPool:
+    """Pool of pregenerated ECDH keys.
+
+    Keys are generated in a background thread. The pool is refilled
+    when keys are taken and fewer than `low_water` remain.
+    Keys are generated inline if pool is empty.
+
+    :param size: Number of keys to keep ready
+    :param low_water: Refill pool if fewer keys than this remain
+    """
+
+    SIZE = 2
+    LOW_WATER = 1
+
+    def __init__(self, size: int = SIZE, low_water: int = LOW_WATER):
+        self._size = size
+        self._low_water = low_water
+        self._keys = deque()
+        self._lock = threading.Lock()
+        self._filling = False
+        self._stats = {"generated": 0, "hits": 0, "misses": 0}
+
+    def fill(self):
+        """Fill pool in background. Does nothing if pool is full or filling."""
+        with self._lock:
+            if self._filling or len(self._keys) >= self._size:
+                return
+            self._filling = True
+        threading.Thread(target=self._fill, name="ECDH Key Pool", daemon=True).start()
+
+    def _fill(self):
+        try:
+            while True:
+                keys = StreamECDH.generate_keys()
+                with self._lock:
+                    self._keys.append(keys)
+                    self._stats["generated"] += 1
+                    if len(self._keys) >= self._size:
+                        return
+        except Exception as error:  # pylint: disable=broad-except
+            _LOGGER.error("Error generating ECDH keys: %s", error)
+        finally:
+            with self._lock:
+                self._filling = False
+
+    def get(self) -> tuple:
+        """Return handshake key, EC key, private key, public key and signature."""
+        with self._lock:
+            keys = self._keys.popleft() if self._keys else None
+            self._stats["hits" if keys else "misses"] += 1
+            refill = keys is None or len(self._keys) < self._low_water
+        if refill:
+            self.fill()
+        if keys is None:
+            keys = StreamECDH.generate_keys()
+        return keys
+
+    @property
+    def stats(self) -> dict:
+        """Return pool stats."""
+        with self._lock:
+            return {**self._stats, "ready": len(self._keys)}
+
+
 class StreamECDH:
-    """ECDH Container for Stream."""
+    """ECDH Container for Stream.
+
+    Keys are taken from `POOL` unless handshake or private key is given.
+    Call `POOL.fill()` ahead of the stream to generate keys in background.
+    """
+
+    POOL = ECDHKeyPool()
+
+    @staticmethod
+    def generate_keys(handshake: bytes = None, private_key: bytes = None) -> tuple:
+        """Return handshake key, EC key, private key, public key and signature."""
+        handshake_key = StreamECDH.get_handshake_key(handshake)
+        local_ec = StreamECDH.set_local_ec(private_key)
+        public_key = StreamECDH.set_public_key(local_ec)
+        return (
+            handshake_key,
+            local_ec,
+            StreamECDH.set_private_key(local_ec),
+            public_key,
+            StreamECDH.get_key_sig(handshake_key, public_key),
+        )
 
     @staticmethod
     def get_handshake_key(handshake: bytes = None):
@@ -484,11 +720,17 @@ class StreamECDH:
         self._init_keys(handshake, private_key)
 
     def _init_keys(self, handshake, private_key):
-        self.handshake_key = StreamECDH.get_handshake_key(handshake)
-        self._local_ec = StreamECDH.set_local_ec(private_key)
-        self._private_key = StreamECDH.set_private_key(self._local_ec)
-        self.public_key = StreamECDH.set_public_key(self._local_ec)
-        self.public_sig = StreamECDH.get_key_sig(self.handshake_key, self.public_key)
+        if handshake is None and private_key is None:
+            keys = StreamECDH.POOL.get()
+        else:
+            keys = StreamECDH.generate_keys(handshake, private_key)
+        (
+            self.handshake_key,
+            self._local_ec,
+            self._private_key,
+            self.public_key,
+            self.public_sig,
+        ) = keys
 
     def _verify_remote_sig(self, remote_key: bytes, remote_sig: bytes) -> bool:
         """Return True if Remote Signature is valid."""
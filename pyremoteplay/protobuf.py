@@ -127,6 +127,7 @@ class ProtoHandler:
     def _parse_streaminfo(self, msg, video_header: bytes):
         info = {
             "video_header": video_header,
+            "video_headers": [res.video_header for res in msg.resolution],
             "audio_header": msg.audio_header,
             "start_timeout": msg.start_timeout,
             "afk_timeout": msg.afk_timeout,
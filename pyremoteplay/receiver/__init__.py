@@ -8,8 +8,6 @@ import logging
 from collections import deque
 from typing import Sequence, TYPE_CHECKING
 
-from pyremoteplay.const import FFMPEG_PADDING
-
 if TYPE_CHECKING:
     from pyremoteplay.session import Session
 
@@ -27,6 +25,9 @@ class AVReceiver(abc.ABC):
     This class exposes the audio/video stream of the Remote Play Session.
     The `handle_video` and `handle_audio` methods need to be reimplemented.
     Re-implementing this class provides custom handling of audio and video frames.
+
+    Video and audio are handled in separate threads. Video methods are called
+    from the video worker thread and audio methods from the audio worker thread.
     """
 
     AV_CODEC_OPTIONS_H264 = {
@@ -80,12 +81,14 @@ class AVReceiver(abc.ABC):
         """Decode H264 Frame to raw image.
         Return AV Frame.
 
-        :param buf: Raw Video Packet representing one video frame
+        :param buf: Raw Video Packet representing one video frame.
+            Codec parameter sets are only included when the decoder needs priming
         :param codec_ctx: av codec context for decoding
         :param video_format: Format to output frames as.
         """
         frames = None
-        packet = av.packet.Packet(b"".join([buf, bytes(FFMPEG_PADDING)]))
+        # Packet allocates and zeroes input padding itself.
+        packet = av.packet.Packet(buf)
         try:
             frames = codec_ctx.decode(packet)
         except av.error.InvalidDataError as error:
@@ -218,13 +221,13 @@ class AVReceiver(abc.ABC):
         return frame
 
     def handle_video_data(self, buf: bytes):
-        """Handle video data."""
+        """Handle video data. Called from the video worker thread."""
         frame = self.decode_video_frame(buf)
         if frame is not None:
             self.handle_video(frame)
 
     def handle_audio_data(self, buf: bytes):
-        """Handle audio data."""
+        """Handle audio data. Called from the audio worker thread."""
         frame = self.decode_audio_frame(buf)
         if frame is not None:
             self.handle_audio(frame)
@@ -31,7 +31,7 @@ from .const import (
     StreamType,
     Quality,
 )
-from .crypt import SessionCipher
+from .crypt import SessionCipher, StreamECDH
 from .ddp import async_get_status, wakeup as ddp_wakeup
 from .errors import RemotePlayError, RPErrorHandler
 from .keys import (
@@ -41,7 +41,13 @@ from .keys import (
     SESSION_KEY_1_PS5,
 )
 from .stream import RPStream
-from .util import format_regist_key, log_bytes
+from .util import (
+    format_regist_key,
+    get_network_cache,
+    get_network_key,
+    log_bytes,
+    write_network_cache,
+)
 from .profile import UserProfile
 
 _LOGGER = logging.getLogger(__name__)
@@ -183,9 +189,15 @@ class Session:
     :param codec: Name of FFMPEG video codec to use. i.e. 'h264', 'h264_cuvid'.
         Video codec should be 'h264' or 'hevc'. PS4 hosts will always use h264.
     :param hdr: Uses HDR if True. Has no effect if codec is 'h264'
+    :param retest_network: Run network test even if results are cached
     """
 
     HEADER_LENGTH = 8
+    # Cached network results younger than this are used without a test.
+    NETWORK_CACHE_AGE = 86400
+    # Older results are verified with a quick test; Expired results are retested.
+    NETWORK_CACHE_MAX_AGE = 86400 * 30
+    NETWORK_CACHE = True
 
     class State(IntEnum):
         """State Enums."""
@@ -281,12 +293,15 @@ class Session:
         quality: Union[Quality, str, int] = "default",
         codec: str = "h264",
         hdr: bool = False,
+        retest_network: bool = False,
     ):
         self.error = ""
         self.disconnect_reason = ""
         self._host = host
         self._profile = profile
         self._regist_data = {}
+        self._mac_address = ""
+        self._retest_network = retest_network
         self._session_id = b""
         self._server_type = Session.ServerType.UNKNOWN
         self._type = ""
@@ -341,6 +356,7 @@ class Session:
         if not regist_data:
             return False
         self._regist_data = regist_data["data"]
+        self._mac_address = mac_address
         self._type = status.get("host-type")
         self._regist_key = self._regist_data["RegistKey"]
         self._rp_key = bytes.fromhex(self._regist_data["RP-Key"])
@@ -539,18 +555,68 @@ class Session:
         mtu = self._stream.mtu
         rtt = self._stream.rtt
         _LOGGER.info("Using MTU: %s; RTT: %sms", mtu, rtt * 1000)
+        if self._stream.test.complete:
+            self._sync_run_io(self._write_network_cache, mtu, rtt)
         self._stream = None
         self._start_stream(test=False, mtu=mtu, rtt=rtt)
 
-    def _start_stream(self, test=True, mtu=None, rtt=None):
-        """Start Stream."""
+    async def _start_network(self):
+        """Start stream with cached network results or start network test."""
+        result = None
+        if Session.NETWORK_CACHE and not self._retest_network:
+            result = await self._run_io(self._read_network_cache)
+        if result is None:
+            self._start_stream()
+            return
+        mtu, rtt = result["mtu"], result["rtt"]
+        if time.time() - result["time"] < Session.NETWORK_CACHE_AGE:
+            _LOGGER.info("Using cached network results")
+            self._start_stream(test=False, mtu=mtu, rtt=rtt)
+        else:
+            _LOGGER.info("Verifying cached network results")
+            self._start_stream(mtu=mtu, rtt=rtt, verify=True)
+
+    def _read_network_cache(self) -> dict:
+        """Return cached network results for host or None. Blocks."""
+        key = get_network_key(self._mac_address, self.host)
+        if not key:
+            return None
+        result = get_network_cache().get(key)
+        if not result:
+            return None
+        if time.time() - result.get("time", 0) >= Session.NETWORK_CACHE_MAX_AGE:
+            return None
+        return result
+
+    def _write_network_cache(self, mtu: int, rtt: float):
+        """Write network results for host. Blocks."""
+        if not Session.NETWORK_CACHE:
+            return
+        key = get_network_key(self._mac_address, self.host)
+        if not key:
+            return
+        cache = get_network_cache()
+        cache[key] = {"mtu": mtu, "rtt": rtt, "time": time.time()}
+        write_network_cache(cache)
+
+    def _start_stream(self, test=True, mtu=None, rtt=None, verify=False):
+        """Start Stream.
+
+        :param verify: Only verify MTU and RTT if test; Full test is run if they fail
+        """
         if not self.session_id:
             _LOGGER.error("Session ID not received")
             return
         stop_event = self._stop_event if not test else asyncio.Event()
         cb_stop = self._cb_stop_test if test else None
         self._stream = RPStream(
-            self, stop_event, is_test=test, cb_stop=cb_stop, mtu=mtu, rtt=rtt
+            self,
+            stop_event,
+            is_test=test,
+            cb_stop=cb_stop,
+            mtu=mtu,
+            rtt=rtt,
+            verify=verify,
         )
         if not test and self.receiver:
             self._stream.add_receiver(self.receiver)
@@ -644,6 +710,8 @@ class Session:
                 self._send_wakeup()
                 self.error = "Host is in Standby. Attempting to wakeup."
             return False
+        # Generate stream keys while authenticating.
+        StreamECDH.POOL.fill()
         if not await self._run_io(self._connect):
             _LOGGER.error("Session Auth Failed")
             if not self.error:
@@ -656,7 +724,7 @@ class Session:
         )
         await self._ready_event.wait()
         if autostart:
-            self._start_stream()
+            await self._start_network()
         return True
 
     def stop(self):
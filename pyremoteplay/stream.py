@@ -3,11 +3,14 @@ from __future__ import annotations
 import asyncio
 import base64
 import logging
+import queue
 import socket
+import statistics
 import threading
 import time
-from struct import pack_into
-from typing import TYPE_CHECKING
+from collections import deque
+from struct import pack_into, unpack_from
+from typing import TYPE_CHECKING, Callable, Sequence
 
 from Cryptodome.Random import get_random_bytes
 from Cryptodome.Util.strxor import strxor
@@ -15,7 +18,7 @@ from Cryptodome.Util.strxor import strxor
 from pyremoteplay.const import TYPE_PS5
 
 from .av import AVHandler
-from .crypt import StreamECDH
+from .crypt import StreamCipher, StreamECDH
 from .protobuf import ProtoHandler
 from .stream_packets import (
     Chunk,
@@ -25,7 +28,7 @@ from .stream_packets import (
     Packet,
     get_launch_spec,
 )
-from .util import listener, log_bytes
+from .util import BatchReceiver, BatchSender, listener, log_bytes
 
 if TYPE_CHECKING:
     from .session import Session
@@ -46,6 +49,451 @@ UDP_IPV4_SIZE = 28
 DATA_LENGTH = 26
 DATA_ACK_LENGTH = 29
 
+# Header type: (gmac offset, key pos offset, zero key pos when calculating gmac)
+GMAC_OFFSETS = {
+    Header.Type.CONTROL: (5, 9, True),
+    Header.Type.VIDEO: (10, 14, False),
+    Header.Type.AUDIO: (10, 14, False),
+}
+
+
+class GMACVerifier:
+    """Verifies GMAC of received packets in a worker thread.
+
+    Packets are verified in batches from the raw datagram.
+    The gmac and key pos are zeroed in a scratch buffer instead of
+    re-serializing the packet.
+
+    :param cipher: Stream Cipher
+    :param policy: One of `POLICY_DROP`, `POLICY_LOG`, `POLICY_SAMPLE`.
+        `POLICY_DROP` only passes verified packets to callback.
+        `POLICY_LOG` and `POLICY_SAMPLE` log mismatches without delaying packets.
+    :param sample_rate: Verify 1 in N packets if policy is `POLICY_SAMPLE`
+    :param batch_size: Maximum packets verified per batch
+    """
+
+    POLICY_DROP = "drop"
+    POLICY_LOG = "log"
+    POLICY_SAMPLE = "sample"
+    POLICIES = (POLICY_DROP, POLICY_LOG, POLICY_SAMPLE)
+
+    def __init__(
+        self,
+        cipher: StreamCipher,
+        policy: str = POLICY_LOG,
+        sample_rate: int = 100,
+        batch_size: int = 64,
+    ):
+        if policy not in GMACVerifier.POLICIES:
+            raise ValueError(f"Invalid GMAC policy: {policy}")
+        self._cipher = cipher
+        self._policy = policy
+        self._sample_rate = max(1, sample_rate)
+        self._batch_size = max(1, batch_size)
+        self._queue = queue.SimpleQueue()
+        self._scratch = bytearray(4096)
+        self._count = 0
+        self._worker = None
+        self._stopping = None
+        self._stats = {
+            "verified": 0,
+            "failed": 0,
+            "skipped": 0,
+            "batches": 0,
+            "time": 0.0,
+        }
+
+    def start(self):
+        """Start worker thread."""
+        if self._worker is None:
+            self._stopping = threading.Event()
+            self._worker = threading.Thread(
+                target=self._run, args=(self._stopping,), daemon=True
+            )
+            self._worker.start()
+
+    def stop(self):
+        """Stop worker thread. Does not block."""
+        if self._worker is not None:
+            self._stopping.set()
+            # Wake worker if waiting.
+            self._queue.put_nowait(None)
+            self._worker = None
+
+    def submit(self, msg: bytes, callback: callable = None):
+        """Submit raw packet for verification.
+
+        If policy is `POLICY_DROP`, callback is called with msg
+        from the worker thread only if verified.
+        Otherwise callback is called immediately.
+        """
+        if self._policy != GMACVerifier.POLICY_DROP:
+            if callback is not None:
+                callback(msg)
+            if self._policy == GMACVerifier.POLICY_SAMPLE:
+                self._count += 1
+                if self._count % self._sample_rate:
+                    self._stats["skipped"] += 1
+                    return
+            callback = None
+        self._queue.put((msg, callback))
+
+    def verify(self, msg: bytes) -> bool:
+        """Return True if GMAC of raw packet is valid."""
+        offsets = GMAC_OFFSETS.get(msg[0] & 0x0F)
+        if offsets is None:
+            return True
+        gmac_offset, key_pos_offset, zero_key_pos = offsets
+        length = len(msg)
+        if length > len(self._scratch):
+            self._scratch = bytearray(length)
+        scratch = self._scratch
+        scratch[:length] = msg
+        gmac = bytes(scratch[gmac_offset : gmac_offset + 4])
+        key_pos = unpack_from("!I", scratch, key_pos_offset)[0]
+        scratch[gmac_offset : gmac_offset + 4] = bytes(4)
+        if zero_key_pos:
+            scratch[key_pos_offset : key_pos_offset + 4] = bytes(4)
+        return self._cipher.verify_gmac(memoryview(scratch)[:length], key_pos, gmac)
+
+    def _run(self, stopping: threading.Event):
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self._batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if None in batch or stopping.is_set():
+                running = False
+            self._verify_batch(batch)
+
+    def _verify_batch(self, batch: list):
+        start = time.perf_counter()
+        results = []
+        for item in batch:
+            if item is None:
+                continue
+            msg, callback = item
+            verified = self.verify(msg)
+            if verified:
+                self._stats["verified"] += 1
+            else:
+                self._stats["failed"] += 1
+                _LOGGER.warning("GMAC Mismatch; Type: %s", msg[0] & 0x0F)
+            results.append((verified, msg, callback))
+        self._stats["batches"] += 1
+        self._stats["time"] += time.perf_counter() - start
+        for verified, msg, callback in results:
+            if verified and callback is not None:
+                callback(msg)
+
+    @property
+    def policy(self) -> str:
+        """Return policy."""
+        return self._policy
+
+    @property
+    def stats(self) -> dict:
+        """Return verification stats. Time is in seconds."""
+        stats = dict(self._stats)
+        checked = stats["verified"] + stats["failed"]
+        stats["time_per_packet"] = stats["time"] / checked if checked else 0.0
+        return stats
+
+
+class ControlWorker:
+    """Handles control packets in order in a worker thread.
+
+    DATA_ACK chunks are handled immediately in the calling thread
+    so acknowledgements are not delayed by queued packets.
+    Tracks time from submit until handled for each chunk type.
+
+    :param handle: Callback which handles raw control packet
+    :param maxsize: Maximum number of queued packets
+    """
+
+    MAX_QUEUE = 1024
+    # Offset of chunk type in control packet.
+    CHUNK_TYPE_OFFSET = 13
+
+    def __init__(self, handle: Callable[[bytes], None], maxsize: int = MAX_QUEUE):
+        self._handle = handle
+        self._queue = queue.Queue(maxsize)
+        self._worker = None
+        self._stopping = None
+        self._latency = {}
+        self._stats = {"queued": 0, "dropped": 0, "inline": 0}
+
+    def start(self):
+        """Start worker thread."""
+        if self._worker is None:
+            self._stopping = threading.Event()
+            self._worker = threading.Thread(
+                target=self._run,
+                args=(self._stopping,),
+                name="Stream Control",
+                daemon=True,
+            )
+            self._worker.start()
+
+    def stop(self):
+        """Stop worker thread. Does not block. Queued packets are discarded."""
+        if self._worker is not None:
+            self._stopping.set()
+            try:
+                # Wake worker if waiting.
+                self._queue.put_nowait(None)
+            except queue.Full:
+                # Worker is busy and checks stop event after each packet.
+                pass
+            self._worker = None
+
+    def submit(self, msg: bytes):
+        """Handle control packet in order or immediately if it is an ack."""
+        start = time.perf_counter()
+        if self._chunk_type(msg) == Chunk.Type.DATA_ACK:
+            self._stats["inline"] += 1
+            self._handle_timed(msg, start)
+            return
+        try:
+            self._queue.put_nowait((start, msg))
+        except queue.Full:
+            self._stats["dropped"] += 1
+            _LOGGER.warning("Control queue full; Dropping packet")
+            return
+        self._stats["queued"] += 1
+
+    def _chunk_type(self, msg: bytes) -> int:
+        if len(msg) <= ControlWorker.CHUNK_TYPE_OFFSET:
+            return -1
+        return msg[ControlWorker.CHUNK_TYPE_OFFSET]
+
+    def _handle_timed(self, msg: bytes, start: float):
+        try:
+            self._handle(msg)
+        except Exception as error:  # pylint: disable=broad-except
+            _LOGGER.error("Error handling control packet: %s", error)
+        elapsed = time.perf_counter() - start
+        latency = self._latency.setdefault(
+            self._chunk_type(msg), {"count": 0, "time": 0.0, "max": 0.0}
+        )
+        latency["count"] += 1
+        latency["time"] += elapsed
+        latency["max"] = max(latency["max"], elapsed)
+
+    def _run(self, stopping: threading.Event):
+        while not stopping.is_set():
+            item = self._queue.get()
+            if item is None or stopping.is_set():
+                break
+            start, msg = item
+            self._handle_timed(msg, start)
+
+    @property
+    def stats(self) -> dict:
+        """Return stats. Latency is in seconds from submit until handled."""
+        stats = dict(self._stats)
+        stats["depth"] = self._queue.qsize()
+        latency = {}
+        for chunk_type, values in list(self._latency.items()):
+            try:
+                name = Chunk.Type(chunk_type).name
+            except ValueError:
+                name = str(chunk_type)
+            values = dict(values)
+            values["avg"] = values.pop("time") / max(values["count"], 1)
+            latency[name] = values
+        stats["latency"] = latency
+        return stats
+
+
+def _tsn_diff(start: int, end: int) -> int:
+    """Return signed difference of 32 bit TSNs."""
+    return (end - start + 0x80000000) % 0x100000000 - 0x80000000
+
+
+class RetransmitQueue:
+    """Retransmits reliable DATA chunks until they are acknowledged.
+
+    Sent chunks are kept by TSN and resent unchanged when the retransmission
+    timeout expires or when a SACK reports them missing.
+    The timeout is derived from RTT samples as in RFC 6298.
+    Chunks are held back while outstanding bytes would exceed the window.
+
+    :param send: Callable which sends packet bytes
+    :param rtt: Initial RTT in seconds
+    :param window: Maximum outstanding bytes
+    """
+
+    MIN_RTO = 0.1
+    MAX_RTO = 3.0
+    MAX_RETRIES = 8
+    # Seconds between checks for expired chunks.
+    TICK = 0.05
+
+    def __init__(
+        self,
+        send: Callable[[bytes], None],
+        rtt: float = DEFAULT_RTT,
+        window: int = A_RWND,
+    ):
+        self._send = send
+        self._lock = threading.Lock()
+        # TSN: [bytes, time sent, retries]
+        self._chunks = {}
+        self._backlog = deque()
+        self._bytes = 0
+        self._window = window
+        self._srtt = rtt
+        self._rttvar = rtt / 2
+        self._stats = {
+            "sent": 0,
+            "acked": 0,
+            "held": 0,
+            "retransmits": 0,
+            "fast_retransmits": 0,
+            "duplicates": 0,
+            "abandoned": 0,
+        }
+
+    def add(self, tsn: int, data: bytes):
+        """Send chunk and keep it until acknowledged."""
+        with self._lock:
+            if self._chunks and self._bytes + len(data) > self._window:
+                self._backlog.append((tsn, data))
+                self._stats["held"] += 1
+                return
+            self._track(tsn, data)
+        self._send(data)
+
+    def _track(self, tsn: int, data: bytes):
+        chunk = self._chunks.pop(tsn, None)
+        if chunk is not None:
+            self._bytes -= len(chunk[0])
+        self._chunks[tsn] = [data, time.perf_counter(), 0]
+        self._bytes += len(data)
+        self._stats["sent"] += 1
+
+    def _release_backlog(self) -> list[bytes]:
+        """Track held chunks which fit in window. Return chunks to send."""
+        released = []
+        while self._backlog:
+            tsn, data = self._backlog[0]
+            if self._chunks and self._bytes + len(data) > self._window:
+                break
+            self._backlog.popleft()
+            self._track(tsn, data)
+            released.append(data)
+        return released
+
+    def _update_rtt(self, sample: float):
+        self._rttvar = 0.75 * self._rttvar + 0.25 * abs(self._srtt - sample)
+        self._srtt = 0.875 * self._srtt + 0.125 * sample
+
+    def ack(
+        self,
+        tsn: int,
+        a_rwnd: int = None,
+        gap_ack_blocks: Sequence[tuple[int, int]] = (),
+        dup_tsns: Sequence[int] = (),
+    ):
+        """Handle SACK.
+
+        :param tsn: Cumulative TSN acknowledged
+        :param a_rwnd: Receiver window in bytes
+        :param gap_ack_blocks: Start and end offsets from tsn of received chunks
+        :param dup_tsns: TSNs received more than once
+        """
+        now = time.perf_counter()
+        resend = []
+        with self._lock:
+            if a_rwnd:
+                self._window = a_rwnd
+            chunks = self._chunks
+            acked = [key for key in chunks if _tsn_diff(key, tsn) >= 0]
+            highest = tsn
+            for start, end in gap_ack_blocks:
+                for offset in range(start, end + 1):
+                    acked.append((tsn + offset) & 0xFFFFFFFF)
+                if _tsn_diff(highest, tsn + end) > 0:
+                    highest = (tsn + end) & 0xFFFFFFFF
+            sample = None
+            for key in acked:
+                chunk = chunks.pop(key, None)
+                if chunk is None:
+                    continue
+                self._bytes -= len(chunk[0])
+                self._stats["acked"] += 1
+                # Only chunks sent once give valid samples.
+                if not chunk[2]:
+                    sample = now - chunk[1]
+            if sample is not None:
+                self._update_rtt(sample)
+            # Chunks before the highest TSN received are missing.
+            for key, chunk in chunks.items():
+                if _tsn_diff(key, highest) <= 0:
+                    break
+                if now - chunk[1] < self._srtt:
+                    continue
+                chunk[1] = now
+                chunk[2] += 1
+                self._stats["fast_retransmits"] += 1
+                resend.append(chunk[0])
+            self._stats["duplicates"] += len(dup_tsns)
+            resend.extend(self._release_backlog())
+        for data in resend:
+            self._send(data)
+
+    def poll(self):
+        """Resend chunks whose timeout expired. Timeout doubles for each retry."""
+        now = time.perf_counter()
+        resend = []
+        with self._lock:
+            rto = self.rto
+            for tsn, chunk in list(self._chunks.items()):
+                data, sent, retries = chunk
+                if now - sent < min(rto * 2**retries, RetransmitQueue.MAX_RTO):
+                    continue
+                if retries >= RetransmitQueue.MAX_RETRIES:
+                    _LOGGER.warning("Abandoning DATA chunk with TSN: %s", tsn)
+                    del self._chunks[tsn]
+                    self._bytes -= len(data)
+                    self._stats["abandoned"] += 1
+                    continue
+                chunk[1] = now
+                chunk[2] += 1
+                self._stats["retransmits"] += 1
+                resend.append(data)
+            resend.extend(self._release_backlog())
+        for data in resend:
+            self._send(data)
+
+    def clear(self):
+        """Remove all chunks."""
+        with self._lock:
+            self._chunks.clear()
+            self._backlog.clear()
+            self._bytes = 0
+
+    @property
+    def rto(self) -> float:
+        """Return retransmission timeout in seconds."""
+        rto = self._srtt + 4 * self._rttvar
+        return min(max(rto, RetransmitQueue.MIN_RTO), RetransmitQueue.MAX_RTO)
+
+    @property
+    def stats(self) -> dict:
+        """Return retransmit stats. Times are in seconds."""
+        stats = dict(self._stats)
+        stats["outstanding"] = len(self._chunks)
+        stats["outstanding_bytes"] = self._bytes
+        stats["backlog"] = len(self._backlog)
+        stats["srtt"] = self._srtt
+        stats["rto"] = self.rto
+        return stats
+
 
 class RPStream:
     """RP Stream Class."""
@@ -53,6 +501,10 @@ class RPStream:
     STATE_INIT = "init"
     STATE_READY = "ready"
 
+    GMAC_POLICY = None
+    INGEST_THREAD = False
+    SEND_DELAY = BatchSender.MAX_DELAY
+
     class Protocol(asyncio.DatagramProtocol):
         """Protocol for stream."""
 
@@ -99,30 +551,46 @@ class RPStream:
         mtu=None,
         is_test=False,
         cb_stop=None,
+        gmac_policy: str = None,
+        ingest_thread: bool = None,
+        send_delay: float = None,
+        verify: bool = False,
     ):
         self._host = session.host
         self._port = STREAM_PORT if not is_test else TEST_STREAM_PORT
         self._session = session
         self._av_handler = AVHandler(self._session)
         self._is_test = is_test
-        self._test = StreamTest(self) if is_test else None
         self._state = None
         self._tsn = self._tag_local = 1  # int.from_bytes(get_random_bytes(4), "big")
         self._tag_remote = 0
         self._key_pos = 0
         self._protocol = None
+        self._ingest = None
+        self._sender = None
+        self._send_delay = send_delay if send_delay is not None else RPStream.SEND_DELAY
         self._stop_event = stop_event
         self._worker = None
         self._cb_stop = cb_stop
         self._cb_ack = None
         self._cb_ack_tsn = 0
         self._ecdh = None
-        self._verify_gmac = False
+        self._big_payload = None
+        self._gmac_policy = gmac_policy or RPStream.GMAC_POLICY
+        self._use_ingest_thread = (
+            ingest_thread if ingest_thread is not None else RPStream.INGEST_THREAD
+        ) and not is_test
+        self._verifier = None
+        self._control = None
         self._cipher = None
         self._proto = ProtoHandler(self)
         self._stream_info = None
         self.rtt = rtt if rtt is not None else DEFAULT_RTT
         self.mtu = mtu if mtu is not None else DEFAULT_MTU
+        # MTU and RTT are used as results if test does not complete.
+        self._test = StreamTest(self, verify) if is_test else None
+        # Test packets are not resent so loss is measured.
+        self._retransmit = None if is_test else RetransmitQueue(self.send, self.rtt)
 
     def connect(self):
         """Connect socket to Host."""
@@ -132,28 +600,123 @@ class RPStream:
         # because they are overflowing the socket buffer
         # sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, bytes(A_RWND))
         self._protocol = sock
+        self._ingest = BatchReceiver(sock)
         self._state = RPStream.STATE_INIT
         self._worker = threading.Thread(
             target=listener,
             args=("Stream", self._protocol, self.handle, self._stop_event),
+            kwargs={
+                "handle_batch": self.handle_batch,
+                "receiver": self._ingest,
+                "poll": self._retransmit.poll if self._retransmit else None,
+            },
         )
         self._worker.start()
         self._send_init()
 
     async def async_connect(self):
         """Connect Async."""
-        _, self._protocol = await self._session.loop.create_datagram_endpoint(
-            lambda: RPStream.Protocol(self), local_addr=("0.0.0.0", 0)
-        )
+        if self._use_ingest_thread:
+            self._connect_ingest()
+        else:
+            _, self._protocol = await self._session.loop.create_datagram_endpoint(
+                lambda: RPStream.Protocol(self), local_addr=("0.0.0.0", 0)
+            )
+        if not self._is_test:
+            self._start_sender()
+        if self._retransmit is not None:
+            self._schedule_retransmit()
         self._send_init()
 
+    def _start_sender(self):
+        """Start sending in batches. Packets are flushed within send delay."""
+        loop = self._session.loop
+        sock = self._protocol
+        backlog = None
+        if isinstance(sock, RPStream.Protocol):
+            backlog = sock.transport.get_write_buffer_size
+            sock = sock.socket
+
+        def schedule(delay: float, callback: Callable):
+            loop.call_soon_threadsafe(loop.call_later, delay, callback)
+
+        self._sender = BatchSender(
+            sock,
+            (self._host, self._port),
+            self._send_now,
+            schedule,
+            max_delay=self._send_delay,
+            backlog=backlog,
+        )
+
+    def _schedule_retransmit(self):
+        self._session.loop.call_later(RetransmitQueue.TICK, self._run_retransmit)
+
+    def _run_retransmit(self):
+        """Resend expired DATA chunks. Run in loop."""
+        if self._stop_event.is_set():
+            self._retransmit.clear()
+            return
+        self._retransmit.poll()
+        self._schedule_retransmit()
+
+    def _connect_ingest(self):
+        """Create socket owned by ingest thread."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("0.0.0.0", 0))
+        self._protocol = sock
+        self._ingest = BatchReceiver(sock)
+        self._worker = threading.Thread(
+            target=self._ingest_worker, name="Stream Ingest", daemon=True
+        )
+        self._worker.start()
+
+    def _ingest_worker(self):
+        """Receive datagrams in thread. Control packets are handled in loop."""
+        _LOGGER.debug("Thread Started: Stream Ingest")
+        loop = self._session.loop
+        sock = self._protocol
+
+        def handle_control(msg: bytes):
+            loop.call_soon_threadsafe(self.handle, msg)
+
+        while not self._stop_event.is_set():
+            try:
+                msgs = self._ingest.recv(block=True)
+            except OSError as error:
+                _LOGGER.error("Stream Ingest Error: %s", error)
+                break
+            if not all(msgs):
+                # Empty datagram is sent to wake thread when stopping.
+                # Stray empty datagrams are ignored.
+                msgs = [msg for msg in msgs if msg]
+            if msgs and not self._stop_event.is_set():
+                self.handle_batch(msgs, handle_control)
+        sock.close()
+        _LOGGER.info("Stream Ingest Stopped")
+
+    def _wake_ingest(self):
+        """Send empty datagram to ingest socket so thread can exit."""
+        port = self._protocol.getsockname()[1]
+        try:
+            self._protocol.sendto(b"", ("127.0.0.1", port))
+        except OSError as error:
+            _LOGGER.warning("Could not wake Stream Ingest: %s", error)
+
     def run_av(self):
         """Run AV Handler."""
         self._av_handler.worker()
 
     def add_receiver(self, receiver):
-        """Add Receiver."""
+        """Add Receiver.
+
+        Control packets are then handled by an ordered worker
+        so they are not delayed by AV processing.
+        """
         self._av_handler.add_receiver(receiver)
+        if self._av_handler.has_receiver and self._control is None:
+            self._control = ControlWorker(self._handle_later)
+            self._control.start()
 
     def _set_ready(self):
         """Notify Session that stream is ready."""
@@ -186,9 +749,16 @@ class RPStream:
         )
         self.send(msg.bytes())
 
-    def send_data(self, data: bytes, flag: int, channel: int, proto=False):
-        """Send Data Packet."""
+    def send_data(
+        self, data: bytes, flag: int, channel: int, proto=False, track=False
+    ):
+        """Send Data Packet.
+
+        The chunk is resent until acknowledged if its TSN was advanced
+        or if `track` is True.
+        """
         advance_by = 0
+        tsn = self._tsn
         if self._cipher:
             self.advance_sequence()
             if proto:
@@ -203,7 +773,13 @@ class RPStream:
             channel=channel,
             data=data,
         )
-        self.send(msg.bytes(self._cipher, False, advance_by))
+        data = msg.bytes(self._cipher, False, advance_by)
+        # Chunks which reuse the TSN of a tracked chunk can not be told apart
+        # by acks, so only chunks with a new TSN and the BIG chunk are tracked.
+        if self._retransmit is not None and (track or self._tsn != tsn):
+            self._retransmit.add(self._tsn, data)
+        else:
+            self.send(data)
 
     def _send_data_ack(self, ack_tsn: int):
         """Send Data Packet."""
@@ -246,6 +822,13 @@ class RPStream:
     def send(self, msg: bytes):
         """Send Message."""
         # log_bytes("Stream Send", msg)
+        if self._sender is not None:
+            self._sender.send(msg)
+        else:
+            self._send_now(msg)
+
+    def _send_now(self, msg: bytes):
+        """Send Message immediately."""
         self._protocol.sendto(msg, (self._host, self._port))
 
     def handle(self, msg: bytes):
@@ -253,35 +836,67 @@ class RPStream:
         av_type = Packet.is_av(msg[:1])
         if av_type:
             if self._av_handler.has_receiver and not self._is_test:
-                self._av_handler.add_packet(msg)
+                if self._verifier:
+                    self._verifier.submit(msg, self._av_handler.add_packet)
+                else:
+                    self._av_handler.add_packet(msg)
             elif self._is_test and self._test:
                 if av_type == Header.Type.AUDIO:
-                    self._test.recv_rtt()
+                    self._test.recv_rtt(msg)
                 else:
                     self._test.recv_mtu(msg)
         else:
-            if not self._av_handler.has_receiver:
+            if self._verifier and msg[0] & 0x0F == Header.Type.CONTROL:
+                if self._verifier.policy == GMACVerifier.POLICY_DROP:
+                    self._verifier.submit(msg, self._handle_verified)
+                    return
+                self._verifier.submit(msg)
+            if self._control is None:
                 self._handle_later(msg)
             else:
-                # Run in Executor if processing av.
-                self._session._sync_run_io(  # pylint: disable=protected-access
-                    self._handle_later, msg
-                )
+                self._control.submit(msg)
+
+    def handle_batch(
+        self, msgs: list[bytes], handle_control: Callable[[bytes], None] = None
+    ):
+        """Handle batch of received packets.
+
+        AV packets are passed to AV Handler as one batch.
+
+        :param msgs: Received packets
+        :param handle_control: Callback for non AV packets; Defaults to `handle`
+        """
+        if handle_control is None:
+            handle_control = self.handle
+        av_msgs = []
+        for msg in msgs:
+            if Packet.is_av(msg[:1]):
+                av_msgs.append(msg)
+            else:
+                handle_control(msg)
+        if not av_msgs:
+            return
+        if not self._av_handler.has_receiver or self._is_test or self._verifier:
+            for msg in av_msgs:
+                self.handle(msg)
+        else:
+            self._av_handler.add_packets(av_msgs)
+
+    def _handle_verified(self, msg: bytes):
+        """Handle control packet which passed verification.
+
+        Called from verifier thread. Packets are handled by the control worker
+        if started so there is one ordered path for control packets.
+        """
+        if self._control is not None:
+            self._control.submit(msg)
+        else:
+            self._session.loop.call_soon_threadsafe(self._handle_later, msg)
 
     def _handle_later(self, msg: bytes):
         packet = Packet.parse(msg)
         _LOGGER.debug(packet)
         # log_bytes("Stream RECV", msg)
-        if self._cipher:
-            gmac = packet.header.gmac
-            _gmac = int.to_bytes(gmac, 4, "big")
-            key_pos = packet.header.key_pos
-            packet.header.gmac = packet.header.key_pos = 0
-            if self._verify_gmac:
-                verified = self._cipher.verify_gmac(packet.bytes(), key_pos, _gmac)
-                if not verified:
-                    _LOGGER.error("GMAC Mismatch")
-
         if packet.chunk.type == Chunk.Type.INIT_ACK:
             self._recv_init(packet)
         elif packet.chunk.type == Chunk.Type.COOKIE_ACK:
@@ -298,6 +913,8 @@ class RPStream:
         params = packet.params
         self._tag_remote = params["tag"]
         self._send_cookie(params["data"])
+        # Build BIG payload while waiting for cookie ack.
+        self._big_payload = self._get_big_payload()
 
     def _recv_cookie_ack(self):
         """Handle Cookie Ack"""
@@ -318,6 +935,13 @@ class RPStream:
             params["gap_ack_blocks_count"],
             params["dup_tsns_count"],
         )
+        if self._retransmit is not None:
+            self._retransmit.ack(
+                params["tsn"],
+                params["a_rwnd"],
+                params.get("gap_ack_blocks", ()),
+                params.get("dup_tsns", ()),
+            )
 
         if self._cb_ack and self._cb_ack_tsn == params["tsn"]:
             _LOGGER.debug("Received waiting TSN ACK")
@@ -327,6 +951,13 @@ class RPStream:
 
     def _send_big(self):
         chunk_flag = channel = 1
+        data = self._big_payload or self._get_big_payload()
+        self._big_payload = None
+        # BIG is the first DATA chunk and is sent on the initial TSN.
+        self.send_data(data, chunk_flag, channel, track=True)
+
+    def _get_big_payload(self) -> bytes:
+        """Return BIG payload."""
         if not self._is_test:
             version = 12 if self._session.type == TYPE_PS5 else 9
             _LOGGER.debug("Using Version: %s", version)
@@ -352,7 +983,7 @@ class RPStream:
             ecdh_sig=ecdh_sig,
         )
         log_bytes("Big Payload", data)
-        self.send_data(data, chunk_flag, channel)
+        return data
 
     def _format_launch_spec(self, handshake_key: bytes, format_type=None) -> bytes:
         launch_spec = get_launch_spec(
@@ -389,6 +1020,9 @@ class RPStream:
             # self._stop_event.set()
             return False
         self._cipher = self._ecdh.init_ciphers()
+        if self._gmac_policy:
+            self._verifier = GMACVerifier(self._cipher, self._gmac_policy)
+            self._verifier.start()
         return True
 
     def _disconnect(self):
@@ -406,14 +1040,29 @@ class RPStream:
             self._stop_event.set()
             if self._protocol:
                 self._disconnect()
-                self._protocol.close()
+                if self._sender is not None:
+                    self._sender.flush()
+                if self._use_ingest_thread:
+                    self._wake_ingest()
+                else:
+                    self._protocol.close()
+            if self._verifier:
+                self._verifier.stop()
+            if self._control:
+                self._control.stop()
             if self._cb_stop is not None:
                 self._cb_stop()
 
     def recv_stream_info(self, info: dict):
         """Receive stream info."""
         self._stream_info = info
-        self._av_handler.set_headers(info["video_header"], info["audio_header"])
+        self._av_handler.set_headers(
+            info["video_header"],
+            info["audio_header"],
+            self.mtu,
+            info.get("video_headers"),
+            info.get("congestion_control_interval", 0),
+        )
 
     def recv_bang(self, accepted: bool, ecdh_pub_key: bytes, ecdh_sig: bytes):
         """Receive Bang Payload."""
@@ -441,6 +1090,24 @@ class RPStream:
         self._cb_ack = callback
         self._cb_ack_tsn = tsn
 
+    @property
+    def stats(self) -> dict:
+        """Return stream stats."""
+        stats = {}
+        if self._verifier:
+            stats["gmac"] = self._verifier.stats
+        if self._ingest:
+            stats["ingest"] = self._ingest.stats
+        if self._sender is not None:
+            stats["send"] = self._sender.stats
+        if self._retransmit is not None:
+            stats["retransmit"] = self._retransmit.stats
+        if self._control is not None:
+            stats["control"] = self._control.stats
+        if self._test is not None:
+            stats["test"] = self._test.stats
+        return stats
+
     @property
     def state(self) -> str:
         """Return State."""
@@ -468,18 +1135,62 @@ class RPStream:
 
 
 class StreamTest:
-    """Network tests for stream. Calculates RTT and MTU."""
-
-    def __init__(self, stream: RPStream):
+    """Network tests for stream. Calculates RTT and MTU.
+
+    Up to `PING_WINDOW` echo pings are in flight at once. The RTT test
+    finishes early once the confidence interval of the mean RTT is within
+    `RTT_TOLERANCE` of the mean. The MTU is found with a binary search
+    which probes `MTU_PROBES` sizes at once in each round.
+
+    If the MTU of stream is below `DEFAULT_MTU`, the first round probes it
+    along with sizes above it, so a known MTU can be verified or raised
+    in one round. The RTT and MTU of stream are kept if there are no results.
+
+    If `verify` is True, the RTT and MTU of stream are known results.
+    A single ping and a single probe at the known MTU are sent. If both are
+    answered the known results are kept. Otherwise the full test is run.
+
+    :param stream: Test stream
+    :param verify: Verify known RTT and MTU of stream
+    """
+
+    PING_WINDOW = 4
+    PING_SIZE = 548
+    PING_TIMEOUT = 0.5
+    MIN_PINGS = 5
+    MAX_PINGS = 20
+    RTT_TOLERANCE = 0.1
+    RTT_MIN_TOLERANCE = 0.001
+    CONFIDENCE_Z = 1.96
+    MTU_PROBES = 3
+    MTU_RESOLUTION = 16
+    MTU_MAX_ROUNDS = 3
+    MTU_TIMEOUT = 0.5
+
+    def __init__(self, stream: RPStream, verify: bool = False):
         self._stream = stream
+        self._verify = verify
         self._index = 0
-        self._max_pings = 10
-        self._ping_times = []
-        self._mtu_test_in = True
-        self._cur_mtu = 0
-        self._last_mtu = 0
+        self._ping_index = 0
+        self._pings = {}
+        self._samples = []
+        self._lost = 0
+        self._rtt_done = False
+        self._timer = None
+        self._max_mtu = max(stream.mtu, DEFAULT_MTU)
+        self._known_mtu = stream.mtu
+        self._mtu_low = MIN_MTU
+        self._mtu_high = self._max_mtu
         self._mtu_in = 0
-        self._results = {"rtt": DEFAULT_RTT, "mtu": DEFAULT_MTU}
+        self._mtu_round = 0
+        self._mtu_responses = 0
+        self._probes = set()
+        self._probe_responses = set()
+        self._received = set()
+        self._start = 0.0
+        self._duration = 0.0
+        self._complete = False
+        self._results = {"rtt": stream.rtt, "mtu": stream.mtu}
 
     def _send_echo_command(self, enable: bool):
         chunk_flag = 1
@@ -490,11 +1201,11 @@ class StreamTest:
         self._stream.wait_for_ack(self._stream.tsn, callback)
         self._stream.send_data(data, chunk_flag, channel)
 
-    def _send_mtu_in(self):
+    def _send_mtu_in(self, mtu: int):
         chunk_flag = 1
         channel = 8
         self._index += 1
-        data = ProtoHandler.senkusha_mtu(self._index, self._cur_mtu, 1)
+        data = ProtoHandler.senkusha_mtu(self._index, mtu, 1)
         self._stream.advance_sequence()
         self._stream.send_data(data, chunk_flag, channel)
 
@@ -508,21 +1219,36 @@ class StreamTest:
         self._stream.advance_sequence()
         self._stream.send_data(data, chunk_flag, channel)
 
-    def _get_test_packet(self, length) -> bytes:
-        index = 0x1F + (self._index * 0x20)
+    def _get_test_packet(self, length: int, index: int) -> bytes:
+        index = 0x1F + (index * 0x20)
         gmac = int.from_bytes(get_random_bytes(4), "big")
         buf = bytearray(length)
         pack_into("!B", buf, 0, Header.Type.AUDIO)
-        pack_into("!HBxB", buf, 5, index, 0xFC, 0xFF)
+        pack_into("!HBxB", buf, 5, index & 0xFFFF, 0xFC, 0xFF)
         pack_into("!I", buf, 22, gmac)
         return bytes(buf)
 
+    def _call_later(self, delay: float, callback: Callable):
+        """Replace timer with callback."""
+        self._cancel_timer()
+        # pylint: disable=protected-access
+        self._timer = self._stream._session.loop.call_later(delay, callback)
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
     def stop(self):
         """Stop Tests."""
+        self._cancel_timer()
+        self._duration = time.perf_counter() - self._start
+        self._complete = bool(self._samples and self._mtu_responses)
         self._stream.rtt = self._results["rtt"]
         self._stream.mtu = self._results["mtu"]
         _LOGGER.debug(
-            "Tested network and got MTU: %s; RTT: %sms",
+            "Tested network in %.3fs and got MTU: %s; RTT: %sms",
+            self._duration,
             self._results["mtu"],
             self._results["rtt"] * 1000,
         )
@@ -531,83 +1257,223 @@ class StreamTest:
     def run_rtt(self):
         """Start RTT Test."""
         _LOGGER.debug("Running RTT test...")
+        self._start = time.perf_counter()
         self._send_echo_command(True)
 
     def send_rtt(self):
-        """Send RTT Packet."""
-        buf = self._get_test_packet(548)
-        self._ping_times.insert(self._index, [time.time(), 0])
-        self._stream.send(buf)
-
-    def recv_rtt(self):
-        """Receive RTT Packet."""
-        _LOGGER.debug("Received RTT Echo")
-        return_time = time.time()
-        self._ping_times[self._index][1] = return_time
-        self._index += 1
-
-        if self._index < self._max_pings:
+        """Send RTT Packets until window is full."""
+        window = 1 if self._verify else self.PING_WINDOW
+        while len(self._pings) < window and self._ping_index < self.MAX_PINGS:
+            index = self._ping_index
+            self._ping_index += 1
+            buf = self._get_test_packet(self.PING_SIZE, index)
+            self._pings[index] = time.perf_counter()
+            self._stream.send(buf)
+        if self._pings:
+            self._call_later(self.PING_TIMEOUT, self._check_rtt)
+
+    def recv_rtt(self, msg: bytes = b""):
+        """Receive RTT Packet.
+
+        Echo is matched to its ping by the index in the echoed packet.
+        Echoes of unknown or timed out pings are ignored.
+        """
+        return_time = time.perf_counter()
+        if self._rtt_done:
+            return
+        self._expire_pings(return_time)
+        if len(msg) < 7:
+            return
+        index = ((unpack_from("!H", msg, 5)[0] - 0x1F) & 0xFFFF) // 0x20
+        sent = self._pings.pop(index, None)
+        if sent is None:
+            _LOGGER.debug("Ignoring echo for ping: %s", index)
+            return
+        self._samples.append(return_time - sent)
+        if self._verify or self._rtt_confident() or (
+            self._ping_index >= self.MAX_PINGS and not self._pings
+        ):
+            self._finish_rtt()
+        else:
             self.send_rtt()
+
+    def _expire_pings(self, now: float):
+        """Remove pings which have timed out."""
+        for index, sent in list(self._pings.items()):
+            if now - sent < self.PING_TIMEOUT:
+                break
+            del self._pings[index]
+            self._lost += 1
+
+    def _check_rtt(self):
+        """Replace timed out pings."""
+        self._timer = None
+        if self._rtt_done:
+            return
+        self._expire_pings(time.perf_counter())
+        if self._verify and self._lost:
+            self._end_verify("No echo for ping")
+        if self._ping_index >= self.MAX_PINGS and not self._pings:
+            self._finish_rtt()
         else:
-            self._send_echo_command(False)
-            _LOGGER.debug("Stopping RTT Test")
+            self.send_rtt()
+
+    def _rtt_confident(self) -> bool:
+        """Return True if confidence interval of mean RTT is tight."""
+        count = len(self._samples)
+        if count < self.MIN_PINGS:
+            return False
+        mean = statistics.fmean(self._samples)
+        interval = (
+            self.CONFIDENCE_Z * statistics.stdev(self._samples, mean) / count**0.5
+        )
+        return interval <= max(mean * self.RTT_TOLERANCE, self.RTT_MIN_TOLERANCE)
+
+    def _finish_rtt(self):
+        self._rtt_done = True
+        self._cancel_timer()
+        self._pings.clear()
+        self._send_echo_command(False)
+        _LOGGER.debug("Stopping RTT Test")
 
     def stop_rtt(self):
         """Stop RTT Test."""
         _LOGGER.debug("RTT Test Complete")
-        rtt_results = []
-        for ping in self._ping_times:
-            rtt_results.append(ping[1] - ping[0])
-        average = sum(rtt_results) / self._max_pings
-        longest = max(rtt_results)
-        _LOGGER.info("Average RTT: %s ms; Longest RTT: %s s", average, longest)
-        self._results["rtt"] = average
+        if self._verify and self._samples:
+            _LOGGER.debug("Verified RTT with ping: %s ms", self._samples[0] * 1000)
+        elif self._samples:
+            average = statistics.fmean(self._samples)
+            _LOGGER.info(
+                "Average RTT: %s ms; Longest RTT: %s ms; Pings: %s; Lost: %s",
+                average * 1000,
+                max(self._samples) * 1000,
+                len(self._samples),
+                self._lost,
+            )
+            self._results["rtt"] = average
+        else:
+            _LOGGER.warning("No RTT Echo received")
         self.run_mtu_in()
 
     def run_mtu_in(self):
         """Run MTU In Test."""
         _LOGGER.debug("Running MTU Test")
         self._index = 0
-        self._cur_mtu = DEFAULT_MTU
-        self._send_mtu_in()
+        self._mtu_low = MIN_MTU
+        self._mtu_high = self._max_mtu
+        self._send_mtu_round()
+
+    def _send_mtu_round(self):
+        """Probe sizes evenly spaced above known MTU. Largest is sent first."""
+        self._mtu_round += 1
+        low = self._mtu_low
+        start = 1
+        if self._verify:
+            self._send_mtu_probes([self._known_mtu])
+            return
+        if self._mtu_round == 1 and low < self._known_mtu < self._mtu_high:
+            # Probe known MTU first so it is kept if larger sizes fail.
+            low = self._known_mtu
+            start = 0
+        step = (self._mtu_high - low) / max(self.MTU_PROBES - 1 + start, 1)
+        indexes = range(start, self.MTU_PROBES + start)
+        probes = sorted({low + round(step * index) for index in indexes}, reverse=True)
+        self._send_mtu_probes(probes)
+
+    def _send_mtu_probes(self, probes: list[int]):
+        self._probes = set(probes)
+        self._probe_responses = set()
+        self._received = set()
+        for mtu in probes:
+            self._send_mtu_in(mtu)
+        self._call_later(self.MTU_TIMEOUT, self._end_mtu_round)
+
+    def _end_mtu_round(self):
+        """Narrow MTU range with probes received."""
+        self._cancel_timer()
+        if not self._probes:
+            return
+        if self._verify:
+            if self._known_mtu in self._received:
+                self._mtu_low = self._known_mtu
+                self.stop_mtu_in()
+                return
+            self._end_verify("No response for MTU probe")
+            self._probes = set()
+            self._mtu_round = 0
+            self.run_mtu_in()
+            return
+        passed = [mtu for mtu in self._received if mtu <= self._mtu_high]
+        if passed:
+            self._mtu_low = max(self._mtu_low, max(passed))
+        failed = [mtu for mtu in self._probes if mtu > self._mtu_low]
+        if failed:
+            self._mtu_high = max(min(failed) - 1, self._mtu_low)
+        else:
+            self._mtu_high = self._mtu_low
+        self._probes = set()
+        _LOGGER.debug(
+            "MTU Round %s: %s - %s", self._mtu_round, self._mtu_low, self._mtu_high
+        )
+        if (
+            self._mtu_high - self._mtu_low <= self.MTU_RESOLUTION
+            or self._mtu_round >= self.MTU_MAX_ROUNDS
+        ):
+            self.stop_mtu_in()
+        else:
+            self._send_mtu_round()
+
+    def _end_verify(self, reason: str):
+        """Run full test since known results could not be verified."""
+        _LOGGER.info("Could not verify network results: %s", reason)
+        self._verify = False
+        self._known_mtu = 0
 
     def stop_mtu_in(self):
         """Stop MTU In Test."""
         _LOGGER.debug("MTU IN Test Complete")
-        _LOGGER.debug("MTU IN: %s", self._last_mtu)
-        self._mtu_in = self._last_mtu
-        self._results["mtu"] = self._mtu_in
+        if self._mtu_responses:
+            self._mtu_in = self._mtu_low
+            self._results["mtu"] = self._mtu_in
+        else:
+            _LOGGER.warning("No MTU response received")
+        _LOGGER.debug("MTU IN: %s", self._mtu_in)
         self.stop()
 
     def run_mtu_out(self):
         """Run MTU Out Test."""
         self._index = 0
-        self._cur_mtu = DEFAULT_MTU
         self._send_mtu_out()
 
     def recv_mtu(self, msg: bytes):
         """Receive MTU."""
         # log_bytes("Mtu", msg)
         # Add UDP header length
-        mtu = len(msg) + UDP_IPV4_SIZE
-        self._last_mtu = mtu
+        self._received.add(len(msg) + UDP_IPV4_SIZE)
 
     def recv_mtu_in(self, mtu_req: int, mtu_sent: int):
         """Receive MTU Packet data."""
+        if mtu_req not in self._probes:
+            return
         if mtu_req != mtu_sent:
-            _LOGGER.error("MTU requested %s but received %s", mtu_req, mtu_sent)
-            self.stop_mtu_in()
-        elif self._last_mtu:
-            if self._last_mtu == mtu_sent:
-                _LOGGER.debug("MTU at maximum: %s", self._last_mtu)
-                self.stop_mtu_in()
-            elif self._last_mtu < mtu_sent:
-                _LOGGER.debug("MTU RECV %s less than sent %s", self._last_mtu, mtu_sent)
-                self._cur_mtu -= (self._cur_mtu - self._last_mtu) // 2
-                if self._index < 3:
-                    self._last_mtu = 0
-                    self._send_mtu_in()
-                else:
-                    self.stop_mtu_in()
-            else:
-                self.stop_mtu_in()
+            _LOGGER.debug("MTU requested %s but sent %s", mtu_req, mtu_sent)
+        self._mtu_responses += 1
+        self._probe_responses.add(mtu_req)
+        if self._probe_responses == self._probes:
+            self._end_mtu_round()
+
+    @property
+    def complete(self) -> bool:
+        """Return True if RTT and MTU were measured."""
+        return self._complete
+
+    @property
+    def stats(self) -> dict:
+        """Return test stats. Times are in seconds."""
+        return {
+            "duration": self._duration,
+            "pings": len(self._samples),
+            "lost": self._lost,
+            "mtu_rounds": self._mtu_round,
+            **self._results,
+        }
@@ -6,10 +6,15 @@ import logging
 from base64 import b64encode
 import dataclasses
 from enum import IntEnum
-from struct import pack, pack_into, unpack_from, Struct
-from typing import Iterable, Union
+from struct import pack, pack_into, Struct
+from typing import Iterable, Sequence, Union
 from math import sqrt
 
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
+
 from .const import TYPE_PS4, TYPE_PS5, Quality, Resolution, FPS, StreamType
 from .crypt import StreamCipher
 
@@ -23,6 +28,18 @@ INBOUND_STREAMS = 0x64
 
 _I_SQRT = 1 / sqrt(2)
 
+_TYPE = Struct("!b")
+_HEADER = Struct("!bIII")
+_CHUNK = Struct("!bb")
+_CHUNK_DATA = Struct("!IH")
+_CHUNK_INIT = Struct("!II")
+_CHUNK_INIT_ACK = Struct("!IIHHI")
+_CHUNK_DATA_ACK = Struct("!IIHH")
+_GAP_ACK_BLOCK = Struct("!HH")
+_DUP_TSN = Struct("!I")
+# Type, index, frame index, dword2, codec, gmac, key pos
+_AV_HEADER = Struct("!BHHIBxxxxI")
+
 
 class UnexpectedMessage(Exception):
     """Message not Expected."""
@@ -309,6 +326,8 @@ class ControllerState:
 class PacketSection(abc.ABC):
     """Abstract Packet Section."""
 
+    __slots__ = ("_length", "__type")
+
     LENGTH = 0
 
     class Type(IntEnum):
@@ -359,6 +378,8 @@ class PacketSection(abc.ABC):
 class AbstractPacket(PacketSection):
     """Abstract Packet."""
 
+    __slots__ = ("__type",)
+
     def _set_type(self, _type):
         self.__type = Header.Type(_type)
 
@@ -389,11 +410,7 @@ class Header(PacketSection):
 
     LENGTH = 13
 
-    SLOTS = [
-        "tag_remote",
-        "gmac",
-        "key_pos",
-    ]
+    __slots__ = ("tag_remote", "gmac", "key_pos")
 
     class Type(IntEnum):
         """Enums for RP Headers."""
@@ -412,10 +429,12 @@ class Header(PacketSection):
     @staticmethod
     def parse(buf: bytearray, params: dict) -> int:
         """Return type. Unpack and parse header."""
-        _type = unpack_from("!b", buf, 0)[0]
-        params["tag_remote"] = unpack_from("!I", buf, 1)[0]
-        params["gmac"] = unpack_from("!I", buf, 5)[0]
-        params["key_pos"] = unpack_from("!I", buf, 9)[0]
+        (
+            _type,
+            params["tag_remote"],
+            params["gmac"],
+            params["key_pos"],
+        ) = _HEADER.unpack_from(buf, 0)
         return _type
 
     def __init__(self, header_type: int, **kwargs):
@@ -435,20 +454,20 @@ class Header(PacketSection):
 
     def pack(self, buf: bytearray):
         """Pack buffer with compiled bytes."""
-        pack_into(
-            "!bIII",
-            buf,
-            0,
-            self.type,
-            self.tag_remote,
-            self.gmac,
-            self.key_pos,
-        )
+        _HEADER.pack_into(buf, 0, self.type, self.tag_remote, self.gmac, self.key_pos)
+
+
+_AV_TYPES = {
+    Header.Type.VIDEO: Header.Type.VIDEO,
+    Header.Type.AUDIO: Header.Type.AUDIO,
+}
 
 
 class Chunk(PacketSection):
     """RP Chunk.Type. Very similar to SCTP."""
 
+    __slots__ = ("flag", "payload")
+
     class Type(IntEnum):
         """Enums for Chunks."""
 
@@ -467,8 +486,7 @@ class Chunk(PacketSection):
             payload = params.get("payload")
             if payload:
                 params.pop("payload")
-                params["tsn"] = unpack_from("!I", payload, 0)[0]
-                params["channel"] = unpack_from("!H", payload, 4)[0]
+                params["tsn"], params["channel"] = _CHUNK_DATA.unpack_from(payload, 0)
                 # Padding 3 Bytes?
                 params["data"] = bytes(payload[9:])
                 return None
@@ -485,8 +503,7 @@ class Chunk(PacketSection):
             payload = params.get("payload")
             if payload:
                 params.pop("payload")
-                params["tag"] = unpack_from("!I", payload, 0)[0]
-                params["tsn"] = unpack_from("!I", payload, 4)[0]
+                params["tag"], params["tsn"] = _CHUNK_INIT.unpack_from(payload, 0)
                 return None
         tag_local = kwargs.get("tag")
         init_tsn = kwargs.get("tsn")
@@ -502,11 +519,13 @@ class Chunk(PacketSection):
             payload = params.get("payload")
             if payload:
                 params.pop("payload")
-                params["tag"] = unpack_from("!I", payload, 0)[0]
-                params["a_rwnd"] = unpack_from("!I", payload, 4)[0]
-                params["outbound_streams"] = unpack_from("!H", payload, 8)[0]
-                params["inbound_streams"] = unpack_from("!H", payload, 10)[0]
-                params["tsn"] = unpack_from("!I", payload, 12)[0]
+                (
+                    params["tag"],
+                    params["a_rwnd"],
+                    params["outbound_streams"],
+                    params["inbound_streams"],
+                    params["tsn"],
+                ) = _CHUNK_INIT_ACK.unpack_from(payload, 0)
                 params["data"] = payload[16:]
         return None
 
@@ -518,10 +537,28 @@ class Chunk(PacketSection):
             payload = params.get("payload")
             if payload:
                 params.pop("payload")
-                params["tsn"] = unpack_from("!I", payload, 0)[0]
-                params["a_rwnd"] = unpack_from("!I", payload, 4)[0]
-                params["gap_ack_blocks_count"] = unpack_from("!H", payload, 8)[0]
-                params["dup_tsns_count"] = unpack_from("!H", payload, 10)[0]
+                (
+                    params["tsn"],
+                    params["a_rwnd"],
+                    params["gap_ack_blocks_count"],
+                    params["dup_tsns_count"],
+                ) = _CHUNK_DATA_ACK.unpack_from(payload, 0)
+                offset = _CHUNK_DATA_ACK.size
+                # Gap ack blocks are start and end offsets from ack TSN.
+                count = min(
+                    params["gap_ack_blocks_count"], (len(payload) - offset) // 4
+                )
+                params["gap_ack_blocks"] = list(
+                    _GAP_ACK_BLOCK.iter_unpack(payload[offset : offset + count * 4])
+                )
+                offset += count * 4
+                count = min(params["dup_tsns_count"], (len(payload) - offset) // 4)
+                params["dup_tsns"] = [
+                    tsn
+                    for (tsn,) in _DUP_TSN.iter_unpack(
+                        payload[offset : offset + count * 4]
+                    )
+                ]
                 return None
         tsn = kwargs.get("tsn")
         gap_acks = kwargs.get("gap_ack_blocks_count") or 0
@@ -556,8 +593,7 @@ class Chunk(PacketSection):
     @staticmethod
     def parse(buf: bytearray, params: dict) -> int:
         """Return type. Unpack and parse header."""
-        _type = unpack_from("!b", buf, 13)[0]
-        params["flag"] = unpack_from("!b", buf, 14)[0]
+        _type, params["flag"] = _CHUNK.unpack_from(buf, 13)
         params["payload"] = buf[17:]
         if _type in Chunk.PAYLOADS:
             Chunk.PAYLOADS[_type](parse=True, params=params)
@@ -587,8 +623,8 @@ class Packet(AbstractPacket):
     @staticmethod
     def is_av(header_type: bytes) -> int:  # pylint: disable=used-before-assignment
         """Return AV type if packet is AV else return 0."""
-        av_mask = int.from_bytes(header_type, "big") & 0x0F
-        if av_mask in [Header.Type.VIDEO, Header.Type.AUDIO]:
+        av_mask = header_type[0] & 0x0F
+        if av_mask in _AV_TYPES:
             return av_mask
         return 0
 
@@ -598,12 +634,13 @@ class Packet(AbstractPacket):
 
         Params is updated when parsing each section.
         """
-        buf = bytearray(buf)
         if params is None:
             params = {}
         av_mask = Packet.is_av(buf[:1])
         if av_mask:
+            # AV data is only read so avoid copying.
             return AVPacket(av_mask, buf, **params)
+        buf = bytearray(buf)
         h_type = Header.parse(buf, params)
         c_type = Chunk.parse(buf, params)
         return Packet(h_type, c_type, **params)
@@ -652,6 +689,26 @@ class Packet(AbstractPacket):
 class AVPacket(AbstractPacket):
     """AV Packet. Parsing capability only."""
 
+    __slots__ = (
+        "_host_type",
+        "_has_nalu",
+        "_index",
+        "_frame_index",
+        "_dword2",
+        "_codec",
+        "_key_pos",
+        "_unit_index",
+        "_units_total",
+        "_units_fec",
+        "_units_src",
+        "_audio_size",
+        "_adaptive_stream_index",
+        "_data",
+        "_encrypted",
+        "_frame_meta",
+        "_nalu",
+    )
+
     class Type(IntEnum):
         """Enums for AV Packet."""
 
@@ -675,73 +732,69 @@ class AVPacket(AbstractPacket):
             f"{self.frame_meta['units']['total']}>"
         )
 
-    # pylint: disable=unused-argument
-    def __init__(self, av_type: int, buf: bytearray, **kwargs):
-        super().__init__(av_type)
+    # pylint: disable=unused-argument,super-init-not-called
+    def __init__(self, av_type: int, buf: bytes, **kwargs):
+        # Type is already validated by `Packet.is_av`; Skip validation in base init.
+        self._set_type(_AV_TYPES[av_type])
+        self._length = 0
         self._host_type = kwargs.get("host_type") or TYPE_PS4
-        self._has_nalu = (unpack_from("!B", buf, 0)[0] >> 4) & 1 != 0
-        self._index = unpack_from("!H", buf, 1)[0]
-        self._frame_index = unpack_from("!H", buf, 3)[0]
-        self._dword2 = unpack_from("!I", buf, 5)[0]
-        self._codec = unpack_from("!B", buf, 9)[0]
-        # Unknown uint at offset 10
-        self._key_pos = unpack_from("!I", buf, 14)[0]
+        (
+            first,
+            self._index,
+            self._frame_index,
+            dword2,
+            self._codec,
+            self._key_pos,
+        ) = _AV_HEADER.unpack_from(buf, 0)
+        self._dword2 = dword2
+        self._has_nalu = (first >> 4) & 1 != 0
         self._adaptive_stream_index = None
-        self._data = None
         self._encrypted = True
-        self._frame_meta = {}
+        self._frame_meta = None
         self._nalu = None
+        self._audio_size = 0
 
         offset = 1
-        if self.type == Header.Type.VIDEO:
+        if av_type == Header.Type.VIDEO:
             offset = 3
-            self._unit_index = (self._dword2 >> 0x15) & 0x7FF
-            self._adaptive_stream_index = unpack_from("!b", buf, 20)[0] >> 5
+            self._unit_index = (dword2 >> 0x15) & 0x7FF
+            self._adaptive_stream_index = _TYPE.unpack_from(buf, 20)[0] >> 5
+            self._units_total = ((dword2 >> 0xA) & 0x7FF) + 1
+            self._units_fec = dword2 & 0x3FF
+            self._units_src = self._units_total - self._units_fec
         else:
-            self._unit_index = (self._dword2 >> 0x18) & 0xFF
-        if self.has_nalu:
+            self._unit_index = (dword2 >> 0x18) & 0xFF
+            self._units_total = ((dword2 >> 0x10) & 0xFF) + 1
+            self._units_fec = (dword2 >> 4) & 0x0F
+            self._units_src = dword2 & 0x0F
+            self._audio_size = (dword2 & 0xFFFF) >> 8
+        if self._has_nalu:
             # Unknown ushort at 18
             self._nalu = buf[18 + offset + 1 : 18 + offset + 3]
             offset += 3
 
-        if self.type == Header.Type.AUDIO and self._host_type == TYPE_PS5:
+        if av_type == Header.Type.AUDIO and self._host_type == TYPE_PS5:
             offset += 1
-        self._data = buf[18 + offset :]
-
-        self._get_frame_meta()
+        self._data = memoryview(buf)[18 + offset :]
 
-    def _get_frame_meta(self):
-        self._frame_meta = {
+    def _get_frame_meta(self) -> dict:
+        units = {
+            "total": self._units_total,
+            "fec": self._units_fec,
+            "src": self._units_src,
+        }
+        if self.type == Header.Type.AUDIO:
+            units["size"] = self._audio_size
+        return {
             "frame": self.frame_index,
             "index": self.unit_index,
+            "units": units,
         }
-        if self.type == Header.Type.VIDEO:
-            total = ((self._dword2 >> 0xA) & 0x7FF) + 1
-            fec = self._dword2 & 0x3FF
-            src = total - fec
-            units = {
-                "total": total,
-                "fec": fec,
-                "src": src,
-            }
-        else:
-            _dword2 = self._dword2 & 0xFFFF
-            total = ((self._dword2 >> 0x10) & 0xFF) + 1
-            fec = (_dword2 >> 4) & 0x0F
-            src = _dword2 & 0x0F
-            size = _dword2 >> 8
-            units = {
-                "total": total,
-                "fec": fec,
-                "src": src,
-                "size": size,
-            }
-        self._frame_meta["units"] = units
 
     def decrypt(self, cipher):
         """Decrypt AV Data."""
         if self.encrypted:
-            self._data = cipher.decrypt(self.data, self.key_pos)
+            self._data = cipher.decrypt(self._data, self.key_pos)
             self._encrypted = False
 
     @property
@@ -757,6 +810,8 @@ class AVPacket(AbstractPacket):
     @property
     def frame_meta(self) -> dict:
         """Return frame meta data."""
+        if self._frame_meta is None:
+            self._frame_meta = self._get_frame_meta()
         return self._frame_meta
 
     @property
@@ -772,22 +827,22 @@ class AVPacket(AbstractPacket):
     @property
     def frame_length(self) -> int:
         """Return the length of units."""
-        return self._frame_meta["units"]["total"]
+        return self._units_total
 
     @property
     def frame_length_src(self) -> int:
         """Return the length of src units."""
-        return self._frame_meta["units"]["src"]
+        return self._units_src
 
     @property
     def frame_length_fec(self) -> int:
         """Return the length of fec units."""
-        return self._frame_meta["units"]["fec"]
+        return self._units_fec
 
     @property
     def frame_size_audio(self) -> int:
         """Return frame size for audio packet."""
-        return self._frame_meta["units"]["size"]
+        return self._audio_size
 
     @property
     def codec(self) -> int:
@@ -807,17 +862,17 @@ class AVPacket(AbstractPacket):
     @property
     def is_last(self) -> bool:
         """Return True if packet is the last packet."""
-        return self.unit_index == self.frame_length - 1
+        return self._unit_index == self._units_total - 1
 
     @property
     def is_last_src(self) -> bool:
         """Return True if packet is the last src packet."""
-        return self.unit_index == self.frame_length_src - 1
+        return self._unit_index == self._units_src - 1
 
     @property
     def is_fec(self) -> bool:
         """Return True if packet is fec."""
-        return self.unit_index >= self.frame_length_src
+        return self._unit_index >= self._units_src
 
     @property
     def nalu(self) -> bytes:
@@ -830,11 +885,94 @@ class AVPacket(AbstractPacket):
         return self._encrypted
 
     @property
-    def data(self) -> bytes:
+    def data(self) -> memoryview:
         """Return AV Data."""
         return self._data
 
 
+AV_BATCH_HEADER_LENGTH = 21
+
+if np is not None:
+    _AV_BATCH_RAW_DTYPE = np.dtype(
+        [
+            ("first", "u1"),
+            ("index", ">u2"),
+            ("frame_index", ">u2"),
+            ("dword2", ">u4"),
+            ("codec", "u1"),
+            ("gmac", "V4"),
+            ("key_pos", ">u4"),
+            ("unknown", "V2"),
+            ("adaptive", "i1"),
+        ]
+    )
+    AV_BATCH_DTYPE = np.dtype(
+        [
+            ("type", "u1"),
+            ("has_nalu", "?"),
+            ("index", "u2"),
+            ("frame_index", "u2"),
+            ("unit_index", "u2"),
+            ("units_total", "u2"),
+            ("units_src", "u2"),
+            ("units_fec", "u2"),
+            ("audio_size", "u2"),
+            ("codec", "u1"),
+            ("key_pos", "u4"),
+            ("offset", "u2"),
+            ("adaptive_stream_index", "i1"),
+        ]
+    )
+else:
+    AV_BATCH_DTYPE = None
+
+
+def parse_av_batch(buffers: Sequence[bytes], host_type: str = TYPE_PS4):
+    """Return structured array of AV headers parsed from a batch of datagrams.
+
+    Decodes the same fields as `AVPacket` for all buffers at once.
+    Payload of each buffer starts at its `offset` field.
+    Requires numpy.
+
+    :param buffers: Raw AV datagrams
+    :param host_type: Host type
+    """
+    if np is None:
+        raise ModuleNotFoundError("numpy is required to parse AV batches")
+    length = AV_BATCH_HEADER_LENGTH
+    raw = b"".join([buf[:length] for buf in buffers])
+    if len(raw) != length * len(buffers):
+        raw = b"".join([bytes(buf[:length]).ljust(length, b"\x00") for buf in buffers])
+    raw = np.frombuffer(raw, dtype=_AV_BATCH_RAW_DTYPE)
+    dword2 = raw["dword2"]
+    first = raw["first"]
+    video = (first & 0x0F) == Header.Type.VIDEO
+    has_nalu = (first >> 4) & 1 != 0
+
+    headers = np.empty(len(raw), dtype=AV_BATCH_DTYPE)
+    headers["type"] = first & 0x0F
+    headers["has_nalu"] = has_nalu
+    headers["index"] = raw["index"]
+    headers["frame_index"] = raw["frame_index"]
+    headers["codec"] = raw["codec"]
+    headers["key_pos"] = raw["key_pos"]
+    headers["unit_index"] = np.where(
+        video, (dword2 >> 0x15) & 0x7FF, (dword2 >> 0x18) & 0xFF
+    )
+    total = np.where(video, (dword2 >> 0xA) & 0x7FF, (dword2 >> 0x10) & 0xFF) + 1
+    fec = np.where(video, dword2 & 0x3FF, (dword2 >> 4) & 0x0F)
+    headers["units_total"] = total
+    headers["units_fec"] = fec
+    headers["units_src"] = np.where(video, total - fec, dword2 & 0x0F)
+    headers["audio_size"] = np.where(video, 0, (dword2 & 0xFFFF) >> 8)
+    headers["adaptive_stream_index"] = np.where(video, raw["adaptive"] >> 5, -1)
+    offset = 18 + np.where(video, 3, 1) + has_nalu * 3
+    if host_type == TYPE_PS5:
+        offset += ~video
+    headers["offset"] = offset
+    return headers
+
+
 class FeedbackHeader(PacketSection):
     """Feedback Header."""
 
@@ -1,14 +1,32 @@
 """Utility Methods."""
 from __future__ import annotations
+import ctypes
+import ctypes.util
+import errno
 import inspect
+import ipaddress
 import json
 import logging
+import os
 import pathlib
 import select
+import socket
+import struct
+import sys
+import threading
 import time
 from binascii import hexlify
+from typing import Callable
 
-from .const import CONTROLS_FILE, OPTIONS_FILE, PROFILE_DIR, PROFILE_FILE
+import netifaces
+
+from .const import (
+    CONTROLS_FILE,
+    NETWORK_FILE,
+    OPTIONS_FILE,
+    PROFILE_DIR,
+    PROFILE_FILE,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -103,6 +121,67 @@ def write_profiles(profiles: dict, path: str = ""):
         json.dump(profiles, _file)
 
 
+def get_network_cache(path: str = "") -> dict:
+    """Return cached network test results."""
+    data = {}
+    if not path:
+        dir_path = check_dir()
+        path = dir_path / NETWORK_FILE
+    else:
+        path = pathlib.Path(path)
+    check_file(path)
+    with open(path, "r", encoding="utf-8") as _file:
+        try:
+            data = json.load(_file)
+        except json.JSONDecodeError:
+            _LOGGER.error("Network cache file is corrupt: %s", path)
+    return data
+
+
+def write_network_cache(cache: dict, path: str = ""):
+    """Write network test results."""
+    if not path:
+        path = pathlib.Path.home() / PROFILE_DIR / NETWORK_FILE
+    else:
+        path = pathlib.Path(path)
+    with open(path, "w", encoding="utf-8") as _file:
+        json.dump(cache, _file)
+
+
+# pylint: disable=c-extension-no-member
+def _get_netmask(ip_address: str) -> str:
+    """Return netmask of interface with address or empty string."""
+    for interface in netifaces.interfaces():
+        addresses = netifaces.ifaddresses(interface).get(netifaces.AF_INET)
+        if not addresses:
+            continue
+        for address in addresses:
+            if address.get("addr") == ip_address:
+                return address.get("netmask") or ""
+    return ""
+
+
+def get_network_key(mac_address: str, host: str) -> str:
+    """Return network cache key for host.
+
+    Key is made of host MAC address, local address used to reach host
+    and subnet of local address. Subnet is the address alone if the netmask
+    of its interface is not found. Return empty string if host is not reachable.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        # No packets are sent; Only selects local address.
+        sock.connect((host, 9))
+        local = sock.getsockname()[0]
+    except OSError:
+        return ""
+    finally:
+        sock.close()
+    netmask = _get_netmask(local) or "255.255.255.255"
+    subnet = ipaddress.ip_network(f"{local}/{netmask}", strict=False)
+    return f"{mac_address}/{local}/{subnet}"
+
+
 def get_users(device_id: str, profiles: dict = None, path: str = "") -> list[str]:
     """Return users for device."""
     users = []
@@ -153,20 +232,366 @@ def to_b(_int: int, length: int = 2, order="big") -> bytes:
     return int.to_bytes(_int, length, order)
 
 
-def listener(name: str, sock, handle, stop_event):
-    """Worker for socket."""
+class _IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _get_mmsg_func(name: str, argtypes: list):
+    """Return libc function or None if not available."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        func = getattr(libc, name)
+    except (OSError, AttributeError):
+        return None
+    func.argtypes = argtypes
+    func.restype = ctypes.c_int
+    return func
+
+
+_RECVMMSG = _get_mmsg_func(
+    "recvmmsg",
+    [
+        ctypes.c_int,
+        ctypes.POINTER(_MMsgHdr),
+        ctypes.c_uint,
+        ctypes.c_int,
+        ctypes.c_void_p,
+    ],
+)
+_SENDMMSG = _get_mmsg_func(
+    "sendmmsg",
+    [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int],
+)
+_MSG_WAITFORONE = 0x10000
+
+
+class BatchReceiver:
+    """Receive datagrams from a socket in batches.
+
+    Datagrams are received into preallocated slots with a single
+    recvmmsg call on Linux. Other platforms call `recv_into` for each slot.
+    Datagrams larger than a slot are truncated and counted if recvmmsg is used.
+
+    Each datagram is copied out of its slot since slots are reused by the
+    next batch while packets are still queued for other threads.
+
+    :param sock: Datagram socket
+    :param batch_size: Maximum datagrams received per batch
+    :param buffer_size: Size of each slot in bytes
+    :param use_recvmmsg: Use recvmmsg if available
+    """
+
+    BATCH_SIZE = 64
+    BUFFER_SIZE = 4096
+
+    def __init__(
+        self,
+        sock: socket.socket,
+        batch_size: int = BATCH_SIZE,
+        buffer_size: int = BUFFER_SIZE,
+        use_recvmmsg: bool = True,
+    ):
+        self._sock = sock
+        self._batch_size = batch_size
+        self._buffer_size = buffer_size
+        self._buffer = bytearray(batch_size * buffer_size)
+        self._view = memoryview(self._buffer)
+        self._recvmmsg = _RECVMMSG if use_recvmmsg else None
+        self._msgs = None
+        if self._recvmmsg is not None:
+            self._init_msgs()
+        self._start = None
+        self._stats = {"batches": 0, "datagrams": 0, "max_batch": 0, "truncated": 0}
+
+    def _init_msgs(self):
+        """Point recvmmsg headers at slots."""
+        size = self._buffer_size
+        base = ctypes.addressof(ctypes.c_char.from_buffer(self._buffer))
+        self._iovecs = (_IOVec * self._batch_size)()
+        self._msgs = (_MMsgHdr * self._batch_size)()
+        for index in range(self._batch_size):
+            self._iovecs[index].iov_base = base + index * size
+            self._iovecs[index].iov_len = size
+            self._msgs[index].msg_hdr.msg_iov = ctypes.pointer(self._iovecs[index])
+            self._msgs[index].msg_hdr.msg_iovlen = 1
+
+    def _recv_mmsg(self, block: bool) -> list[int]:
+        """Return lengths of datagrams received with recvmmsg."""
+        count = self._recvmmsg(
+            self._sock.fileno(),
+            self._msgs,
+            self._batch_size,
+            _MSG_WAITFORONE if block else socket.MSG_DONTWAIT,
+            None,
+        )
+        if count < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return []
+            raise OSError(err, "recvmmsg failed")
+        msgs = self._msgs
+        for index in range(count):
+            hdr = msgs[index].msg_hdr
+            if hdr.msg_flags & socket.MSG_TRUNC:
+                self._stats["truncated"] += 1
+                _LOGGER.warning("Datagram larger than %s bytes", self._buffer_size)
+        return [msgs[index].msg_len for index in range(count)]
+
+    def _recv_each(self, block: bool) -> list[int]:
+        """Return lengths of datagrams received with recv_into.
+
+        Only the first read blocks if `block` is True.
+        Other reads are done only if a datagram is waiting so a blocking socket
+        does not block.
+        """
+        size = self._buffer_size
+        sock = self._sock
+        lengths = []
+        for index in range(self._batch_size):
+            if (index or not block) and not select.select([sock], [], [], 0)[0]:
+                break
+            try:
+                length = sock.recv_into(self._view[index * size :], size)
+            except (BlockingIOError, InterruptedError):
+                break
+            lengths.append(length)
+        return lengths
+
+    def recv(self, block: bool = False) -> list[bytes]:
+        """Return batch of datagrams. Returns empty list if none are waiting.
+
+        :param block: Wait for at least one datagram. Socket must be blocking
+        """
+        if self._recvmmsg is not None:
+            lengths = self._recv_mmsg(block)
+        else:
+            lengths = self._recv_each(block)
+        if not lengths:
+            return []
+        size = self._buffer_size
+        view = self._view
+        msgs = [
+            bytes(view[index * size : index * size + length])
+            for index, length in enumerate(lengths)
+        ]
+        if self._start is None:
+            self._start = time.monotonic()
+        stats = self._stats
+        stats["batches"] += 1
+        stats["datagrams"] += len(msgs)
+        stats["max_batch"] = max(stats["max_batch"], len(msgs))
+        return msgs
+
+    @property
+    def stats(self) -> dict:
+        """Return receive stats."""
+        stats = dict(self._stats)
+        elapsed = time.monotonic() - self._start if self._start else 0
+        stats["batch_size"] = stats["datagrams"] / max(stats["batches"], 1)
+        stats["datagrams_per_second"] = stats["datagrams"] / elapsed if elapsed else 0
+        stats["recvmmsg"] = self._recvmmsg is not None
+        return stats
+
+
+class BatchSender:
+    """Send datagrams in batches.
+
+    If the sender is idle a datagram is sent immediately with `send`
+    and a flush is scheduled. Datagrams sent before that flush are batched
+    and sent together with a single sendmmsg call on Linux.
+    Other platforms call `send` for each. No datagram waits longer than `max_delay`.
+    If `backlog` reports buffered bytes, datagrams are sent with `send`
+    so they are not reordered ahead of buffered datagrams.
+
+    :param sock: Non blocking datagram socket; Only used for sendmmsg
+    :param addr: IPv4 destination address
+    :param send: Callback which sends a single datagram
+    :param schedule: Thread safe callable which calls callback after delay
+    :param max_delay: Maximum seconds a datagram waits before being sent
+    :param batch_size: Maximum datagrams per batch; Full batches are sent at once
+    :param use_sendmmsg: Use sendmmsg if available
+    :param backlog: Callable which returns bytes buffered by `send`
+    """
+
+    MAX_DELAY = 0.001
+    BATCH_SIZE = 64
+
+    def __init__(
+        self,
+        sock: socket.socket,
+        addr: tuple[str, int],
+        send: Callable[[bytes], None],
+        schedule: Callable[[float, Callable[[], None]], None],
+        max_delay: float = MAX_DELAY,
+        batch_size: int = BATCH_SIZE,
+        use_sendmmsg: bool = True,
+        backlog: Callable[[], int] = None,
+    ):
+        self._sock = sock
+        self._send = send
+        self._schedule = schedule
+        self._backlog = backlog
+        self._max_delay = max_delay
+        self._batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = []
+        self._first = 0.0
+        self._scheduled = False
+        self._sendmmsg = _SENDMMSG if use_sendmmsg and sock is not None else None
+        if self._sendmmsg is not None:
+            self._init_msgs(addr)
+        self._stats = {
+            "batches": 0,
+            "immediate": 0,
+            "datagrams": 0,
+            "max_batch": 0,
+            "max_wait": 0.0,
+        }
+
+    def _init_msgs(self, addr: tuple[str, int]):
+        """Point sendmmsg headers at destination address."""
+        host, port = addr
+        self._addr = ctypes.create_string_buffer(
+            struct.pack("=H", socket.AF_INET)
+            + struct.pack("!H", port)
+            + socket.inet_aton(socket.gethostbyname(host))
+            + bytes(8),
+            16,
+        )
+        self._iovecs = (_IOVec * self._batch_size)()
+        self._msgs = (_MMsgHdr * self._batch_size)()
+        for index in range(self._batch_size):
+            hdr = self._msgs[index].msg_hdr
+            hdr.msg_name = ctypes.addressof(self._addr)
+            hdr.msg_namelen = 16
+            hdr.msg_iov = ctypes.pointer(self._iovecs[index])
+            hdr.msg_iovlen = 1
+
+    def send(self, data: bytes):
+        """Send datagram now if idle. Otherwise queue it to be sent."""
+        with self._lock:
+            if not self._scheduled:
+                self._scheduled = True
+                self._send(data)
+                self._stats["immediate"] += 1
+                self._stats["datagrams"] += 1
+                count = 0
+            else:
+                pending = self._pending
+                pending.append(data)
+                count = len(pending)
+                if count == 1:
+                    self._first = time.perf_counter()
+        if count >= self._batch_size:
+            self.flush()
+        elif count == 0:
+            self._schedule(self._max_delay, self.flush)
+
+    def flush(self):
+        """Send pending datagrams. Sender is idle afterwards."""
+        with self._lock:
+            self._scheduled = False
+            pending = self._pending
+            if not pending:
+                return
+            self._pending = []
+            wait = time.perf_counter() - self._first
+            sent = 0
+            if self._sendmmsg is not None and not (
+                self._backlog is not None and self._backlog()
+            ):
+                sent = self._send_mmsg(pending)
+            for data in pending[sent:]:
+                self._send(data)
+        stats = self._stats
+        stats["batches"] += 1
+        stats["datagrams"] += len(pending)
+        stats["max_batch"] = max(stats["max_batch"], len(pending))
+        stats["max_wait"] = max(stats["max_wait"], wait)
+
+    def _send_mmsg(self, pending: list[bytes]) -> int:
+        """Return number of datagrams sent with sendmmsg."""
+        count = min(len(pending), self._batch_size)
+        pointers = [ctypes.c_char_p(data) for data in pending[:count]]
+        for index, pointer in enumerate(pointers):
+            self._iovecs[index].iov_base = ctypes.cast(pointer, ctypes.c_void_p)
+            self._iovecs[index].iov_len = len(pending[index])
+        sent = self._sendmmsg(self._sock.fileno(), self._msgs, count, 0)
+        if sent < 0:
+            err = ctypes.get_errno()
+            if err not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                _LOGGER.warning("sendmmsg failed: %s", os.strerror(err))
+            return 0
+        return sent
+
+    @property
+    def stats(self) -> dict:
+        """Return send stats. Wait is in seconds."""
+        stats = dict(self._stats)
+        stats["batch_size"] = stats["datagrams"] / max(stats["batches"], 1)
+        stats["sendmmsg"] = self._sendmmsg is not None
+        return stats
+
+
+def listener(
+    name: str,
+    sock,
+    handle: Callable[[bytes], None],
+    stop_event,
+    handle_batch: Callable[[list[bytes]], None] = None,
+    receiver: BatchReceiver = None,
+    poll: Callable[[], None] = None,
+):
+    """Worker for socket.
+
+    Waits for socket to be readable and drains it in batches.
+
+    :param name: Name used in logs
+    :param sock: Non blocking datagram socket
+    :param handle: Callback for each datagram
+    :param stop_event: Event which stops worker when set
+    :param handle_batch: Callback for each batch. Replaces `handle` if set
+    :param receiver: Receiver to use; Created if None
+    :param poll: Callback run after each wait for socket
+    """
     _LOGGER.debug("Thread Started: %s", name)
+    if receiver is None:
+        receiver = BatchReceiver(sock)
     stop_event.clear()
     while not stop_event.is_set():
         available, _, _ = select.select([sock], [], [], 0.01)
-        if sock in available:
-            data = sock.recv(4096)
-            # log_bytes(f"{name} RECV", data)
-            if len(data) > 0:
-                handle(data)
-            else:
-                stop_event.set()
-        time.sleep(0.001)
+        if poll is not None:
+            poll()
+        if sock not in available:
+            continue
+        msgs = receiver.recv()
+        # log_bytes(f"{name} RECV", data)
+        if not all(msgs):
+            msgs = [msg for msg in msgs if msg]
+            stop_event.set()
+        if handle_batch is not None:
+            handle_batch(msgs)
+        else:
+            for msg in msgs:
+                handle(msg)
 
     sock.close()
     _LOGGER.info("%s Stopped", name)
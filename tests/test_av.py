@@ -0,0 +1,581 @@
+"""Tests for pyremoteplay/av.py."""
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import Executor, Future
+from struct import pack_into
+from types import SimpleNamespace
+
+import pytest
+
+from pyremoteplay import av
+from pyremoteplay.av import (
+    AVHandler,
+    AVStream,
+    CongestionReporter,
+    CorruptReporter,
+    FrameBuffer,
+    HandoffQueue,
+    OverloadPolicy,
+)
+from pyremoteplay.const import FFMPEG_PADDING, TYPE_PS4
+from pyremoteplay.crypt import StreamCipher
+from pyremoteplay.stream_packets import Header, Packet, parse_av_batch
+
+
+def _video_packet(
+    index: int, unit_index: int, src: int, fec: int, frame_index: int = 1, adaptive=0
+) -> bytes:
+    """Return video packet."""
+    buf = bytearray(64)
+    dword2 = (unit_index << 21) | ((src + fec - 1) << 10) | fec
+    pack_into(
+        "!BHHIBxxxxI", buf, 0, Header.Type.VIDEO, index, frame_index, dword2, 0, 0
+    )
+    buf[20] = adaptive << 5
+    buf[21:] = bytes([index]) * (len(buf) - 21)
+    return bytes(buf)
+
+
+def _audio_packet(index: int) -> bytes:
+    """Return audio packet with one src unit."""
+    buf = bytearray(64)
+    pack_into("!BHHIBxxxxI", buf, 0, Header.Type.AUDIO, index, index, 0x1, 0, 0)
+    return bytes(buf)
+
+
+def test_handle_many():
+    """Test batch handling produces same frames as per packet handling."""
+    pytest.importorskip("numpy")
+    msgs = [_video_packet(index, index, 3, 1) for index in range(4)]
+    single, batch, corrupt = [], [], []
+
+    def on_corrupt(start: int, end: int):
+        corrupt.append((start, end))
+
+    stream = AVStream("video", b"", lambda buf: single.append(bytes(buf)), on_corrupt)
+    for msg in msgs:
+        stream.handle(Packet.parse(msg))
+
+    stream = AVStream("video", b"", lambda buf: batch.append(bytes(buf)), on_corrupt)
+    headers = parse_av_batch(msgs)
+    offsets = headers["offset"].tolist()
+    payloads = [memoryview(msg)[offset:] for msg, offset in zip(msgs, offsets)]
+    stream.handle_many(headers, payloads)
+    assert len(single) == 1
+    assert single == batch
+    assert not corrupt
+    assert stream.received == len(msgs)
+
+
+def test_handoff_queue():
+    """Test consumer wakes on put and stats are tracked."""
+    handoff = HandoffQueue(maxlen=4)
+    assert handoff.get_batch(0.01) == []
+
+    def produce():
+        time.sleep(0.05)
+        handoff.put(1)
+
+    thread = threading.Thread(target=produce)
+    start = time.perf_counter()
+    thread.start()
+    assert handoff.get_batch(2) == [1]
+    assert time.perf_counter() - start < 1
+    thread.join()
+
+    for item in range(5):
+        handoff.put(item)
+    assert len(handoff) == 4
+    assert handoff.get_batch() == [0, 1, 2, 3]
+    stats = handoff.stats
+    assert stats["high_water"] == 4
+    assert stats["dropped"] == 1
+    assert stats["depth"] == 0
+    assert 0 <= stats["wait_p50"] <= stats["wait_p90"] <= stats["wait_p99"]
+
+
+def test_handoff_queue_stats_concurrent():
+    """Test stats can be read while consumer drains queue."""
+    handoff = HandoffQueue(maxlen=8, samples=64)
+    done = threading.Event()
+
+    def consume():
+        for item in range(5000):
+            handoff.put(item)
+            handoff.get_batch(0)
+        done.set()
+
+    thread = threading.Thread(target=consume)
+    thread.start()
+    while not done.is_set():
+        assert handoff.stats["wait_p99"] >= 0
+    thread.join()
+
+
+def test_handler_pipelines():
+    """Test audio and video are queued and processed separately."""
+    session = SimpleNamespace(
+        type=TYPE_PS4,
+        is_stopped=False,
+        events=SimpleNamespace(emit=lambda *args: None),
+    )
+    handler = AVHandler(session)
+    handler.set_cipher(StreamCipher(bytes(16), bytes(16)))
+    assert len(handler._video._cipher._keystream) > 0
+    assert len(handler._audio._cipher._keystream) == 0
+    for index in range(2):
+        handler.add_packet(_video_packet(index, index, 3, 1))
+    for index in range(AVHandler.AUDIO_QUEUE_SIZE + 4):
+        handler.add_packet(_audio_packet(index))
+    stats = handler.stats
+    assert stats["video"]["queue"]["depth"] == 2
+    assert stats["audio"]["queue"]["depth"] == AVHandler.AUDIO_QUEUE_SIZE
+    assert stats["audio"]["queue"]["dropped"] == 4
+
+    handler.process_packet()
+    stats = handler.stats
+    assert stats["video"]["packets"] == 2
+    assert stats["audio"]["packets"] == AVHandler.AUDIO_QUEUE_SIZE
+    assert stats["packets"] == AVHandler.AUDIO_QUEUE_SIZE + 2
+
+
+def _overload_handler(mode: str, events: list) -> AVHandler:
+    session = SimpleNamespace(
+        type=TYPE_PS4,
+        is_stopped=False,
+        error="",
+        stop=lambda: events.append(("stop",)),
+        events=SimpleNamespace(emit=lambda *args: events.append(args)),
+    )
+    return AVHandler(session, OverloadPolicy(mode, max_bytes=200))
+
+
+def test_overload_default(monkeypatch):
+    """Test session is stopped by default and mode can be set for handlers."""
+    events = []
+    session = SimpleNamespace(
+        type=TYPE_PS4,
+        is_stopped=False,
+        error="",
+        stop=lambda: events.append(("stop",)),
+        events=SimpleNamespace(emit=lambda *args: events.append(args)),
+    )
+    assert AVHandler(session)._overload_policy.mode == OverloadPolicy.STOP
+    monkeypatch.setattr(AVHandler, "OVERLOAD_MODE", OverloadPolicy.SKIP)
+    assert AVHandler(session)._overload_policy.mode == OverloadPolicy.SKIP
+
+
+def test_overload_skip():
+    """Test overloaded video is skipped to start of next frame."""
+    events = []
+    handler = _overload_handler(OverloadPolicy.SKIP, events)
+    for index in range(5):
+        handler.add_packet(_video_packet(index, index, 8, 0))
+    assert events == [("overload", "skip")]
+    stats = handler.stats
+    assert stats["overload"] == "skip"
+    assert stats["video"]["queue"]["depth"] == 0
+    assert stats["video"]["dropped"] == 1
+
+    handler.add_packet(_video_packet(5, 5, 8, 0))
+    handler.add_packet(_video_packet(8, 0, 1, 0, frame_index=2))
+    assert events[-1] == ("overload_end",)
+    stats = handler.stats
+    assert stats["overload"] is None
+    assert stats["video"]["dropped"] == 2
+    assert stats["video"]["queue"]["depth"] == 1
+    assert stats["video"]["queue"]["bytes"] == 64
+
+
+def test_overload_modes():
+    """Test stop and shed audio modes."""
+    events = []
+    handler = _overload_handler(OverloadPolicy.STOP, events)
+    for index in range(5):
+        handler.add_packet(_video_packet(index, index, 8, 0))
+    assert events == [("overload", "stop"), ("stop",)]
+    handler.add_packet(_video_packet(5, 0, 1, 0, frame_index=2))
+    assert handler.stats["video"]["queue"]["depth"] == 0
+
+    events = []
+    handler = _overload_handler(OverloadPolicy.SHED_AUDIO, events)
+    for index in range(4):
+        handler.add_packet(_video_packet(index, index, 8, 0))
+    handler.add_packet(_audio_packet(0))
+    assert events == [("overload", "shed_audio")]
+    stats = handler.stats
+    assert stats["audio"]["dropped"] == 1
+    assert stats["video"]["queue"]["depth"] == 4
+
+    # Video falls further behind.
+    for index in range(4, 8):
+        handler.add_packet(_video_packet(index, index, 8, 0))
+    assert events[-1] == ("overload", "skip")
+    with pytest.raises(ValueError):
+        OverloadPolicy("invalid")
+
+
+def test_frame_buffer():
+    """Test units are assembled in order with prefix and skipped bytes."""
+    frame_buffer = FrameBuffer(8, skip=2)
+    frame_buffer.reset(4)
+    units = [b"xxunit0", b"xxu1", b"xxunit2-", b"xxfec"]
+    for index in (2, 0, 3):
+        assert frame_buffer.add(index, units[index])
+    assert not frame_buffer.add(4, b"invalid")
+    assert frame_buffer.missing_units(4) == [1]
+    assert not frame_buffer.is_complete(3)
+    frame_buffer.add(1, units[1])
+    assert frame_buffer.is_complete(3)
+    # Units are not copied.
+    assert frame_buffer.unit(2) is units[2]
+    frame = frame_buffer.assemble(3, b"HDR")
+    assert frame == b"HDRunit0u1unit2-"
+
+    # Unit larger than slot.
+    frame_buffer.reset(2)
+    frame_buffer.add(0, b"xxunit0")
+    frame_buffer.add(1, b"xxlarger unit")
+    assert frame_buffer.slot_size == 16
+    assert frame_buffer.assemble(2) == b"unit0larger unit"
+    # Frame is not changed when buffer is reused.
+    assert frame == b"HDRunit0u1unit2-"
+    assert frame_buffer.stats["frames"] == 2
+
+
+def test_frame_buffer_erasure_data():
+    """Test slots are zero padded and missing slots are zeroed."""
+    frame_buffer = FrameBuffer(16)
+    frame_buffer.reset(3)
+    frame_buffer.add(1, b"\xff" * 16)
+    frame_buffer.reset(3)
+    frame_buffer.add(0, b"unit0")
+    frame_buffer.add(2, b"unit2")
+    data = frame_buffer.erasure_data(3)
+    assert data == b"unit0".ljust(16, b"\x00") + bytes(16) + b"unit2".ljust(16, b"\x00")
+
+
+def test_fec_decode():
+    """Test missing src units are recovered from FEC units."""
+    pyjerasure = pytest.importorskip("pyjerasure")
+    units = [b"xxunit0", b"xxunit1", b"xxunit2"]
+    matrix = pyjerasure.Matrix("cauchy", 3, 1, 8)
+    size = FrameBuffer.align(max(map(len, units)))
+    encoded = pyjerasure.encode_from_bytes(
+        matrix, b"".join([unit.ljust(size, b"\x00") for unit in units]), size
+    )
+    fec_unit = encoded[size * 3 :]
+    frames, corrupt = [], []
+    stream = AVStream(
+        "video",
+        b"",
+        frames.append,
+        lambda start, end: corrupt.append((start, end)),
+        reorder_window=0,
+    )
+    for unit_index, unit in ((0, units[0]), (2, units[2]), (3, fec_unit)):
+        stream._handle_unit(unit_index, 1, unit_index, 3, 1, unit)
+    assert frames[0].endswith(b"unit0unit1unit2")
+    assert not corrupt
+    assert stream.stats["fec"]["recovered"] == 1
+
+
+class _PendingExecutor(Executor):
+    """Executor which leaves futures pending until resolved by test."""
+
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        self.calls.append((future, args))
+        return future
+
+
+def _fec_stream(executor: Executor, frames: list, corrupt: list) -> AVStream:
+    stream = AVStream(
+        "video",
+        b"",
+        lambda buf: frames.append(bytes(buf)),
+        lambda start, end: corrupt.append((start, end)),
+        fec_executor=executor,
+        reorder_window=0,
+    )
+    for unit_index, unit in ((0, b"xxunit0"), (2, b"xxunit2"), (3, b"xxfec")):
+        stream._handle_unit(unit_index, 1, unit_index, 3, 1, unit)
+    return stream
+
+
+def test_fec_async_recovery(monkeypatch):
+    """Test frame recovered in executor is delivered before next frame."""
+    monkeypatch.setattr(av, "pyjerasure", object())
+    executor = _PendingExecutor()
+    frames, corrupt = [], []
+    stream = _fec_stream(executor, frames, corrupt)
+    future, (src, fec, data, missing, size) = executor.calls[0]
+    assert (src, fec, missing) == (3, 1, [1])
+    assert len(data) == size * 4
+
+    # Next frame starts while recovery is pending.
+    stream._handle_unit(4, 2, 0, 2, 0, b"xxframe2")
+    assert not frames
+    units = (b"xxunit0", b"xxunit1", b"xxunit2")
+    future.set_result(b"".join(unit.ljust(size, b"\x00") for unit in units))
+    stream.poll_fec()
+    assert frames[0].endswith(b"unit0unit1unit2")
+    assert not corrupt
+    assert stream.stats["fec"]["recovered"] == 1
+    stream._handle_unit(5, 2, 1, 2, 0, b"xx")
+    assert frames[1].endswith(b"frame2")
+
+
+def test_fec_held_recovered_inline():
+    """Test held frame is recovered inline before next frame is delivered."""
+    executor = _PendingExecutor()
+    frames, corrupt = [], []
+    stream = AVStream(
+        "video",
+        b"",
+        frames.append,
+        lambda start, end: corrupt.append((start, end)),
+        fec_executor=executor,
+    )
+
+    def decode(frame_buffer, units_src, units_fec, missing):
+        return frame_buffer.add(1, b"xxunit1")
+
+    stream._fec.decode = decode
+    for unit_index, unit in ((0, b"xxunit0"), (3, b"xxfec")):
+        stream._handle_unit(unit_index, 1, unit_index, 3, 1, unit)
+    # Frame 1 is held when frame 2 starts.
+    stream._handle_unit(4, 2, 0, 2, 0, b"xxframe2")
+    assert not frames
+    # Late unit makes held frame recoverable.
+    stream._handle_unit(2, 1, 2, 3, 1, b"xxunit2")
+    assert len(frames) == 1
+    stream._handle_unit(5, 2, 1, 2, 0, b"xx")
+    assert frames[0].endswith(b"unit0unit1unit2")
+    assert frames[1].endswith(b"frame2")
+    assert not executor.calls
+    assert not corrupt
+
+
+def test_fec_recover_without_window(monkeypatch):
+    """Test frame is recovered as soon as enough units are received."""
+    monkeypatch.setattr(av, "pyjerasure", object())
+    executor = _PendingExecutor()
+    frames = []
+    stream = AVStream(
+        "video", b"", frames.append, lambda *args: None, fec_executor=executor
+    )
+    for unit_index, unit in ((0, b"xxunit0"), (2, b"xxunit2")):
+        stream._handle_unit(unit_index, 1, unit_index, 3, 1, unit)
+    assert not executor.calls
+    stream._handle_unit(3, 1, 3, 3, 1, b"xxfec")
+    # Recovery is not delayed by reorder window.
+    assert len(executor.calls) == 1
+
+
+def test_fec_late_discarded(monkeypatch):
+    """Test recovery finishing after next frame is discarded."""
+    monkeypatch.setattr(av, "pyjerasure", object())
+    executor = _PendingExecutor()
+    frames, corrupt = [], []
+    stream = _fec_stream(executor, frames, corrupt)
+    future = executor.calls[0][0]
+    stream._handle_unit(4, 2, 0, 1, 0, b"xxframe2")
+    assert len(frames) == 1 and frames[0].endswith(b"frame2")
+    assert corrupt == [(1, 2)]
+    assert future.cancelled()
+    assert stream.stats["fec"]["late"] == 1
+    stream.poll_fec()
+    assert len(frames) == 1
+
+    # Past deadline.
+    stream = _fec_stream(executor, frames, corrupt)
+    stream._fec_job.deadline = 0
+    stream.poll_fec()
+    assert corrupt[-1] == (1, 1)
+    assert stream.stats["fec"]["late"] == 1
+
+
+def test_reorder_window():
+    """Test reordered units complete frames and only lost units are reported."""
+    frames, corrupt = [], []
+    stream = AVStream(
+        "audio",
+        b"",
+        lambda buf: frames.append(bytes(buf)),
+        lambda start, end: corrupt.append((start, end)),
+        reorder_window=2,
+    )
+    # (index, frame_index, unit_index, units_src)
+    units = [
+        (0, 1, 0, 3),
+        (2, 1, 2, 3),
+        (1, 1, 1, 3),
+        (3, 2, 0, 2),
+        (5, 3, 0, 2),
+        (4, 2, 1, 2),
+        (6, 3, 1, 2),
+        (8, 5, 0, 1),
+        (9, 6, 0, 1),
+        (10, 7, 0, 1),
+        (11, 8, 0, 1),
+    ]
+    for index, frame_index, unit_index, src in units:
+        data = bytes([frame_index, unit_index])
+        stream._handle_unit(index, frame_index, unit_index, src, 0, data)
+    assert frames[:2] == [bytes([1, 0, 1, 1, 1, 2]), bytes([2, 0, 2, 1])]
+    assert len(frames) == 7
+    assert corrupt == [(4, 5)]
+    stats = stream.stats
+    assert stats["reordered"] == 2
+    assert stats["held"] == 1
+    assert stats["lost"] == stream.lost == 1
+
+    # Unit of finished frame is dropped.
+    stream._handle_unit(7, 4, 0, 1, 0, b"late")
+    assert len(frames) == 7
+    assert stream.stats["late"] == 1
+
+
+def test_corrupt_reporter():
+    """Test reports are merged, rate limited and dropped when stale."""
+    sent = []
+    rtt = [10.0]
+    reporter = CorruptReporter(lambda *args: sent.append(args), lambda: rtt[0])
+    assert reporter.interval == CorruptReporter.MAX_INTERVAL
+    reporter.report(3, 4)
+    assert sent == [(3, 4)]
+
+    reporter.report(6, 8)
+    reporter.report(5, 7)
+    reporter.complete(8)
+    assert sent == [(3, 4)]
+    assert reporter.stats["pending"]
+
+    # Frames completed by FEC before report is due.
+    reporter.complete(5)
+    reporter.complete(6)
+    reporter.complete(7)
+    assert not reporter.stats["pending"]
+
+    rtt[0] = 0
+    time.sleep(CorruptReporter.MIN_INTERVAL)
+    reporter.report(65535, 1)
+    reporter.report(0, 2)
+    assert sent == [(3, 4), (65535, 1)]
+    time.sleep(CorruptReporter.MIN_INTERVAL)
+    reporter.complete(1)
+    assert sent[-1] == (0, 2)
+    stats = reporter.stats
+    assert stats["reports"] == 5
+    assert stats["sent"] == 3
+    assert stats["suppressed"] == 2
+
+
+def test_corrupt_after_stop():
+    """Test corrupt reports do not fail after session stream is removed."""
+    session = SimpleNamespace(
+        type=TYPE_PS4,
+        is_stopped=True,
+        stream=None,
+        events=SimpleNamespace(emit=lambda *args: None),
+    )
+    handler = AVHandler(session)
+    assert handler._video_corrupt.interval == CorruptReporter.MAX_INTERVAL
+    handler._video_corrupt.report(1, 2)
+    handler._send_corrupt(1, 2)
+
+
+def test_congestion_loss_injection():
+    """Test congestion reports match packets dropped before reassembly."""
+    rand = random.Random(5)
+    reports = []
+    streams = [
+        AVStream(av_type, b"", lambda buf: None, lambda *args: None)
+        for av_type in ("video", "audio")
+    ]
+
+    def counters():
+        return (
+            sum(stream.received for stream in streams),
+            sum(stream.lost for stream in streams),
+        )
+
+    reporter = CongestionReporter(lambda *args: reports.append(args), counters)
+    dropped = delivered = 0
+    for index in range(1000):
+        frame_index, unit_index = divmod(index, 5)
+        for stream in streams:
+            # Keep trailing packets so losses leave the reorder window.
+            if index < 990 and rand.random() < 0.05:
+                dropped += 1
+                continue
+            delivered += 1
+            stream._handle_unit(
+                index & 0xFFFF, frame_index, unit_index, 4, 1, b"xxunit"
+            )
+        if index % 100 == 99:
+            reporter.report()
+    assert len(reports) == 10
+    assert sum(received for received, _ in reports) == delivered
+    assert sum(lost for _, lost in reports) == dropped
+    assert reporter.stats["lost"] == dropped
+
+
+def test_congestion_schedule():
+    """Test reports are sent from event loop at interval."""
+    reports = []
+    counts = [0, 0]
+    reporter = CongestionReporter(
+        lambda *args: reports.append(args), lambda: tuple(counts), 0.01
+    )
+    loop = asyncio.new_event_loop()
+    try:
+        reporter.start(loop)
+        counts[:] = [5, 1]
+        loop.run_until_complete(asyncio.sleep(0.05))
+        reporter.stop()
+        count = len(reports)
+        loop.run_until_complete(asyncio.sleep(0.03))
+    finally:
+        loop.close()
+    assert count >= 2
+    assert len(reports) == count
+    assert reports[0] == (5, 1)
+    assert sum(lost for _, lost in reports) == 1
+
+
+def test_video_header_priming():
+    """Test video header is only sent when decoder needs priming."""
+    frames = []
+    corrupt = []
+
+    def on_corrupt(start: int, end: int):
+        corrupt.append((start, end))
+
+    stream = AVStream(
+        "video",
+        b"HDR0",
+        lambda buf: frames.append(bytes(buf)),
+        on_corrupt,
+        adaptive_headers=[b"HDR0", b"HEADER1"],
+    )
+    padding = bytes(FFMPEG_PADDING)
+    index = 0
+    for frame_index, adaptive in ((1, 0), (2, 0), (4, 0), (5, 0), (6, 1)):
+        msg = _video_packet(index, 0, 1, 0, frame_index, adaptive)
+        stream.handle(Packet.parse(msg))
+        index += 1
+    data = bytes([0]) * 41
+    assert frames[0].startswith(b"HDR0" + padding)
+    assert len(frames[1]) == len(data)
+    assert corrupt == [(3, 4)]
+    assert frames[2].startswith(b"HDR0" + padding)
+    assert len(frames[3]) == len(data)
+    assert frames[4].startswith(b"HEADER1" + padding)
+    assert stream.stats["primes"] == 3
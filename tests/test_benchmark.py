@@ -0,0 +1,206 @@
+"""Benchmarks for hot paths.
+
+Skipped unless PYREMOTEPLAY_BENCHMARK is set. Results are logged; run with
+`PYREMOTEPLAY_BENCHMARK=1 pytest --log-cli-level=INFO tests/test_benchmark.py`.
+"""
+import logging
+import os
+import time
+import tracemalloc
+from struct import pack_into
+
+import pytest
+from Cryptodome.Cipher import AES
+
+from pyremoteplay import crypt
+from pyremoteplay.av import AVStream, FrameBuffer
+from pyremoteplay.const import FFMPEG_PADDING
+from pyremoteplay.stream_packets import Header, Packet, parse_av_batch
+
+_LOGGER = logging.getLogger(__name__)
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get("PYREMOTEPLAY_BENCHMARK"),
+    reason="Benchmarks run only if PYREMOTEPLAY_BENCHMARK is set",
+)
+
+KEY = bytes(range(16))
+IV = bytes(range(16, 32))
+DURATION = 0.25
+# Allowed slowdown against legacy path for timing noise.
+TOLERANCE = 0.9
+
+
+def _rate(func, size: int) -> float:
+    """Return MB/s of func called repeatedly for DURATION."""
+    count = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < DURATION:
+        func(count)
+        count += 1
+    return count * size / elapsed / 1e6
+
+
+def _best_rate(func, size: int, repeat: int = 3) -> float:
+    """Return best MB/s of repeated runs."""
+    return max(_rate(func, size) for _ in range(repeat))
+
+
+def _allocated(func, count: int = 256) -> float:
+    """Return mean peak bytes allocated by a call of func."""
+    total = 0
+    for index in range(count):
+        tracemalloc.start()
+        func(index)
+        total += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return total / count
+
+
+def _legacy_key_stream(key_pos: int) -> bytes:
+    """Per block counter generation with a new cipher per call."""
+    buf = bytearray(crypt.BaseCipher.KEYSTREAM_LEN)
+    block_offset = (key_pos // 16) + 1
+    stop = block_offset + len(buf) // 16
+    for current, block in enumerate(range(block_offset, stop)):
+        pack_into("!16s", buf, current * 16, crypt.counter_add(block, IV))
+    return AES.new(KEY, AES.MODE_ECB).encrypt(buf)
+
+
+def test_keystream_throughput():
+    """Benchmark key stream generation."""
+    size = crypt.BaseCipher.KEYSTREAM_LEN
+    assert _legacy_key_stream(size) == crypt.get_key_stream(KEY, IV, size, size)
+    legacy = _rate(lambda index: _legacy_key_stream(index * size), size)
+    _LOGGER.info("Keystream legacy: %.1f MB/s", legacy)
+    for backend in crypt.KEYSTREAM_BACKENDS:
+        crypt.set_keystream_backend(backend)
+        rate = _rate(
+            lambda index: crypt.get_key_stream(KEY, IV, index * size, size), size
+        )
+        _LOGGER.info("Keystream %s: %.1f MB/s", backend, rate)
+    crypt.set_keystream_backend(crypt.KEYSTREAM_BACKEND_CRYPTODOME)
+
+
+def _av_packet(index: int, key_pos: int, size: int = 1400) -> bytes:
+    """Return video packet with src units only."""
+    buf = bytearray(size)
+    dword2 = ((index & 0x7FF) << 21) | (0x7FF << 10)
+    pack_into("!BHHIBxxxxI", buf, 0, Header.Type.VIDEO, index, 0, dword2, 0, key_pos)
+    return bytes(buf)
+
+
+def test_av_decrypt_throughput():
+    """Benchmark AV packet parse and decrypt."""
+    cipher = crypt.StreamCipher(KEY, IV)
+    decryptor = cipher.new_decryptor()
+    audio_decryptor = cipher.new_decryptor(keystream_window=0)
+    size = 1400
+    msgs = [_av_packet(index, index * size) for index in range(512)]
+
+    def legacy(index: int):
+        msg = msgs[index % len(msgs)]
+        packet = Packet.parse(bytearray(msg))
+        cipher.decrypt(bytes(packet.data), packet.key_pos)
+
+    def current(index: int):
+        packet = Packet.parse(msgs[index % len(msgs)])
+        packet.decrypt(decryptor)
+
+    packet = Packet.parse(msgs[1])
+    expected = cipher.decrypt(bytes(packet.data), packet.key_pos)
+    packet.decrypt(decryptor)
+    assert bytes(packet.data) == expected
+
+    def range_only(index: int):
+        packet = Packet.parse(msgs[index % len(msgs)])
+        packet.decrypt(audio_decryptor)
+
+    _LOGGER.info("AV decrypt legacy: %.1f MB/s", _rate(legacy, size))
+    _LOGGER.info("AV decrypt: %.1f MB/s", _rate(current, size))
+    _LOGGER.info("AV decrypt range only: %.1f MB/s", _rate(range_only, size))
+    _LOGGER.info("AV decrypt legacy allocated: %.0f B/packet", _allocated(legacy))
+    _LOGGER.info("AV decrypt allocated: %.0f B/packet", _allocated(current))
+
+
+def test_av_parse_rate():
+    """Benchmark AV packet parsing in packets per second."""
+    msgs = [_av_packet(index, index * 1400) for index in range(512)]
+    packet = Packet.parse(msgs[5])
+    assert packet.unit_index == 5
+    assert packet.frame_length_src == 2048
+    assert packet.frame_meta["units"]["total"] == 2048
+    rate = _rate(lambda index: Packet.parse(msgs[index % len(msgs)]), 1)
+    _LOGGER.info("AV parse: %.0f packets/s", rate * 1e6)
+
+
+def test_av_batch_parse_rate():
+    """Benchmark batch AV header parsing in packets per second."""
+    pytest.importorskip("numpy")
+    batch = 64
+    msgs = [_av_packet(index, index * 1400) for index in range(batch)]
+    headers = parse_av_batch(msgs)
+    assert headers["unit_index"].tolist() == list(range(batch))
+    rate = _rate(lambda index: parse_av_batch(msgs), batch)
+    _LOGGER.info("AV batch parse: %.0f packets/s", rate * 1e6)
+
+
+def test_frame_reassembly_throughput():
+    """Benchmark video frame reassembly at 1080p/60 sized frames."""
+    header = bytes(64)
+    padded = header + bytes(FFMPEG_PADDING)
+    # About 15 Mbps at 60 fps.
+    units = [bytes([index]) * 1400 for index in range(23)]
+    count = len(units)
+
+    def legacy(_):
+        packets = []
+        for unit in units:
+            packets.append(unit)
+        return padded + b"".join([packet[2:] for packet in packets])
+
+    frame_buffer = FrameBuffer(1454, AVStream.VIDEO_UNIT_SKIP)
+
+    def buffered(_):
+        frame_buffer.reset(count)
+        for unit_index, unit in enumerate(units):
+            frame_buffer.add(unit_index, unit)
+        return frame_buffer.assemble(count, padded)
+
+    def legacy_join(_):
+        return padded + b"".join([unit[2:] for unit in units])
+
+    def assemble(_):
+        return frame_buffer.assemble(count, padded)
+
+    frames = []
+    stream = AVStream(
+        "video", header, lambda buf: frames.append(bytes(buf)), lambda *args: None
+    )
+
+    def handle(index: int):
+        frame_index = (index + 1) & 0xFFFF
+        for unit_index, unit in enumerate(units):
+            packet_index = (index * count + unit_index) & 0xFFFF
+            stream._handle_unit(packet_index, frame_index, unit_index, count, 0, unit)
+
+    assert bytes(buffered(0)) == legacy(0)
+    handle(0)
+    # Header is only sent with first frame.
+    handle(1)
+    assert bytes(frames[0]) == legacy(0)
+    assert bytes(frames[1]) == legacy(0)[len(padded) :]
+    size = len(legacy(0))
+    _LOGGER.info("Reassembly legacy: %.1f MB/s", _rate(legacy, size))
+    _LOGGER.info("Reassembly frame buffer: %.1f MB/s", _rate(buffered, size))
+    join_rate = _best_rate(legacy_join, size)
+    assemble_rate = _best_rate(assemble, size)
+    _LOGGER.info("Frame legacy join: %.1f MB/s", join_rate)
+    _LOGGER.info("Frame assemble: %.1f MB/s", assemble_rate)
+    _LOGGER.info("AVStream frames: %.0f frames/s", _rate(handle, 1) * 1e6)
+    stats = stream.stats
+    allocations = stats["allocations"]
+    _LOGGER.info(
+        "Frame buffer allocations: %s / %s frames", allocations, stats["frames"]
+    )
+    assert assemble_rate >= join_rate * TOLERANCE
@@ -1,5 +1,7 @@
 # fmt: off
 """Tests for crypt.py."""
+import time
+
 from pyremoteplay import crypt
 
 HANDSHAKE_KEY = bytes([
@@ -193,10 +195,6 @@ def test_encrypt_decrypt():
     local = stream._local_cipher
     remote = stream._remote_cipher
     local._base_index = remote._base_index = 42
-    local.keystreams = []
-    local.keystream_index = 0
-    remote.keystreams = []
-    remote.keystream_index = 0
     local._init_cipher()
     remote._init_cipher()
     assert local.base_key == key
@@ -231,4 +229,139 @@ def test_encrypt():
     mock_enc = local_cipher.encrypt(payload)
     assert mock_enc == payload_enc
 
+
+def test_gen_iv_stream():
+    """Test bulk IV stream matches per block counter."""
+    ivs = [
+        bytes(range(16)),
+        bytes([0xff] * 8) + bytes(range(8)),  # Low qword wraps
+        bytes([0xff] * 16),  # Full counter wraps
+    ]
+    for iv in ivs:
+        for key_pos in (0, 0x10, 0x1000, 0x123450):
+            buf = bytearray(0x100)
+            crypt.gen_iv_stream(buf, iv, key_pos)
+            for block in range(len(buf) // 16):
+                expected = crypt.counter_add(key_pos // 16 + 1 + block, iv)
+                assert buf[block * 16 : (block + 1) * 16] == expected
+
+
+def test_keystream_backends():
+    """Test key streams are the same for all backends."""
+    key = bytes(range(16))
+    iv = bytes(range(16, 32))
+    streams = []
+    for backend in crypt.KEYSTREAM_BACKENDS:
+        crypt.set_keystream_backend(backend)
+        streams.append(crypt.get_key_stream(key, iv, 5, 1000))
+    crypt.set_keystream_backend(crypt.KEYSTREAM_BACKEND_CRYPTODOME)
+    assert len(streams[0]) == 1000
+    assert all(stream == streams[0] for stream in streams)
+
 # fmt: on
+
+
+def test_key_stream_window():
+    """Test key stream window matches direct key stream."""
+    remote = crypt.RemoteCipher(HANDSHAKE_KEY, SECRET, keystream_window=0x4000)
+    key, iv = remote.base_key, remote.base_iv
+    positions = [
+        (0, 100),
+        (0xFF0, 0x20),
+        (0x3FF0, 0x800),  # Slides window
+        (0x3000, 0x10),  # Behind key pos
+        (0x100000, 1400),  # Jumps ahead
+        (0x80000, 1400),  # Before window
+        (0x100570, 0x2000),  # Larger than window allows
+    ]
+    for key_pos, length in positions:
+        expected = crypt.get_key_stream(key, iv, key_pos, length)
+        assert bytes(remote.get_key_stream(key_pos, length)) == expected
+
+
+def test_decryptor_key_stream():
+    """Test decryptor key stream window."""
+    stream = crypt.StreamCipher(HANDSHAKE_KEY, SECRET)
+    assert len(stream._remote_cipher._keystream) == 0
+    assert len(stream.new_decryptor()._keystream) == crypt.BaseCipher.KEYSTREAM_WINDOW
+    stream = crypt.StreamCipher(HANDSHAKE_KEY, SECRET, keystream_window=0x4000)
+    assert len(stream.new_decryptor()._keystream) == 0x4000
+
+    # Only generates key stream for requested ranges.
+    decryptor = stream.new_decryptor(keystream_window=0)
+    key, iv = decryptor.base_key, decryptor.base_iv
+    assert len(decryptor._keystream) == 0
+    for key_pos, length in ((0, 100), (0x100000, 1400), (0x80005, 1400)):
+        expected = crypt.get_key_stream(key, iv, key_pos, length)
+        assert bytes(decryptor.get_key_stream(key_pos, length)) == expected
+
+
+def test_key_stream_encryptor_not_shared():
+    """Test ciphers with the same key do not share an AES context."""
+    for backend in crypt.KEYSTREAM_BACKENDS:
+        crypt.set_keystream_backend(backend)
+        first = crypt.RemoteCipher(HANDSHAKE_KEY, SECRET)
+        second = crypt.RemoteCipher(HANDSHAKE_KEY, SECRET)
+        assert first._ecb_encrypt is not second._ecb_encrypt
+        assert bytes(first.get_key_stream(16, 64)) == bytes(
+            second.get_key_stream(16, 64)
+        )
+    crypt.set_keystream_backend(crypt.KEYSTREAM_BACKEND_CRYPTODOME)
+
+
+def test_gmac_key_cache():
+    """Test GMAC keys for older key positions are cached."""
+    data = bytes(range(32))
+    key_pos = crypt.GMAC_REFRESH_KEY_POS + 16
+    remote = crypt.RemoteCipher(HANDSHAKE_KEY, SECRET)
+    expected = crypt.RemoteCipher(HANDSHAKE_KEY, SECRET).get_gmac(data, key_pos)
+
+    remote.get_gmac(data, crypt.GMAC_REFRESH_KEY_POS * 2 + 16)
+    assert remote.get_gmac(data, key_pos) == expected
+    assert remote.get_gmac(data, key_pos) == expected
+    stats = remote.stats
+    assert stats["misses"] == 2
+    assert stats["hits"] == 1
+
+    base_pos = crypt.GMAC_REFRESH_KEY_POS * 2
+    remote.get_gmac(data, base_pos + crypt.GMAC_PRECOMPUTE_KEY_POS + 1)
+    assert remote.stats["precomputed"] == 1
+    remote.get_gmac(data, base_pos + crypt.GMAC_REFRESH_KEY_POS + 16)
+    assert remote.stats["misses"] == 2
+
+
+def test_ecdh_pool():
+    """Test ECDH keys are taken from pool and pool is refilled."""
+    pool = crypt.ECDHKeyPool(size=2)
+    pool.fill()
+    deadline = time.perf_counter() + 5
+    while pool.stats["ready"] < 2:
+        assert time.perf_counter() < deadline
+        time.sleep(0.01)
+    keys = pool.get()
+    handshake_key, local_ec, _, public_key, public_sig = keys
+    assert public_key == crypt.StreamECDH.set_public_key(local_ec)
+    assert public_sig == crypt.StreamECDH.get_key_sig(handshake_key, public_key)
+    assert pool.get() != keys
+    stats = pool.stats
+    assert stats["hits"] == 2
+    assert stats["misses"] == 0
+
+
+def test_ecdh_pool_error(monkeypatch):
+    """Test pool can refill after key generation fails."""
+    pool = crypt.ECDHKeyPool(size=1)
+
+    def generate_keys():
+        raise ValueError("Failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(crypt.StreamECDH, "generate_keys", generate_keys)
+        pool._filling = True
+        pool._fill()
+    assert not pool._filling
+    pool.fill()
+    deadline = time.perf_counter() + 5
+    while pool.stats["ready"] < 1:
+        assert time.perf_counter() < deadline
+        time.sleep(0.01)
@@ -0,0 +1,413 @@
+"""Tests for pyremoteplay/stream.py."""
+import asyncio
+import socket
+import threading
+import time
+from struct import pack_into
+from types import SimpleNamespace
+
+from pyremoteplay.const import TYPE_PS4
+from pyremoteplay.crypt import StreamCipher
+from pyremoteplay.stream import (
+    ControlWorker,
+    GMACVerifier,
+    RetransmitQueue,
+    RPStream,
+    StreamTest,
+)
+from pyremoteplay.stream import DEFAULT_MTU, DEFAULT_RTT, UDP_IPV4_SIZE
+from pyremoteplay.stream_packets import Chunk, Header, Packet
+
+HANDSHAKE_KEY = bytes(range(16))
+SECRET = bytes(range(32))
+
+
+def _signed_packet(cipher: StreamCipher, key_pos: int) -> bytearray:
+    """Return control packet signed with remote cipher."""
+    msg = Packet(Header.Type.CONTROL, Chunk.Type.DATA_ACK, tag_remote=1, tsn=2)
+    buf = bytearray(msg.bytes())
+    gmac = cipher._remote_cipher.get_gmac(bytes(buf), key_pos)
+    pack_into("!4sI", buf, 5, gmac, key_pos)
+    return buf
+
+
+def test_gmac_verify():
+    """Test verifying GMAC of raw packet."""
+    cipher = StreamCipher(HANDSHAKE_KEY, SECRET)
+    verifier = GMACVerifier(cipher)
+    buf = _signed_packet(cipher, 32)
+    assert verifier.verify(bytes(buf))
+    buf[-1] ^= 0xFF
+    assert not verifier.verify(bytes(buf))
+
+
+def test_gmac_verify_drop():
+    """Test only verified packets are passed with drop policy."""
+    cipher = StreamCipher(HANDSHAKE_KEY, SECRET)
+    verifier = GMACVerifier(cipher, GMACVerifier.POLICY_DROP)
+    valid = bytes(_signed_packet(cipher, 16))
+    invalid = bytearray(valid)
+    invalid[6] ^= 0xFF
+    received = []
+    verifier.start()
+    verifier.submit(valid, received.append)
+    verifier.submit(bytes(invalid), received.append)
+    worker = verifier._worker
+    verifier.stop()
+    worker.join(1)
+    assert received == [valid]
+    assert verifier.stats["verified"] == 1
+    assert verifier.stats["failed"] == 1
+
+
+def test_verified_control_ordered():
+    """Test verified control packets are handled by control worker."""
+    session = SimpleNamespace(host="127.0.0.1", loop=None, type=TYPE_PS4)
+    stream = RPStream(session, threading.Event())
+    submitted = []
+    stream._control = SimpleNamespace(submit=submitted.append)
+    msg = Packet(Header.Type.CONTROL, Chunk.Type.DATA_ACK, tsn=1).bytes()
+    stream._handle_verified(msg)
+    assert submitted == [msg]
+
+
+def test_ingest_thread():
+    """Test ingest thread queues AV and passes control packets to loop."""
+    loop = asyncio.new_event_loop()
+    session = SimpleNamespace(host="127.0.0.1", loop=loop, type=TYPE_PS4)
+    stream = RPStream(session, threading.Event(), ingest_thread=True)
+    stream._av_handler._receiver = object()
+    control = []
+    done = loop.create_future()
+
+    def handle(msg):
+        control.append((msg, threading.current_thread()))
+        done.set_result(True)
+
+    stream.handle = handle
+    loop.run_until_complete(stream.async_connect())
+    port = stream._protocol.getsockname()[1]
+    av_msg = bytearray(32)
+    pack_into("!BHHIBxxxxI", av_msg, 0, Header.Type.VIDEO, 0, 0, 0, 0, 0)
+    control_msg = Packet(Header.Type.CONTROL, Chunk.Type.INIT, tag=1, tsn=1).bytes()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    # Stray empty datagram does not stop thread.
+    sender.sendto(b"", ("127.0.0.1", port))
+    sender.sendto(bytes(av_msg), ("127.0.0.1", port))
+    sender.sendto(control_msg, ("127.0.0.1", port))
+    loop.run_until_complete(asyncio.wait_for(done, 2))
+    assert control == [(control_msg, threading.main_thread())]
+    assert stream._av_handler.stats["video"]["queue"]["depth"] == 1
+    stream.stop_event.set()
+    stream._wake_ingest()
+    stream._worker.join(2)
+    assert not stream._worker.is_alive()
+    sender.close()
+    loop.close()
+
+
+def test_retransmit_sack():
+    """Test chunks reported missing by SACK are resent and acked chunks removed."""
+    sent = []
+    queue = RetransmitQueue(sent.append, rtt=0)
+    for tsn in range(1, 5):
+        queue.add(tsn, bytes([tsn]))
+    assert sent == [b"\x01", b"\x02", b"\x03", b"\x04"]
+
+    # TSN 2 is missing.
+    queue.ack(1, gap_ack_blocks=[(2, 2)], dup_tsns=[1])
+    assert sent[4:] == [b"\x02"]
+    stats = queue.stats
+    assert stats["acked"] == 2
+    assert stats["outstanding"] == 2
+    assert stats["fast_retransmits"] == 1
+    assert stats["duplicates"] == 1
+
+    queue.ack(4)
+    stats = queue.stats
+    assert stats["outstanding"] == stats["outstanding_bytes"] == 0
+    assert stats["acked"] == 4
+
+
+def test_retransmit_timeout():
+    """Test chunks are resent after timeout and held while window is full."""
+    sent = []
+    queue = RetransmitQueue(sent.append, rtt=0, window=4)
+    queue.add(0xFFFFFFFF, b"abc")
+    queue.add(0, b"def")
+    assert sent == [b"abc"]
+    assert queue.stats["backlog"] == 1
+
+    queue.poll()
+    assert len(sent) == 1
+    time.sleep(RetransmitQueue.MIN_RTO)
+    queue.poll()
+    assert sent == [b"abc", b"abc"]
+    assert queue.stats["retransmits"] == 1
+
+    # Ack across TSN wrap releases held chunk.
+    queue.ack(0xFFFFFFFF)
+    assert sent[-1] == b"def"
+    queue.ack(0)
+    assert queue.stats["outstanding"] == 0
+
+    queue.add(1, b"ghi")
+    queue._chunks[1][2] = RetransmitQueue.MAX_RETRIES
+    queue._chunks[1][1] = 0
+    queue.poll()
+    assert queue.stats["abandoned"] == 1
+    assert queue.stats["outstanding_bytes"] == 0
+
+
+def test_retransmit_init_untracked():
+    """Test BIG is tracked and chunks which reuse its TSN are not tracked."""
+    session = SimpleNamespace(host="127.0.0.1", loop=None, type=TYPE_PS4)
+    stream = RPStream(session, threading.Event())
+    sent = []
+    stream.send = sent.append
+    stream._retransmit = RetransmitQueue(sent.append)
+    stream._state = RPStream.STATE_INIT
+    stream._big_payload = b"big"
+    stream._send_big()
+    assert list(stream._retransmit._chunks) == [stream.tsn]
+
+    stream._cipher = StreamCipher(HANDSHAKE_KEY, SECRET)
+    stream.send_data(b"\x01", 1, 1)
+    stream.send_data(b"\x02", 1, 1)
+    assert len(sent) == 3
+    assert stream._retransmit.stats["outstanding"] == 1
+
+    stream._state = RPStream.STATE_READY
+    stream.send_data(b"\x03", 1, 1)
+    stream.send_data(b"\x04", 1, 1)
+    assert len(sent) == 5
+    assert stream._retransmit.stats["outstanding"] == 3
+    assert stream._retransmit._chunks[1][0] == sent[0]
+
+
+def test_control_worker():
+    """Test control packets are handled in order and acks are handled inline."""
+    handled = []
+    done = threading.Event()
+
+    def handle(msg: bytes):
+        params = Packet.parse(msg).params
+        handled.append((params["tsn"], threading.current_thread().name))
+        if params["tsn"] == 9:
+            done.set()
+
+    worker = ControlWorker(handle, maxsize=16)
+    worker.start()
+    for tsn in range(10):
+        msg = Packet(
+            Header.Type.CONTROL, Chunk.Type.DATA, tsn=tsn, channel=1, data=b"x"
+        )
+        worker.submit(msg.bytes())
+    ack = Packet(Header.Type.CONTROL, Chunk.Type.DATA_ACK, tsn=100)
+    worker.submit(ack.bytes())
+    assert done.wait(2)
+    worker.stop()
+    deadline = time.perf_counter() + 2
+    while worker.stats["latency"]["DATA"]["count"] < 10:
+        assert time.perf_counter() < deadline
+        time.sleep(0.01)
+    assert (100, threading.current_thread().name) in handled
+    data = [(tsn, name) for tsn, name in handled if tsn != 100]
+    assert [tsn for tsn, _ in data] == list(range(10))
+    assert {name for _, name in data} == {"Stream Control"}
+    stats = worker.stats
+    assert stats["queued"] == 10
+    assert stats["inline"] == 1
+    assert stats["latency"]["DATA"]["count"] == 10
+    assert stats["latency"]["DATA_ACK"]["max"] >= 0
+
+
+def test_control_worker_stop_full():
+    """Test stopping control worker does not block if queue is full."""
+    release = threading.Event()
+    handled = []
+
+    def handle(msg: bytes):
+        release.wait(2)
+        handled.append(msg)
+
+    worker = ControlWorker(handle, maxsize=2)
+    worker.start()
+    thread = worker._worker
+    msg = Packet(Header.Type.CONTROL, Chunk.Type.DATA, tsn=1, channel=1, data=b"x")
+    for _ in range(4):
+        worker.submit(msg.bytes())
+    assert worker.stats["dropped"] >= 1
+    worker.stop()
+    release.set()
+    thread.join(2)
+    assert not thread.is_alive()
+    assert len(handled) <= 1
+
+
+class _TestStream:
+    """Stream which records test packets."""
+
+    def __init__(self):
+        self.tsn = 0
+        self.rtt = DEFAULT_RTT
+        self.mtu = DEFAULT_MTU
+        self.sent = []
+        self.data = []
+        self.callback = None
+        self.stopped = False
+        self.timers = []
+        loop = SimpleNamespace(call_later=self._call_later)
+        self._session = SimpleNamespace(loop=loop)
+
+    def _call_later(self, delay, callback):
+        handle = SimpleNamespace(callback=callback)
+        handle.cancel = lambda: handle in self.timers and self.timers.remove(handle)
+        self.timers.append(handle)
+        return handle
+
+    def fire(self):
+        """Call oldest timer."""
+        self.timers.pop(0).callback()
+
+    def advance_sequence(self):
+        self.tsn += 1
+
+    def wait_for_ack(self, tsn, callback):
+        self.callback = callback
+
+    def send_data(self, data, *args):
+        self.data.append(data)
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+    def stop(self):
+        self.stopped = True
+
+
+def test_stream_test_pipelined():
+    """Test pings are pipelined and MTU is found with parallel probes."""
+    stream = _TestStream()
+    test = StreamTest(stream)
+    test.run_rtt()
+    stream.callback()
+    assert len(stream.sent) == StreamTest.PING_WINDOW
+    while not test._rtt_done:
+        test.recv_rtt(stream.sent[len(test._samples)])
+    assert test.stats["pings"] == StreamTest.MIN_PINGS
+    assert len(stream.timers) == 0
+
+    path_mtu = 1200
+    stream.callback()
+    while not stream.stopped:
+        probes = sorted(test._probes)
+        assert len(probes) == StreamTest.MTU_PROBES
+        for mtu in probes:
+            if mtu <= path_mtu:
+                test.recv_mtu(bytes(mtu - UDP_IPV4_SIZE))
+            test.recv_mtu_in(mtu, mtu)
+    assert path_mtu - StreamTest.MTU_RESOLUTION <= stream.mtu <= path_mtu
+    assert stream.rtt < 1
+    assert test.stats["mtu_rounds"] <= StreamTest.MTU_MAX_ROUNDS
+
+
+def test_stream_test_echo_matched():
+    """Test echoes are matched to their own ping and late echoes are ignored."""
+    stream = _TestStream()
+    test = StreamTest(stream)
+    test.run_rtt()
+    stream.callback()
+    pings = list(stream.sent)
+    assert len({ping[5:7] for ping in pings}) == len(pings)
+
+    # Echo for first ping is lost.
+    test._pings[1] -= 0.05
+    test.recv_rtt(pings[1])
+    assert 0 in test._pings and 1 not in test._pings
+    assert test._samples[0] >= 0.05
+
+    # Echo arrives after ping timed out.
+    test._pings[0] -= StreamTest.PING_TIMEOUT
+    test.recv_rtt(pings[0])
+    assert len(test._samples) == 1
+    assert test.stats["lost"] == 1
+
+
+def test_stream_test_timeout():
+    """Test lost pings are replaced and missing MTU responses use default."""
+    stream = _TestStream()
+    test = StreamTest(stream)
+    test.run_rtt()
+    stream.callback()
+    for index in range(StreamTest.PING_WINDOW):
+        test._pings[index] -= StreamTest.PING_TIMEOUT
+    stream.fire()
+    assert test.stats["lost"] == StreamTest.PING_WINDOW
+    assert len(stream.sent) == StreamTest.PING_WINDOW * 2
+    test._finish_rtt()
+    stream.callback()
+    for _ in range(StreamTest.MTU_MAX_ROUNDS):
+        stream.fire()
+    assert stream.stopped
+    assert stream.mtu == DEFAULT_MTU
+
+
+def test_stream_test_known_mtu():
+    """Test known MTU is verified and sizes above it are probed."""
+    stream = _TestStream()
+    stream.mtu = 1200
+    test = StreamTest(stream)
+    test._finish_rtt()
+    stream.callback()
+    assert 1200 in test._probes
+    assert max(test._probes) == DEFAULT_MTU
+    path_mtu = 1400
+    while not stream.stopped:
+        for mtu in sorted(test._probes):
+            if mtu <= path_mtu:
+                test.recv_mtu(bytes(mtu - UDP_IPV4_SIZE))
+            test.recv_mtu_in(mtu, mtu)
+    assert path_mtu - StreamTest.MTU_RESOLUTION <= stream.mtu <= path_mtu
+
+
+def test_stream_test_verify():
+    """Test known results are verified with a single ping and probe."""
+    stream = _TestStream()
+    stream.mtu = 1200
+    stream.rtt = 0.02
+    test = StreamTest(stream, verify=True)
+    test.run_rtt()
+    stream.callback()
+    assert len(stream.sent) == 1
+    test.recv_rtt(stream.sent[0])
+    assert test._rtt_done
+    stream.callback()
+    assert test._probes == {1200}
+    test.recv_mtu(bytes(1200 - UDP_IPV4_SIZE))
+    test.recv_mtu_in(1200, 1200)
+    assert stream.stopped
+    assert test.complete
+    assert stream.mtu == 1200
+    assert stream.rtt == 0.02
+    assert test.stats["mtu_rounds"] == 1
+
+
+def test_stream_test_verify_failed():
+    """Test full MTU test is run if known MTU is not verified."""
+    stream = _TestStream()
+    stream.mtu = 1400
+    test = StreamTest(stream, verify=True)
+    test._finish_rtt()
+    stream.callback()
+    assert test._probes == {1400}
+    test.recv_mtu_in(1400, 1400)
+    assert len(test._probes) == StreamTest.MTU_PROBES
+    assert max(test._probes) == DEFAULT_MTU
+    path_mtu = 1300
+    while not stream.stopped:
+        for mtu in sorted(test._probes):
+            if mtu <= path_mtu:
+                test.recv_mtu(bytes(mtu - UDP_IPV4_SIZE))
+            test.recv_mtu_in(mtu, mtu)
+    assert path_mtu - StreamTest.MTU_RESOLUTION <= stream.mtu <= path_mtu
@@ -1,5 +1,10 @@
 """Tests for pyremoteplay/stream_packets.py."""
-from pyremoteplay.stream_packets import Chunk, Header, Packet
+from struct import pack_into
+
+import pytest
+
+from pyremoteplay.const import TYPE_PS4, TYPE_PS5
+from pyremoteplay.stream_packets import Chunk, Header, Packet, parse_av_batch
 
 # fmt: off
 def test_init():
@@ -137,6 +142,24 @@ def test_parse_data_ack():
     assert params["a_rwnd"] == A_RWND
     assert params["gap_ack_blocks_count"] == 0
     assert params["dup_tsns_count"] == 0
+    assert params["gap_ack_blocks"] == []
+    assert params["dup_tsns"] == []
+
+
+def test_parse_data_ack_blocks():
+    """Test parsing gap ack blocks and duplicate TSNs of data ack packet."""
+    msg = Packet(
+        Header.Type.CONTROL,
+        Chunk.Type.DATA_ACK,
+        tsn=10,
+        gap_ack_blocks_count=2,
+        dup_tsns_count=1,
+    )
+    buf = msg.bytes() + bytes([0, 2, 0, 3, 0, 5, 0, 5, 0, 0, 0, 9])
+    params = Packet.parse(buf).params
+    assert params["tsn"] == 10
+    assert params["gap_ack_blocks"] == [(2, 3), (5, 5)]
+    assert params["dup_tsns"] == [9]
 
 def test_parse_video():
     """Test Video Parsing."""
@@ -153,4 +176,32 @@ def test_parse_video():
     assert mock_packet.frame_length_fec == 1
 
 
+@pytest.mark.parametrize("host_type", [TYPE_PS4, TYPE_PS5])
+def test_parse_av_batch(host_type):
+    """Test batch parsing matches AVPacket."""
+    pytest.importorskip("numpy")
+    AV_DATA = b"\x12\x00\x01\x00\x01\x00 \x08\x01\x06x\x9c\xef\xe8\x00\x00\x10\xc0\x00<\x00\x00\x00\x05!6F\xd2D\xe7\'<\x7f\xca\xfe\xcf\x8ft\xb5\xb9*\xdfm\xd7\x97\r\x8b\xac\xcee\x05\r\xf8r]Kg\xdf\xde\xda\xd2aT\xf5\xb0"
+    audio = bytearray(64)
+    dword2 = (4 << 24) | (5 << 16) | (0x12 << 8) | (1 << 4) | 4
+    pack_into("!BHHIBxxxxI", audio, 0, Header.Type.AUDIO, 7, 3, dword2, 0, 1000)
+    msgs = [AV_DATA, bytes(audio)]
+    headers = parse_av_batch(msgs, host_type)
+    assert len(headers) == len(msgs)
+    for header, msg in zip(headers, msgs):
+        packet = Packet.parse(msg, {"host_type": host_type})
+        assert header["type"] == packet.type
+        assert header["has_nalu"] == packet.has_nalu
+        assert header["index"] == packet.index
+        assert header["frame_index"] == packet.frame_index
+        assert header["unit_index"] == packet.unit_index
+        assert header["units_total"] == packet.frame_length
+        assert header["units_src"] == packet.frame_length_src
+        assert header["units_fec"] == packet.frame_length_fec
+        assert header["codec"] == packet.codec
+        assert header["key_pos"] == packet.key_pos
+        assert msg[header["offset"]:] == bytes(packet.data)
+    assert headers[1]["audio_size"] == 0x12
+    assert headers[1]["unit_index"] == 4
+
+
 # fmt: on
@@ -0,0 +1,175 @@
+"""Tests for pyremoteplay/util.py."""
+import socket
+import threading
+
+import pytest
+
+from pyremoteplay.util import (
+    BatchReceiver,
+    BatchSender,
+    get_network_cache,
+    get_network_key,
+    listener,
+    write_network_cache,
+)
+
+
+def _socket_pair():
+    """Return connected sender and non blocking receiver sockets."""
+    recv_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    recv_sock.bind(("127.0.0.1", 0))
+    recv_sock.settimeout(0)
+    send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    send_sock.connect(recv_sock.getsockname())
+    return send_sock, recv_sock
+
+
+@pytest.mark.parametrize("use_recvmmsg", [True, False])
+def test_batch_receiver(use_recvmmsg):
+    """Test datagrams are received in batches."""
+    send_sock, recv_sock = _socket_pair()
+    receiver = BatchReceiver(recv_sock, batch_size=8, use_recvmmsg=use_recvmmsg)
+    assert receiver.recv() == []
+    sent = [bytes([index]) * (index + 1) for index in range(12)]
+    for msg in sent:
+        send_sock.send(msg)
+    received = []
+    while len(received) < len(sent):
+        received.extend(receiver.recv())
+    assert received == sent
+    stats = receiver.stats
+    assert stats["datagrams"] == len(sent)
+    assert stats["max_batch"] <= 8
+    assert stats["batch_size"] > 0
+    send_sock.close()
+    recv_sock.close()
+
+
+@pytest.mark.parametrize("use_recvmmsg", [True, False])
+def test_batch_receiver_blocking(use_recvmmsg):
+    """Test blocking socket is drained without blocking after first datagram."""
+    send_sock, recv_sock = _socket_pair()
+    recv_sock.settimeout(None)
+    receiver = BatchReceiver(recv_sock, batch_size=8, use_recvmmsg=use_recvmmsg)
+    sent = [b"\x01", bytes(3000)]
+    for msg in sent:
+        send_sock.send(msg)
+    received = []
+    while len(received) < len(sent):
+        received.extend(receiver.recv(block=True))
+    assert received == sent
+    assert receiver.stats["truncated"] == 0
+    send_sock.close()
+    recv_sock.close()
+
+
+@pytest.mark.parametrize("use_sendmmsg", [True, False])
+def test_batch_sender(use_sendmmsg):
+    """Test datagrams are sent in batches within delay."""
+    _, recv_sock = _socket_pair()
+    send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    scheduled = []
+    sender = BatchSender(
+        send_sock,
+        recv_sock.getsockname(),
+        lambda msg: send_sock.sendto(msg, recv_sock.getsockname()),
+        lambda delay, callback: scheduled.append((delay, callback)),
+        max_delay=0.005,
+        batch_size=4,
+        use_sendmmsg=use_sendmmsg,
+    )
+    sent = [bytes([index]) * (index + 1) for index in range(6)]
+    for msg in sent[:3]:
+        sender.send(msg)
+    assert len(scheduled) == 1
+    assert scheduled[0][0] == 0.005
+    scheduled.pop()[1]()
+    for msg in sent[3:]:
+        sender.send(msg)
+    scheduled.pop()[1]()
+    sender.flush()
+    receiver = BatchReceiver(recv_sock)
+    received = []
+    while len(received) < len(sent):
+        received.extend(receiver.recv())
+    assert received == sent
+    stats = sender.stats
+    assert stats["immediate"] == 2
+    assert stats["batches"] == 2
+    assert stats["datagrams"] == len(sent)
+    assert stats["max_batch"] == 2
+    send_sock.close()
+    recv_sock.close()
+
+
+def test_batch_sender_full():
+    """Test idle datagram and full batch are sent without waiting."""
+    scheduled = []
+    sent = []
+    sender = BatchSender(
+        None, None, sent.append, lambda *args: scheduled.append(args), batch_size=2
+    )
+    sender.send(b"\x01")
+    assert sent == [b"\x01"]
+    sender.send(b"\x02")
+    sender.send(b"\x03")
+    assert sent == [b"\x01", b"\x02", b"\x03"]
+    assert len(scheduled) == 1
+    scheduled[0][1]()
+    assert sender.stats["batches"] == 1
+    assert not sender.stats["sendmmsg"]
+
+
+def test_batch_sender_backlog():
+    """Test sendmmsg is not used while send has buffered datagrams."""
+    _, recv_sock = _socket_pair()
+    sent = []
+    sender = BatchSender(
+        recv_sock,
+        recv_sock.getsockname(),
+        sent.append,
+        lambda *args: None,
+        backlog=lambda: 1,
+    )
+    for index in range(3):
+        sender.send(bytes([index]))
+    sender.flush()
+    assert sent == [b"\x00", b"\x01", b"\x02"]
+    recv_sock.close()
+
+
+def test_listener_batch():
+    """Test listener hands batches to callback until stopped."""
+    send_sock, recv_sock = _socket_pair()
+    stop_event = threading.Event()
+    received = []
+    done = threading.Event()
+
+    def handle_batch(msgs):
+        received.extend(msgs)
+        if len(received) >= 4:
+            done.set()
+
+    worker = threading.Thread(
+        target=listener,
+        args=("Test", recv_sock, None, stop_event),
+        kwargs={"handle_batch": handle_batch},
+    )
+    worker.start()
+    for index in range(4):
+        send_sock.send(bytes([index + 1]))
+    assert done.wait(2)
+    stop_event.set()
+    worker.join(2)
+    assert received == [b"\x01", b"\x02", b"\x03", b"\x04"]
+    send_sock.close()
+
+
+def test_network_cache(tmp_path):
+    """Test network results are cached by host network key."""
+    path = str(tmp_path / "network.json")
+    assert get_network_cache(path) == {}
+    key = get_network_key("AABBCCDDEEFF", "127.0.0.1")
+    assert key == "AABBCCDDEEFF/127.0.0.1/127.0.0.0/8"
+    write_network_cache({key: {"mtu": 1454, "rtt": 0.01, "time": 1}}, path)
+    assert get_network_cache(path)[key]["mtu"] == 1454